@@ -0,0 +1,298 @@
+"""Serveradmin - adminapi
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# The asyncio counterparts of send_request(), Query and the API functions
+# to run many requests concurrently from a single event loop.  The requests
+# are built and signed like in adminapi.request, though on the threads of
+# the default executor, as the signing may block talking to the ssh-agent.
+# The connections are kept open like in adminapi.request.  The proxies are
+# not supported.
+
+import asyncio
+import json
+import ssl
+from http.client import (
+    BadStatusLine,
+    HTTPException,
+    IncompleteRead,
+    RemoteDisconnected,
+    parse_headers,
+)
+from io import BytesIO
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from weakref import WeakKeyDictionary
+
+from adminapi.api import API_CALL_ENDPOINT, FunctionGroup
+from adminapi.dataset import (
+    COMMIT_ENDPOINT,
+    NEW_OBJECT_ENDPOINT,
+    QUERY_ENDPOINT,
+    Query,
+    _format_obj,
+    _handle_exception,
+)
+from adminapi.exceptions import ApiError, ConfigurationError, DatasetError
+from adminapi.request import (
+    Settings,
+    _build_request,
+    _decompress_gzip,
+    _handle_http_error,
+    _make_response,
+)
+
+# The connection pools of the event loops by the scheme and the location of
+# the server
+_pools = WeakKeyDictionary()
+
+
+class AsyncConnectionPool:
+    """Keep the connections to a server open for the next requests
+
+    This is adminapi.request.ConnectionPool on the asyncio streams.  It only
+    speaks as much HTTP/1.1 as needed for Serveradmin.
+    """
+
+    def __init__(self, scheme, netloc):
+        url = urlsplit(f'{scheme}://{netloc}')
+        if scheme == 'https':
+            self.ssl = ssl.create_default_context()
+            self.port = url.port or 443
+        elif scheme == 'http':
+            self.ssl = None
+            self.port = url.port or 80
+        else:
+            raise ConfigurationError(f'Unsupported URL scheme "{scheme}"')
+        self.host = url.hostname
+        self.netloc = netloc
+        self.idle = []
+
+    async def urlopen(self, request):
+        """Send the urllib Request and return the response like urlopen()"""
+        url = urlsplit(request.full_url)
+        lines = [
+            '{} {}{} HTTP/1.1'.format(
+                request.get_method(),
+                url.path or '/',
+                '?' + url.query if url.query else '',
+            ),
+            f'Host: {self.netloc}',
+        ]
+        lines.extend(f'{k}: {v}' for k, v in request.header_items())
+        if request.data is not None:
+            lines.append(f'Content-Length: {len(request.data)}')
+        message = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        if request.data is not None:
+            message += request.data
+
+        while True:
+            (reader, writer), reused = await self._get_connection()
+            try:
+                writer.write(message)
+                await writer.drain()
+                status, reason, headers, content, will_close = (
+                    await _read_response(reader)
+                )
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # The server may have closed the connection while it was
+                # idle.  The request is sent again on the next connection.
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            break
+
+        if will_close or len(self.idle) >= Settings.pool_size:
+            writer.close()
+        else:
+            self.idle.append((reader, writer))
+
+        return _make_response(request, status, reason, headers, content)
+
+    async def _get_connection(self):
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+
+        connection = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl
+        )
+        return connection, False
+
+
+async def _read_response(reader):
+    """Read a response and return its status, reason, headers and body
+
+    Also return whether the connection needs to be closed afterwards.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise RemoteDisconnected('Remote end closed connection')
+    try:
+        version, status, *reason = status_line.decode('latin-1').split(None, 2)
+        status = int(status)
+    except ValueError:
+        raise BadStatusLine(status_line)
+    reason = reason[0].strip() if reason else ''
+
+    lines = []
+    while True:
+        line = await reader.readline()
+        lines.append(line)
+        if line in (b'\r\n', b'\n', b''):
+            break
+    headers = parse_headers(BytesIO(b''.join(lines)))
+
+    will_close = (
+        version != 'HTTP/1.1' or
+        headers.get('Connection', '').lower() == 'close'
+    )
+    if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+        content = await _read_chunks(reader)
+    elif 'Content-Length' in headers:
+        content = await reader.readexactly(int(headers['Content-Length']))
+    else:
+        content = await reader.read()
+        will_close = True
+
+    return status, reason, headers, content, will_close
+
+
+async def _read_chunks(reader):
+    chunks = []
+    while True:
+        size_line = await reader.readline()
+        try:
+            size = int(size_line.split(b';')[0], 16)
+        except ValueError:
+            raise IncompleteRead(b''.join(chunks))
+        if size == 0:
+            break
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+    # Skip the trailers
+    while await reader.readline() not in (b'\r\n', b'\n', b''):
+        pass
+
+    return b''.join(chunks)
+
+
+def _get_pool(request):
+    url = urlsplit(request.full_url)
+    pools = _pools.setdefault(asyncio.get_running_loop(), {})
+    key = (url.scheme, url.netloc)
+    if key not in pools:
+        pools[key] = AsyncConnectionPool(url.scheme, url.netloc)
+    return pools[key]
+
+
+async def send_request(endpoint, get_params=None, post_params=None):
+    for retry in reversed(range(Settings.tries)):
+        request = await asyncio.to_thread(
+            _build_request, endpoint, get_params, post_params
+        )
+        response = await _try_request(request, retry != 0)
+        if response:
+            break
+
+        # In case of an error, sleep before trying again
+        await asyncio.sleep(Settings.sleep_interval)
+    else:
+        raise ApiError(f'Received no response after {Settings.tries} retries!')
+
+    content = _decompress_gzip(response)
+    return json.loads(content)
+
+
+async def _try_request(request, retry=False):
+    try:
+        async with asyncio.timeout(Settings.timeout):
+            return await _get_pool(request).urlopen(request)
+    except HTTPError as error:
+        return _handle_http_error(error, retry)
+    except (OSError, EOFError, HTTPException):
+        if retry:
+            return None
+        raise
+
+
+class AsyncQuery(Query):
+    """The Query for asyncio
+
+    The results are fetched by awaiting the query.  Afterwards, it can be
+    used like a Query, except that the methods sending requests are
+    coroutines.
+    """
+
+    def __await__(self):
+        return self.fetch().__await__()
+
+    async def fetch(self):
+        if self._results is None:
+            response = await send_request(
+                QUERY_ENDPOINT, post_params=self._get_results_request_data()
+            )
+            self._results = self._format_results(response)
+        return self
+
+    async def count(self):
+        """Return the number of the matching objects without fetching them
+
+        Note that the limit and offset are not taken into account.
+        """
+        response = await send_request(
+            QUERY_ENDPOINT, post_params=self._get_count_request_data()
+        )
+        if response['status'] == 'error':
+            _handle_exception(response)
+        return response['result']
+
+    async def new_object(self, servertype):
+        response = await send_request(
+            NEW_OBJECT_ENDPOINT, [('servertype', servertype)]
+        )
+        await self.fetch()
+        return self._add_new_object(_format_obj(response['result']))
+
+    async def commit(self) -> int:
+        commit = self._build_commit_object()
+        result = await send_request(COMMIT_ENDPOINT, post_params=commit)
+        return self._confirm_commit(result)
+
+    def _fetch_results(self):
+        raise DatasetError('The results of AsyncQuery must be awaited first')
+
+    def iter_changes(self, wait=None):
+        raise DatasetError('AsyncQuery cannot follow the changes')
+
+
+class AsyncFunctionGroup(FunctionGroup):
+    def __getattr__(self, attr):
+        async def _api_function(*args, **kwargs):
+            call = {
+                'group': self.group,
+                'name': attr,
+                'args': args,
+                'kwargs': kwargs,
+            }
+
+            result = await send_request(API_CALL_ENDPOINT, post_params=call)
+
+            if result['status'] == 'error':
+                raise ApiError(result['message'], status_code=None)
+
+            return result['retval']
+
+        return _api_function
+
+
+def get(group):
+    return AsyncFunctionGroup(group)
@@ -9,17 +9,39 @@ from types import GeneratorType
 
 from adminapi import api
 from adminapi.datatype import validate_value, json_to_datatype
-from adminapi.filters import Any, BaseFilter, ContainedOnlyBy
+from adminapi.filters import All, Any, BaseFilter, ContainedOnlyBy
 from adminapi.request import send_request, json_encode_extra
 from adminapi.exceptions import DatasetError, AdminapiException
 
 NEW_OBJECT_ENDPOINT = '/dataset/new_object'
 COMMIT_ENDPOINT = '/dataset/commit'
 QUERY_ENDPOINT = '/dataset/query'
+MULTI_QUERY_ENDPOINT = '/dataset/multi_query'
+CHANGES_ENDPOINT = '/dataset/changes_since'
+
+# Seconds to wait for the changes on a request, less than Settings.timeout
+CHANGES_WAIT = 30
 
 
 class BaseQuery(object):
-    def __init__(self, filters=None, restrict=['hostname'], order_by=None):
+    def __init__(
+        self,
+        filters=None,
+        restrict=['hostname'],
+        order_by=None,
+        limit=None,
+        offset=None,
+        cursor=None,
+        commit_id=None,
+        commit_lsn=None,
+    ):
+        self._limit = limit
+        self._offset = offset
+        self._cursor = cursor
+        self._commit_id = commit_id
+        self.commit_lsn = commit_lsn
+        self.next_cursor = None
+
         if filters is None:
             self._filters = None
             self._restrict = None
@@ -42,6 +64,18 @@ class BaseQuery(object):
     def __len__(self):
         return len(self._get_results())
 
+    def count(self):
+        """Return the number of the matching objects
+
+        The objects are not fetched for this, unless they already are.
+        Note that the limit and offset are not taken into account.
+        """
+        if self._results is not None and (
+            self._limit is None and not self._offset and self._cursor is None
+        ):
+            return len(self._results)
+        return self._fetch_count()
+
     def __bool__(self):
         return bool(self._get_results())
 
@@ -53,6 +87,12 @@ class BaseQuery(object):
             args.append('restrict=' + repr(self._restrict))
         if self._order_by is not None:
             args.append('order_by=' + repr(self._order_by))
+        if self._limit is not None:
+            args.append('limit=' + repr(self._limit))
+        if self._offset is not None:
+            args.append('offset=' + repr(self._offset))
+        if self._cursor is not None:
+            args.append('cursor=' + repr(self._cursor))
         return 'Query({})'.format(', '.join(args))
 
     @property
@@ -97,11 +137,40 @@ class BaseQuery(object):
     def _fetch_results(self):
         raise NotImplementedError()
 
+    def next_page(self):
+        """Return the query for the next page or None after the last one
+
+        This is only useful with the limit.  The next page starts after
+        the last object of this one, so the objects created or deleted in
+        the meantime don't cause skipping or repeating the others.  This is
+        not the case, if the query is ordered by an attribute the database
+        cannot order, like a relation or a multi attribute.  The next page
+        starts at the position after this one then.
+        """
+        self._get_results()
+        if self.next_cursor is None:
+            return None
+
+        return type(self)(
+            self._filters,
+            self._restrict,
+            self._order_by,
+            limit=self._limit,
+            cursor=self.next_cursor,
+            commit_id=self._commit_id,
+            commit_lsn=self.commit_lsn,
+        )
+
+    def _fetch_count(self):
+        raise NotImplementedError()
+
     def _fetch_new_object(self, servertype):
         raise NotImplementedError()
 
     def new_object(self, servertype):
-        obj = self._fetch_new_object(servertype)
+        return self._add_new_object(self._fetch_new_object(servertype))
+
+    def _add_new_object(self, obj):
         if self._filters:
             for attribute, filt in self._filters:
                 if attribute not in obj:
@@ -274,7 +343,9 @@ class Query(BaseQuery):
     def commit(self) -> int:
         commit = self._build_commit_object()
         result = send_request(COMMIT_ENDPOINT, post_params=commit)
+        return self._confirm_commit(result)
 
+    def _confirm_commit(self, result):
         if result['status'] == 'error':
             _handle_exception(result)
 
@@ -282,20 +353,153 @@ class Query(BaseQuery):
         for obj in self:
             obj._confirm_changes()
 
+        # The following queries of this object should see the changes.
+        # Not every commit has an id, but every one has a position.
+        self._commit_id = result['commit_id']
+        self.commit_lsn = result.get('commit_lsn')
         return result['commit_id']
 
-    def _fetch_results(self):
+    def _get_request_data(self):
         request_data = {'filters': self._filters}
         if self._restrict is not None:
             request_data['restrict'] = self._restrict
         if self._order_by is not None:
             request_data['order_by'] = self._order_by
+        return request_data
 
-        response = send_request(QUERY_ENDPOINT, post_params=request_data)
+    def _fetch_results(self):
+        response = send_request(
+            QUERY_ENDPOINT, post_params=self._get_results_request_data()
+        )
+        return self._format_results(response)
+
+    def _get_results_request_data(self):
+        request_data = self._get_request_data()
+        if self._limit is not None:
+            request_data['limit'] = self._limit
+        if self._offset is not None:
+            request_data['offset'] = self._offset
+        if self._cursor is not None:
+            request_data['cursor'] = self._cursor
+        if self._commit_id is not None:
+            request_data['commit_id'] = self._commit_id
+        if self.commit_lsn is not None:
+            request_data['commit_lsn'] = self.commit_lsn
+        return request_data
+
+    def _format_results(self, response):
         if response['status'] == 'error':
             _handle_exception(response)
+        self.next_cursor = response.get('next_cursor')
         return [_format_obj(s) for s in response['result']]
 
+    def _fetch_count(self):
+        response = send_request(
+            QUERY_ENDPOINT, post_params=self._get_count_request_data()
+        )
+        if response['status'] == 'error':
+            _handle_exception(response)
+        return response['result']
+
+    def _get_count_request_data(self):
+        request_data = {'filters': self._filters, 'count': True}
+        if self._commit_id is not None:
+            request_data['commit_id'] = self._commit_id
+        if self.commit_lsn is not None:
+            request_data['commit_lsn'] = self.commit_lsn
+        return request_data
+
+    def iter_changes(self, wait=CHANGES_WAIT):
+        """Keep the results up to date with the changes committed later
+
+        This is an endless generator.  It fetches the results again, and
+        then waits for the changes committed after them.  The objects
+        affected by a batch of changes are fetched again, and replaced on
+        the results, before the changes are yielded.  The results are not
+        kept in order.  Only the attributes with history are logged, so
+        the changes of the others are only noticed together with them.
+        """
+        if self._filters is None or not (
+            self._limit is self._offset is self._cursor is None
+        ):
+            raise DatasetError('Only complete queries can follow the changes')
+
+        # The changes committed while fetching the results are applied
+        # again, which doesn't do any harm.
+        commit_id = _fetch_changes([])['last_commit_id']
+        self._results = self._fetch_results()
+        has_more = False
+        while True:
+            response = _fetch_changes([
+                ('commit_id', commit_id), ('wait', 0 if has_more else wait)
+            ])
+            commit_id = response['last_commit_id']
+            has_more = response['has_more']
+            if not response['result']:
+                continue
+            if self.is_dirty():
+                raise DatasetError('Cannot apply the changes to dirty objects')
+
+            self._apply_changes(response['result'], commit_id)
+            yield response['result']
+
+    def _apply_changes(self, changes, commit_id):
+        object_ids = {c['object_id'] for c in changes}
+        filters = dict(self._filters)
+        if 'object_id' in filters:
+            filters['object_id'] = All(filters['object_id'], Any(*object_ids))
+        else:
+            filters['object_id'] = Any(*object_ids)
+
+        changed_objects = type(self)(
+            filters, self._restrict, self._order_by, commit_id=commit_id
+        )
+        self._results = [
+            o for o in self._results if o.object_id not in object_ids
+        ]
+        self._results.extend(changed_objects)
+
+
+def _fetch_changes(get_params):
+    response = send_request(CHANGES_ENDPOINT, get_params)
+    if response['status'] == 'error':
+        _handle_exception(response)
+    return response
+
+
+def multi_query(queries, commit_id=None, commit_lsn=None):
+    """Fetch the results of many queries in a single request
+
+    The queries are executed on the same snapshot of the database, so
+    their results are consistent with each other.  The results are stored
+    on the queries, so they can be used as usual afterwards.  The queries
+    cannot be paginated.  Returns the same queries.
+    """
+    pending = [q for q in queries if q._results is None]
+    for query in pending:
+        if not (query._limit is query._offset is query._cursor is None):
+            raise DatasetError('Paginated queries cannot be fetched together')
+        if query._commit_id is not None:
+            commit_id = max(commit_id or 0, query._commit_id)
+        if query.commit_lsn is not None:
+            commit_lsn = max(commit_lsn or 0, query.commit_lsn)
+    if not pending:
+        return queries
+
+    request_data = {'queries': [q._get_request_data() for q in pending]}
+    if commit_id is not None:
+        request_data['commit_id'] = commit_id
+    if commit_lsn is not None:
+        request_data['commit_lsn'] = commit_lsn
+
+    response = send_request(MULTI_QUERY_ENDPOINT, post_params=request_data)
+    if response['status'] == 'error':
+        _handle_exception(response)
+    for query, results in zip(pending, response['result']):
+        query._results = [_format_obj(s) for s in results]
+
+    return queries
+
 
 class DatasetObject(dict):
     """This class must redefine all mutable methods of the dict class
@@ -7,17 +7,20 @@ import logging
 import os
 from hashlib import sha1
 import hmac
-from http.client import IncompleteRead
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from io import BytesIO
 from socket import timeout
 from ssl import SSLError
+from threading import Lock
 import time
 import json
 from base64 import b64encode
 from datetime import datetime, timezone
 
 from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode
-from urllib.request import urlopen, Request
+from urllib.parse import urlencode, urlsplit
+from urllib.request import getproxies, proxy_bypass, urlopen, Request
+from urllib.response import addinfourl
 
 from paramiko.agent import Agent
 from paramiko.message import Message
@@ -44,6 +47,17 @@ from adminapi.exceptions import (
 
 logger = logging.getLogger(__name__)
 
+SESSION_ENDPOINT = '/session'
+
+# The session started to sign the requests with an HMAC instead of the SSH
+# keys, see Settings.use_sessions
+_session = None
+_session_lock = Lock()
+
+# The connection pools by the scheme and the location of the server
+_pools = {}
+_pools_lock = Lock()
+
 
 def load_private_key_file(private_key_path):
     """Try to load a private ssh key from disk
@@ -74,6 +88,12 @@ class Settings:
     tries = 3
     sleep_interval = 5
     grace_period = 15  # <= serveradmin.api.decorators.TIMESTAMP_GRACE_PERIOD
+    # The idle connections kept open to the server for the next requests,
+    # 0 to open a new one for every request
+    pool_size = 8
+    # Sign a single request with the SSH keys to start a session, and the
+    # following ones with the key of the session, until it expires
+    use_sessions = os.environ.get('SERVERADMIN_SESSIONS') in ('1', 'true')
 
 
 def calc_message(timestamp, data=None):
@@ -163,7 +183,13 @@ def _build_request(endpoint, get_params, post_params, retry=1):
         'X-API-Version': '.'.join(str(v) for v in VERSION),
     }
 
-    if Settings.auth_key:
+    session = _get_session(endpoint)
+    if session:
+        headers['X-Session'] = session['session_id']
+        headers['X-SecurityToken'] = calc_security_token(
+            session['session_key'], timestamp, post_data
+        )
+    elif Settings.auth_key:
         headers['X-PublicKeys'] = Settings.auth_key.get_base64()
         headers['X-Signatures'] = calc_signature(
             Settings.auth_key, timestamp, post_data
@@ -213,28 +239,182 @@ def _build_request(endpoint, get_params, post_params, retry=1):
     return Request(url, post_data, headers)
 
 
+def _get_session(endpoint):
+    """Return the session to sign the request with or None
+
+    The session is only worth it instead of the SSH keys.  A new one is
+    started, when the last one is about to expire.  The servers not
+    supporting the sessions are remembered to sign the requests as before.
+    """
+    global _session
+
+    if (
+        not Settings.use_sessions or
+        endpoint == SESSION_ENDPOINT or
+        (Settings.auth_token and not Settings.auth_key)
+    ):
+        return None
+
+    with _session_lock:
+        if _session is None or _session['expires'] <= time.monotonic():
+            try:
+                response = send_request(SESSION_ENDPOINT)
+            except ApiError as error:
+                if error.status_code != 404:
+                    raise
+                logger.warning('Serveradmin does not support the sessions')
+                Settings.use_sessions = False
+                return None
+
+            # The request may have taken some time, and our clock may not
+            # be in sync with the server, so we renew the session early.
+            response['expires'] = (
+                time.monotonic() +
+                response['expires_in'] -
+                Settings.grace_period
+            )
+            _session = response
+
+        return _session
+
+
+class ConnectionPool:
+    """Keep the connections to a server open for the next requests
+
+    Opening a connection, especially the TLS handshake, can take longer than
+    the request itself.  The connections are taken out of the pool for the
+    requests and put back after the responses are read, so the pool can be
+    shared by the threads.  The requests opening new connections when none
+    are idle don't wait for the others.  At most Settings.pool_size idle
+    connections are kept.
+    """
+
+    def __init__(self, scheme, netloc):
+        if scheme == 'https':
+            self.connection_class = HTTPSConnection
+        elif scheme == 'http':
+            self.connection_class = HTTPConnection
+        else:
+            raise ConfigurationError(f'Unsupported URL scheme "{scheme}"')
+        self.netloc = netloc
+        self.idle = []
+        self.lock = Lock()
+
+    def urlopen(self, request):
+        """Send the urllib Request and return the response like urlopen()"""
+        url = urlsplit(request.full_url)
+        path = url.path + ('?' + url.query if url.query else '')
+        headers = dict(request.header_items())
+
+        while True:
+            connection, reused = self._get_connection()
+            try:
+                connection.request(
+                    request.get_method(), path, request.data, headers
+                )
+                response = connection.getresponse()
+                content = response.read()
+            except OSError as error:
+                connection.close()
+                # The server may have closed the connection while it was
+                # idle.  The request is sent again on the next connection.
+                if reused and isinstance(error, ConnectionError):
+                    continue
+                raise URLError(error)
+            except BaseException:
+                connection.close()
+                raise
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._put_connection(connection)
+
+        return _make_response(
+            request, response.status, response.reason, response.headers,
+            content,
+        )
+
+    def _get_connection(self):
+        with self.lock:
+            if self.idle:
+                connection = self.idle.pop()
+                if connection.sock is not None:
+                    connection.sock.settimeout(Settings.timeout)
+                return connection, True
+
+        return self.connection_class(
+            self.netloc, timeout=Settings.timeout
+        ), False
+
+    def _put_connection(self, connection):
+        with self.lock:
+            if len(self.idle) < Settings.pool_size:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+
+def _get_pool(request):
+    """Return the connection pool to send the request on or None
+
+    The proxies are left to urlopen().
+    """
+    if Settings.pool_size <= 0:
+        return None
+
+    url = urlsplit(request.full_url)
+    if url.scheme in getproxies() and not proxy_bypass(url.hostname):
+        return None
+
+    with _pools_lock:
+        key = (url.scheme, url.netloc)
+        if key not in _pools:
+            _pools[key] = ConnectionPool(url.scheme, url.netloc)
+        return _pools[key]
+
+
+def _make_response(request, status, reason, headers, content):
+    """Return the read response like urlopen() or raise HTTPError"""
+    if status >= 300:
+        raise HTTPError(
+            request.full_url, status, reason, headers, BytesIO(content)
+        )
+
+    return addinfourl(BytesIO(content), headers, request.full_url, status)
+
+
 def _try_request(request, retry=False):
     try:
-        return urlopen(request, timeout=Settings.timeout)
+        pool = _get_pool(request)
+        if pool is None:
+            return urlopen(request, timeout=Settings.timeout)
+        return pool.urlopen(request)
     except HTTPError as error:
-        if error.code >= 500:
-            if retry:
-                return None
-        elif error.code >= 400:
-            content_type = error.info()['Content-Type']
-            message = str(error)
-            if content_type == 'application/x-json':
-                content = _decompress_gzip(error)
-                payload = json.loads(content)
-                message = payload['error']['message']
-            raise ApiError(message, status_code=error.code)
-        raise
-    except (SSLError, URLError, timeout, IncompleteRead):
+        return _handle_http_error(error, retry)
+    except (SSLError, URLError, timeout, HTTPException):
         if retry:
             return None
         raise
 
 
+def _handle_http_error(error, retry):
+    """Return None to retry on the server errors or raise ApiError"""
+    if error.code >= 500:
+        if retry:
+            return None
+    elif error.code >= 400:
+        content_type = error.info()['Content-Type']
+        message = str(error)
+        if content_type == 'application/x-json':
+            content = _decompress_gzip(error)
+            payload = json.loads(content)
+            message = payload['error']['message']
+        raise ApiError(message, status_code=error.code)
+    raise error
+
+
 def _decompress_gzip(response):
     content_encoding = response.info().get('Content-Encoding')
     content = response.read()
@@ -0,0 +1,91 @@
+import asyncio
+import gzip
+import json
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from unittest.mock import patch
+
+from adminapi.aio import AsyncQuery, get, send_request
+from adminapi.exceptions import ApiError, DatasetError
+from adminapi.request import Settings
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path == '/dataset/query':
+            response = {
+                'status': 'success',
+                'result': [{'object_id': 1, 'hostname': 'test0'}],
+            }
+        elif self.path == '/call':
+            response = {'status': 'success', 'retval': body['args']}
+        else:
+            response = {'error': {'message': 'Not Found'}}
+        response['port'] = self.client_address[1]
+        content = gzip.compress(json.dumps(response).encode())
+
+        self.send_response(404 if 'error' in response else 200)
+        self.send_header('Content-Type', 'application/x-json')
+        self.send_header('Content-Encoding', 'gzip')
+        # Stream the responses like the queries
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for start in range(0, len(content), 16):
+            chunk = content[start:start + 16]
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        settings = patch.multiple(
+            Settings,
+            base_url='http://127.0.0.1:{}'.format(self.server.server_port),
+            auth_key=None,
+            auth_token='test',
+            use_sessions=False,
+            tries=1,
+        )
+        settings.start()
+        self.addCleanup(settings.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    async def test_connection_reuse(self):
+        first = await send_request('/call', post_params={'args': []})
+        second = await send_request('/call', post_params={'args': []})
+        self.assertEqual(first['port'], second['port'])
+
+    async def test_error(self):
+        with self.assertRaises(ApiError) as context:
+            await send_request('/missing', post_params={'args': []})
+        self.assertEqual(context.exception.status_code, 404)
+        self.assertEqual(str(context.exception), 'Not Found')
+
+    async def test_query(self):
+        query = AsyncQuery({'hostname': 'test0'})
+        with self.assertRaises(DatasetError):
+            len(query)
+
+        self.assertIs(await query, query)
+        self.assertEqual(query.get().object_id, 1)
+
+    async def test_concurrent_queries(self):
+        queries = [AsyncQuery({'hostname': str(i)}) for i in range(20)]
+        await asyncio.gather(*queries)
+        self.assertTrue(all(len(q) == 1 for q in queries))
+
+    async def test_api_call(self):
+        self.assertEqual(await get('api').echo(1, 2), [1, 2])
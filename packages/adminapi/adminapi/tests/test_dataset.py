@@ -1,6 +1,7 @@
 import unittest
 
-from adminapi.dataset import strtobool
+from adminapi.dataset import Query, multi_query, strtobool
+from adminapi.exceptions import DatasetError
 
 
 class TestStrtobool(unittest.TestCase):
@@ -22,3 +23,31 @@ class TestStrtobool(unittest.TestCase):
             with self.subTest(value=value):
                 with self.assertRaises(ValueError):
                     strtobool(value)
+
+
+class TestMultiQuery(unittest.TestCase):
+    def test_paginated_queries(self):
+        with self.assertRaises(DatasetError):
+            multi_query([Query({'hostname': 'test0'}, limit=10)])
+
+    def test_fetched_queries(self):
+        queries = [Query()]
+        self.assertIs(multi_query(queries), queries)
+
+
+class TestCommit(unittest.TestCase):
+    def test_commit_without_id(self):
+        # The commits of only the attributes without history have no id.
+        query = Query()
+        query._confirm_commit(
+            {'status': 'success', 'commit_id': None, 'commit_lsn': 42}
+        )
+        self.assertEqual(query._get_count_request_data()['commit_lsn'], 42)
+        self.assertNotIn('commit_id', query._get_count_request_data())
+
+
+class TestIterChanges(unittest.TestCase):
+    def test_paginated_queries(self):
+        query = Query({'hostname': 'test0'}, limit=10)
+        with self.assertRaises(DatasetError):
+            next(query.iter_changes())
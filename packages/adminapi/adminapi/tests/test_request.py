@@ -0,0 +1,68 @@
+import gzip
+import json
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.error import HTTPError
+from urllib.request import Request
+
+from adminapi.request import ConnectionPool, _decompress_gzip
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        content = gzip.compress(json.dumps({
+            'port': self.client_address[1],
+            'body': body.decode(),
+        }).encode())
+        self.send_response(404 if self.path == '/missing' else 200)
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        # Close the connection without telling the client like on timeout
+        self.close_connection = self.path == '/close'
+
+    def log_message(self, *args):
+        pass
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.pool = ConnectionPool('http', self.url[len('http://'):])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for connection in self.pool.idle:
+            connection.close()
+
+    def _send(self, path='/query', data=b'{}'):
+        response = self.pool.urlopen(Request(self.url + path, data))
+        return json.loads(_decompress_gzip(response))
+
+    def test_reuse(self):
+        first = self._send()
+        second = self._send(data=b'[]')
+        self.assertEqual(first['port'], second['port'])
+        self.assertEqual(second['body'], '[]')
+        self.assertEqual(len(self.pool.idle), 1)
+
+    def test_stale_connection(self):
+        first = self._send('/close')
+        self.assertEqual(len(self.pool.idle), 1)
+        self.assertNotEqual(self._send()['port'], first['port'])
+
+    def test_error(self):
+        with self.assertRaises(HTTPError) as context:
+            self._send('/missing')
+        self.assertEqual(context.exception.code, 404)
+        content = _decompress_gzip(context.exception)
+        self.assertEqual(json.loads(content)['body'], '{}')
@@ -0,0 +1,187 @@
+"""Serveradmin - Access Control Cache
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# The ACLs are checked for every object of every commit by the users and
+# the applications which are not superusers.  They are compiled once into
+# a snapshot shared by all threads of the process, so checking them
+# doesn't need to parse the queries or to look up the attributes again.
+# Like the schema cache, the snapshot is invalidated by the changes on the
+# same process immediately, and the changes on the other processes are
+# noticed by a generation counter on the database.  It is built on
+# a consistent view of the database like the schema as well, and it is
+# not kept, if it is built within a transaction.
+
+from collections import defaultdict
+from threading import Lock
+
+from django.db import connection, transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+)
+from django.dispatch import receiver
+
+from serveradmin.access_control.models import AccessControlGroup
+from serveradmin.serverdb.schema_cache import build_snapshot
+
+GENERATION_SEQUENCE = 'access_control_generation'
+
+_snapshot = None
+_snapshot_lock = Lock()
+
+
+class CompiledAccessControlGroup:
+    """An ACL prepared to be checked without querying the database"""
+
+    def __init__(self, acl, attribute_ids):
+        self.pk = acl.pk
+        self.name = acl.name
+        self.is_whitelist = acl.is_whitelist
+        self.attribute_ids = frozenset(attribute_ids)
+        self._filters = acl.get_filters()
+
+    def __str__(self):
+        return self.name
+
+    def get_filters(self):
+        return self._filters
+
+    def is_permissible(self, attribute_id):
+        """Check whether the ACL allows changing the attribute
+
+        This is the same as checking the result of
+        AccessControlGroup.get_permissible_attribute_ids() which lists
+        all attributes for the blacklists.
+        """
+        if self.is_whitelist:
+            return attribute_id in self.attribute_ids
+        return attribute_id not in self.attribute_ids
+
+
+class AccessControlSnapshot:
+    """The compiled ACLs indexed by the users and the applications
+
+    The objects in here are shared.  They must not be modified.
+    """
+
+    def __init__(self, generation):
+        self.generation = generation
+
+        attribute_ids = defaultdict(list)
+        for acl_id, attribute_id in (
+            AccessControlGroup.attributes.through.objects
+            .values_list('accesscontrolgroup_id', 'attribute_id')
+        ):
+            attribute_ids[acl_id].append(attribute_id)
+
+        acls = {
+            a.pk: CompiledAccessControlGroup(a, attribute_ids[a.pk])
+            for a in AccessControlGroup.objects.order_by('pk')
+        }
+
+        self.user_acls = defaultdict(list)
+        for acl_id, user_id in (
+            AccessControlGroup.members.through.objects
+            .order_by('accesscontrolgroup_id')
+            .values_list('accesscontrolgroup_id', 'user_id')
+        ):
+            self.user_acls[user_id].append(acls[acl_id])
+
+        self.application_acls = defaultdict(list)
+        for acl_id, application_id in (
+            AccessControlGroup.applications.through.objects
+            .order_by('accesscontrolgroup_id')
+            .values_list('accesscontrolgroup_id', 'application_id')
+        ):
+            self.application_acls[application_id].append(acls[acl_id])
+
+    def get_access_control_groups(self, user=None, app=None):
+        """Return the compiled ACLs of the application or the user
+
+        The ACLs of the application take precedence like in the rest
+        of the access control.
+        """
+        if app:
+            return list(self.application_acls.get(app.pk, ()))
+        if user:
+            return list(self.user_acls.get(user.pk, ()))
+        return []
+
+
+def get_access_control_snapshot():
+    """Return the current snapshot of the compiled ACLs
+
+    This costs a single cheap query to check the generation counter,
+    unless the ACLs have changed, in which case they are compiled again.
+    """
+    global _snapshot
+
+    generation = _get_generation()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.generation == generation:
+        return snapshot
+
+    # See get_schema()
+    if connection.in_atomic_block:
+        return build_snapshot(AccessControlSnapshot, generation)
+
+    with _snapshot_lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.generation != generation:
+            snapshot = _snapshot = build_snapshot(
+                AccessControlSnapshot, generation
+            )
+
+    return snapshot
+
+
+def invalidate_access_control():
+    """Drop the snapshot of this process and bump the generation counter
+
+    The counter is bumped only after the transaction is committed for the
+    same reasons as the schema cache.
+    """
+    global _snapshot
+
+    _snapshot = None
+    transaction.on_commit(_bump_generation)
+
+
+def _get_generation():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT last_value FROM ' + GENERATION_SEQUENCE)
+        return cursor.fetchone()[0]
+
+
+def _bump_generation():
+    global _snapshot
+
+    _snapshot = None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval('{}')".format(GENERATION_SEQUENCE))
+
+
+@receiver(post_save, sender=AccessControlGroup)
+@receiver(post_delete, sender=AccessControlGroup)
+def invalidate_access_control_on_change(sender, **kwargs):
+    invalidate_access_control()
+
+
+@receiver(m2m_changed, sender=AccessControlGroup.attributes.through)
+@receiver(m2m_changed, sender=AccessControlGroup.members.through)
+@receiver(m2m_changed, sender=AccessControlGroup.applications.through)
+def invalidate_access_control_on_relation_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_access_control()
+
+
+@receiver(post_migrate)
+def invalidate_access_control_on_migrate(sender, **kwargs):
+    # See invalidate_schema_on_migrate()
+    global _snapshot
+
+    _snapshot = None
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class AccessControlConfig(AppConfig):
+    name = 'serveradmin.access_control'
+    verbose_name = "Access Control"
+
+    def ready(self):
+        import serveradmin.access_control.acl_cache # noqa
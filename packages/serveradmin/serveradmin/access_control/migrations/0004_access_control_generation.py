@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('access_control', '0003_accesscontrolgroup_description'),
+    ]
+
+    operations = [
+        # Generation counter of the compiled ACLs in the acl_cache
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE access_control_generation;",
+                "SELECT nextval('access_control_generation');",
+            ],
+            reverse_sql=[
+                "DROP SEQUENCE access_control_generation;",
+            ],
+        ),
+    ]
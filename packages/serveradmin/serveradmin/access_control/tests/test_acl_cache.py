@@ -0,0 +1,96 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from serveradmin.access_control.acl_cache import get_access_control_snapshot
+from serveradmin.access_control.models import AccessControlGroup
+from serveradmin.dataset import Query
+from serveradmin.serverdb import query_committer
+from serveradmin.serverdb.models import Attribute
+
+
+class TestAccessControlCache(TransactionTestCase):
+    fixtures = ['auth_user.json', 'test_dataset.json']
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.first()
+        self.user.is_superuser = False
+
+    def test_snapshot_is_reused(self):
+        snapshot = get_access_control_snapshot()
+        self.assertIs(get_access_control_snapshot(), snapshot)
+
+    def test_snapshot_is_reloaded_on_change(self):
+        acl = AccessControlGroup.objects.create(
+            name='test', query='servertype=test0'
+        )
+        snapshot = get_access_control_snapshot()
+        self.assertEqual(snapshot.get_access_control_groups(self.user), [])
+
+        acl.members.add(self.user)
+        acl.attributes.add(Attribute.objects.get(attribute_id='os'))
+
+        new_snapshot = get_access_control_snapshot()
+        self.assertIsNot(new_snapshot, snapshot)
+        compiled_acls = new_snapshot.get_access_control_groups(self.user)
+        self.assertEqual([str(a) for a in compiled_acls], ['test'])
+        self.assertTrue(compiled_acls[0].is_permissible('os'))
+        self.assertFalse(compiled_acls[0].is_permissible('database'))
+
+    def test_snapshot_within_transaction(self):
+        # The ACLs created within the transaction are seen by the snapshot
+        # built there, as it cannot have a view of its own.
+        with transaction.atomic():
+            acl = AccessControlGroup.objects.create(
+                name='test', query='servertype=test0'
+            )
+            acl.members.add(self.user)
+            compiled_acls = (
+                get_access_control_snapshot()
+                .get_access_control_groups(self.user)
+            )
+        self.assertEqual([str(a) for a in compiled_acls], ['test'])
+
+    def test_snapshot_is_not_kept_on_rollback(self):
+        get_access_control_snapshot()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            acl = AccessControlGroup.objects.create(
+                name='test', query='servertype=test0'
+            )
+            acl.members.add(self.user)
+            get_access_control_snapshot()
+            raise RuntimeError()
+
+        self.assertEqual(
+            get_access_control_snapshot().get_access_control_groups(self.user),
+            [],
+        )
+
+    def test_objects_are_checked_without_queries(self):
+        acl = AccessControlGroup.objects.create(
+            name='test', query='servertype=test0', is_whitelist=False
+        )
+        acl.members.add(self.user)
+        acl.attributes.add(Attribute.objects.get(attribute_id='os'))
+
+        unchanged_objects = {
+            o['object_id']: o
+            for o in Query({'servertype': 'test0'}, ['os', 'hostname'])
+        }
+        changed_objects = {
+            o['object_id']: o
+            for o in Query({'servertype': 'test0'}, ['os', 'hostname'])
+        }
+        for obj in changed_objects.values():
+            obj['os'] = 'buster'
+
+        # Only the generations of the ACLs and the schema are checked,
+        # once they are loaded.
+        get_access_control_snapshot()
+        with self.assertNumQueries(2):
+            with self.assertRaises(PermissionDenied):
+                query_committer._access_control(
+                    self.user, None, unchanged_objects, {}, changed_objects, {}
+                )
@@ -7,8 +7,10 @@ from datetime import datetime, timedelta, timezone as dt_timezone
 from functools import update_wrapper
 from logging import getLogger
 from base64 import b64decode
+from contextlib import nullcontext
 import json
 
+from django.conf import settings
 from django.core.exceptions import (
     ObjectDoesNotExist,
     PermissionDenied,
@@ -16,8 +18,13 @@ from django.core.exceptions import (
     ValidationError,
 )
 from django.http import HttpResponse
+from django.http.response import HttpResponseBase
 from django.views.decorators.csrf import csrf_exempt
-from django.utils.crypto import constant_time_compare
+from django.utils.crypto import (
+    constant_time_compare,
+    get_random_string,
+    salted_hmac,
+)
 from django.utils import timezone, dateformat
 
 from paramiko.message import Message
@@ -31,6 +38,8 @@ from adminapi.request import (
 from adminapi.filters import FilterValueError
 from serveradmin.apps.models import Application, PublicKey
 from serveradmin.api import AVAILABLE_API_FUNCTIONS
+from serveradmin.common.metrics import set_metrics_labels
+from serveradmin.common.timing import record_timings, span
 
 logger = getLogger('serveradmin')
 
@@ -39,6 +48,15 @@ logger = getLogger('serveradmin')
 # handled.  Chosen by a fair dice role.
 TIMESTAMP_GRACE_PERIOD = timedelta(seconds=16)
 
+# Verifying the SSH signatures is expensive compared to the HMACs of the
+# pre shared keys.  The clients can exchange a signed request for a session
+# to sign the following requests with an HMAC instead.  The sessions are not
+# stored anywhere.  Their ids contain the application and the expiry, and
+# their keys are derived from the ids with the SECRET_KEY of the server.
+# Removing a public key doesn't end the sessions started with it, so their
+# lifetime is kept short.  Disabling the application does.
+SESSION_KEY_SALT = 'serveradmin.api.session'
+
 
 def api_view(view):
     @csrf_exempt
@@ -53,67 +71,99 @@ def api_view(view):
         signatures = request.META.get('HTTP_X_SIGNATURES')
         app_id = request.META.get('HTTP_X_APPLICATION')
         token = request.META.get('HTTP_X_SECURITYTOKEN')
+        session_id = request.META.get('HTTP_X_SESSION')
         then = datetime.utcfromtimestamp(
             int(request.META['HTTP_X_TIMESTAMP'])
         ).replace(tzinfo=dt_timezone.utc)
         body_json = json.loads(body) if body else None
         status_code = 200
 
-        try:
-            app = authenticate_app(
-                public_keys, signatures, app_id, token, then, now, body
-            )
-            return_value = view(request, app, body_json)
+        # The timings are recorded until the response is built, so they
+        # include the encoding of it, but not the streaming.
+        timings = record_timings() if settings.API_TIMING else nullcontext()
+        with timings as recorder:
+            try:
+                app = authenticate_app(
+                    public_keys,
+                    signatures,
+                    app_id,
+                    token,
+                    then,
+                    now,
+                    body,
+                    session_id,
+                )
+                set_metrics_labels(view.__name__, app)
+                return_value = view(request, app, body_json)
+            except (
+                FilterValueError,
+                ValidationError,
+                PermissionDenied,
+                ObjectDoesNotExist,
+                SuspiciousOperation,
+                ApiError
+            ) as error:
+                status_code, reason = _get_error_status(error)
+                message = '{}: {}'.format(reason, str(error))
+                logger.error('api: {}'.format(message))
+                return_value = {
+                    'error': {
+                        'message': message,
+                    }
+                }
 
-            logger.info('api: Call: ' + (', '.join([
+            # The views can stream or serialize their responses themselves.
+            if isinstance(return_value, HttpResponseBase):
+                response = return_value
+            else:
+                with span('encode'):
+                    response = HttpResponse(
+                        json.dumps(return_value, default=json_encode_extra),
+                        content_type='application/x-json',
+                        status=status_code,
+                    )
+
+        if status_code == 200:
+            call_info = [
                 'Method: {}'.format(view.__name__),
                 'Application: {}'.format(app),
                 'Time elapsed: {:.3f}s'.format(
                     (timezone.now() - now).total_seconds()
                 ),
-            ])))
-        except (
-            FilterValueError,
-            ValidationError,
-            PermissionDenied,
-            ObjectDoesNotExist,
-            SuspiciousOperation,
-            ApiError
-        ) as error:
-            reason = ''
-
-            if isinstance(
-                error,
-                (FilterValueError, ValidationError, SuspiciousOperation, ApiError)
-            ):
-                status_code = 400
-                reason = 'Bad Request'
-            if isinstance(error, PermissionDenied):
-                status_code = 403
-                reason = 'Forbidden'
-            if isinstance(error, ObjectDoesNotExist):
-                status_code = 404
-                reason = 'Not Found'
-
-            message = '{}: {}'.format(reason, str(error))
-            logger.error('api: {}'.format(message))
-            return_value = {
-                'error': {
-                    'message': message,
-                }
-            }
+            ]
+            if recorder is not None:
+                call_info.append('Timings: {}'.format(recorder.get_summary()))
+            logger.info('api: Call: ' + ', '.join(call_info))
+        if recorder is not None:
+            response['Server-Timing'] = recorder.get_server_timing()
 
-        return HttpResponse(
-            json.dumps(return_value, default=json_encode_extra),
-            content_type='application/x-json',
-            status=status_code,
-        )
+        return response
 
     return update_wrapper(_wrapper, view)
 
 
+def _get_error_status(error):
+    status_code = 200
+    reason = ''
+
+    if isinstance(
+        error,
+        (FilterValueError, ValidationError, SuspiciousOperation, ApiError)
+    ):
+        status_code = 400
+        reason = 'Bad Request'
+    if isinstance(error, PermissionDenied):
+        status_code = 403
+        reason = 'Forbidden'
+    if isinstance(error, ObjectDoesNotExist):
+        status_code = 404
+        reason = 'Not Found'
+
+    return status_code, reason
+
+
 def authenticate_app(
-    public_keys, signatures, app_id, token, then, now, body
+    public_keys, signatures, app_id, token, then, now, body, session_id=None
 ):
     """Authenticate requests
 
@@ -121,8 +171,9 @@ def authenticate_app(
     contained in the request is no more than TIMESTAMP_GRACE_PERIOD seconds
     removed from the current server time or raise PermissionDenied.
 
-    Hand over the real verification of auth token HMACs to authenticate_app_psk
-    or public key signatures to authenticate_app_ssh.
+    Hand over the real verification of auth token HMACs to
+    authenticate_app_psk, session HMACs to authenticate_app_session or public
+    key signatures to authenticate_app_ssh.
 
     Ensure that the application and applications owner aren't deactivated or
     raise PermissionDenied.
@@ -139,7 +190,9 @@ def authenticate_app(
         )
 
     timestamp = dateformat.format(then, u'U')
-    if public_keys and signatures:
+    if session_id and token:
+        app = authenticate_app_session(session_id, token, timestamp, body, now)
+    elif public_keys and signatures:
         app = authenticate_app_ssh(public_keys, signatures, timestamp, body)
     elif app_id and token:
         app = authenticate_app_psk(app_id, token, timestamp, body)
@@ -185,6 +238,53 @@ def authenticate_app_psk(app_id, security_token, timestamp, body):
     return app
 
 
+def authenticate_app_session(session_id, security_token, timestamp, body, now):
+    """Authenticate request HMAC with the key of the session
+
+    Recreate the key of the session from its id, and the security token from
+    it using the timestamp and body from the request.  Check if the client
+    send the same security token and the session hasn't expired yet, or raise
+    PermissionDenied.
+
+    Return the app the session was started for
+    """
+    try:
+        app_pk, expires, _nonce = session_id.split(':')
+        app_pk, expires = int(app_pk), int(expires)
+    except ValueError:
+        raise SuspiciousOperation('Malformed session id')
+
+    session_key = calc_session_key(session_id)
+    expected_proof = calc_security_token(session_key, timestamp, body)
+    if not constant_time_compare(expected_proof, security_token):
+        raise PermissionDenied('Invalid security token')
+
+    if expires < now.timestamp():
+        raise PermissionDenied('Session expired')
+
+    try:
+        return Application.objects.get(pk=app_pk)
+    except Application.DoesNotExist as error:
+        raise PermissionDenied(error)
+
+
+def create_session(app, now):
+    """Start a session for the app lasting API_SESSION_TTL seconds
+
+    Return the id and the key of the session
+    """
+    expires = int(now.timestamp()) + settings.API_SESSION_TTL
+    session_id = '{}:{}:{}'.format(app.pk, expires, get_random_string(16))
+
+    return session_id, calc_session_key(session_id)
+
+
+def calc_session_key(session_id):
+    return salted_hmac(
+        SESSION_KEY_SALT, session_id, algorithm='sha256'
+    ).hexdigest()
+
+
 def authenticate_app_ssh(public_keys, signatures, timestamp, body):
     """Authenticate request signature
 
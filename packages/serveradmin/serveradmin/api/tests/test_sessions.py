@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from django.core.exceptions import PermissionDenied, SuspiciousOperation
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from adminapi.request import calc_security_token
+from serveradmin.api.decorators import authenticate_app_session, create_session
+from serveradmin.apps.models import Application
+
+
+class TestSessions(SimpleTestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.session_id, self.session_key = create_session(
+            Application(pk=2), self.now
+        )
+
+    def _authenticate(self, session_id, session_key, now):
+        timestamp = str(int(now.timestamp()))
+        token = calc_security_token(session_key, timestamp, '{}')
+        return authenticate_app_session(
+            session_id, token, timestamp, '{}', now
+        )
+
+    def test_expired(self):
+        with self.assertRaises(PermissionDenied):
+            self._authenticate(
+                self.session_id,
+                self.session_key,
+                self.now + timedelta(hours=1),
+            )
+
+    def test_changed_application(self):
+        session_id = '1' + self.session_id[1:]
+        with self.assertRaises(PermissionDenied):
+            self._authenticate(session_id, self.session_key, self.now)
+
+    def test_wrong_key(self):
+        with self.assertRaises(PermissionDenied):
+            self._authenticate(self.session_id, 'wrong', self.now)
+
+    def test_malformed(self):
+        with self.assertRaises(SuspiciousOperation):
+            self._authenticate('2', self.session_key, self.now)
+
+
+class TestSessionApplication(TransactionTestCase):
+    fixtures = ['auth_user.json', 'apps.json']
+
+    def test_application(self):
+        app = Application.objects.get(name='test')
+        now = timezone.now()
+        session_id, session_key = create_session(app, now)
+        timestamp = str(int(now.timestamp()))
+        token = calc_security_token(session_key, timestamp)
+
+        self.assertEqual(
+            authenticate_app_session(session_id, token, timestamp, None, now),
+            app,
+        )
@@ -0,0 +1,19 @@
+from django.core.exceptions import SuspiciousOperation
+from django.test import SimpleTestCase
+
+from serveradmin.api.views import CHANGES_MAX_WAIT, _get_changes_wait
+
+
+class TestChangesWait(SimpleTestCase):
+    def test_wait(self):
+        self.assertEqual(_get_changes_wait('1.5'), 1.5)
+        self.assertEqual(_get_changes_wait('3600'), CHANGES_MAX_WAIT)
+
+    def test_negative_wait(self):
+        self.assertEqual(_get_changes_wait('-1'), 0)
+
+    def test_invalid_wait(self):
+        for value in ['nan', 'inf', '-inf']:
+            with self.subTest(value=value):
+                with self.assertRaises(SuspiciousOperation):
+                    _get_changes_wait(value)
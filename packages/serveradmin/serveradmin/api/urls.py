@@ -8,17 +8,23 @@ from django.urls import path
 from serveradmin.api.views import (
     health_check,
     dataset_query,
+    dataset_multi_query,
+    dataset_changes_since,
     dataset_commit,
     dataset_new_object,
     dataset_attributes,
     api_call,
+    api_session,
 )
 
 urlpatterns = [
     path('health_check', health_check),
     path('dataset/query', dataset_query),
+    path('dataset/multi_query', dataset_multi_query),
+    path('dataset/changes_since', dataset_changes_since),
     path('dataset/commit', dataset_commit),
     path('dataset/new_object', dataset_new_object),
     path('dataset/attributes', dataset_attributes),
     path('call', api_call),
+    path('session', api_session),
 ]
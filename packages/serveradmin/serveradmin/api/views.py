@@ -3,23 +3,49 @@
 Copyright (c) 2019 InnoGames GmbH
 """
 
+import json
+from itertools import chain
+from math import isfinite
+
 from django.core.exceptions import (
     SuspiciousOperation,
     PermissionDenied,
     ValidationError,
 )
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.template.response import HttpResponse
+from django.utils import timezone
 
 from adminapi.filters import BaseFilter, FilterValueError
+from adminapi.request import json_encode_extra
 from serveradmin.api import ApiError, AVAILABLE_API_FUNCTIONS
-from serveradmin.api.decorators import api_view
+from serveradmin.api.decorators import api_view, create_session
+from serveradmin.serverdb.change_feed import (
+    get_changes_since,
+    get_last_commit_id,
+)
 from serveradmin.serverdb.models import Attribute
+from serveradmin.serverdb.query_cache import execute_cached_query
 from serveradmin.serverdb.query_committer import commit_query
-from serveradmin.serverdb.query_executer import execute_query
+from serveradmin.serverdb.query_executer import (
+    execute_count_query,
+    execute_queries,
+    execute_query_page,
+    stream_query,
+)
 from serveradmin.serverdb.query_materializer import (
     get_default_attribute_values
 )
+from serveradmin.serverdb.replica import get_commit_lsn, read_from_replica
+from serveradmin.serverdb.schema_cache import get_schema
+
+# The maximum number of the queries executed together by multi_query
+MULTI_QUERY_LIMIT = 100
+
+# The maximum seconds to wait for the changes.  This must be less than the
+# timeout of the clients.
+CHANGES_MAX_WAIT = 30
 
 
 class StringEncoder(object):
@@ -47,12 +73,100 @@ def health_check(request):
 
 @api_view
 def dataset_query(request, app, data):
+    filters = _get_filters(data)
+
+    # The clients pass the position of their last commit to read their
+    # writes.  See serveradmin.serverdb.replica.
+    with read_from_replica(data.get('commit_id'), data.get('commit_lsn')):
+        return _execute_dataset_query(filters, data)
+
+
+@api_view
+def dataset_multi_query(request, app, data):
+    """Execute many queries on the same snapshot at once
+
+    The results are returned in the same order as the queries.
+    """
+    if 'queries' not in data or not isinstance(data['queries'], list):
+        raise SuspiciousOperation('Queries must be a list')
+    if len(data['queries']) > MULTI_QUERY_LIMIT:
+        raise SuspiciousOperation(
+            'Over {} queries in one request'.format(MULTI_QUERY_LIMIT)
+        )
+
+    queries = []
+    for query in data['queries']:
+        if not isinstance(query, dict):
+            raise SuspiciousOperation('Queries must be dictionaries')
+        queries.append((
+            _get_filters(query),
+            query.get('restrict') or None,
+            query.get('order_by'),
+        ))
+
+    with read_from_replica(data.get('commit_id'), data.get('commit_lsn')):
+        results = execute_queries(queries)
+
+    return {
+        'status': 'success',
+        'result': results,
+    }
+
+
+@api_view
+def dataset_changes_since(request, app, data):
+    """Return the changes committed after the given commit
+
+    Without a commit, only the id of the last commit is returned to start
+    from.  Otherwise, it waits up to the given seconds for new commits.
+    """
+    try:
+        commit_id = request.GET.get('commit_id')
+        wait = _get_changes_wait(request.GET.get('wait', 0))
+        if commit_id is not None:
+            commit_id = int(commit_id)
+    except ValueError as error:
+        raise SuspiciousOperation(error)
+
+    with read_from_replica():
+        if commit_id is None:
+            changes, commit_id, has_more = [], get_last_commit_id(), False
+        else:
+            changes, commit_id, has_more = get_changes_since(commit_id, wait)
+
+    return {
+        'status': 'success',
+        'result': changes,
+        'last_commit_id': commit_id,
+        'has_more': has_more,
+    }
+
+
+def _get_changes_wait(value):
+    # The comparisons with nan are always false, so it would never time out.
+    wait = float(value)
+    if not isfinite(wait):
+        raise SuspiciousOperation('Invalid wait {}'.format(value))
+    return max(0, min(wait, CHANGES_MAX_WAIT))
+
+
+def _get_filters(data):
     if 'filters' not in data or not isinstance(data['filters'], dict):
         raise SuspiciousOperation('Filters must be a dictionary')
     filters = {}
     for attr, filter_obj in data['filters'].items():
         filters[attr] = BaseFilter.deserialize(filter_obj)
 
+    return filters
+
+
+def _execute_dataset_query(filters, data):
+    if data.get('count'):
+        return {
+            'status': 'success',
+            'result': execute_count_query(filters),
+        }
+
     # Empty list means query all attributes to the older versions of
     # the adminapi.
     if not data.get('restrict'):
@@ -62,11 +176,78 @@ def dataset_query(request, app, data):
 
     order_by = data.get('order_by')
 
-    return {
+    if data.get('stream'):
+        if any(k in data for k in ('limit', 'offset', 'cursor')):
+            raise SuspiciousOperation('Streaming cannot be paginated')
+        return _stream_query_response(
+            stream_query(filters, restrict, order_by), data['stream']
+        )
+
+    # The results of the complete queries can be cached.  We are getting
+    # them serialized from the cache to avoid even that.
+    if not any(k in data for k in ('limit', 'offset', 'cursor')):
+        result = execute_cached_query(filters, restrict, order_by)
+        return HttpResponse(
+            '{"status": "success", "result": ' + result + '}',
+            content_type='application/x-json',
+        )
+
+    results, next_cursor = execute_query_page(
+        filters,
+        restrict,
+        order_by,
+        data.get('limit'),
+        data.get('offset'),
+        data.get('cursor'),
+    )
+    response = {
         'status': 'success',
-        'result': execute_query(filters, restrict, order_by),
+        'result': results,
     }
 
+    # Only the clients asking for pages would expect the cursor.
+    if 'limit' in data:
+        response['next_cursor'] = next_cursor
+
+    return response
+
+
+def _stream_query_response(chunks, stream_format):
+    """Return the response streaming the results chunk by chunk
+
+    The results are either in the same format as the usual response, or
+    one object per line as NDJSON.  We are fetching the first chunk before
+    returning to be able to report the errors properly.  Once we start
+    streaming, there is no way to do that anymore.
+    """
+    chunks = chain([next(chunks, [])], chunks)
+    if stream_format == 'ndjson':
+        return StreamingHttpResponse(
+            (
+                ''.join(_dumps_result(o) + '\n' for o in chunk)
+                for chunk in chunks
+            ),
+            content_type='application/x-ndjson',
+        )
+
+    return StreamingHttpResponse(
+        _stream_json_results(chunks), content_type='application/x-json'
+    )
+
+
+def _stream_json_results(chunks):
+    yield '{"status": "success", "result": ['
+    separator = ''
+    for chunk in chunks:
+        for obj in chunk:
+            yield separator + _dumps_result(obj)
+            separator = ', '
+    yield ']}'
+
+
+def _dumps_result(obj):
+    return json.dumps(obj, default=json_encode_extra)
+
 
 @api_view
 def dataset_attributes(request, app, data):
@@ -76,7 +257,7 @@ def dataset_attributes(request, app, data):
     are not stored in the attribute table but are queryable like any other
     attribute.
     """
-    attributes = list(Attribute.objects.all())
+    attributes = list(get_schema().attributes.values())
     attributes.extend(Attribute.specials.values())
 
     result = []
@@ -98,9 +279,7 @@ def dataset_attributes(request, app, data):
             # their many-to-many target_servertype is not possible.
             'target_servertypes': (
                 [] if attribute.special else
-                list(attribute.target_servertype.values_list(
-                    'servertype_id', flat=True
-                ))
+                attribute.get_target_servertype_ids()
             ),
         })
 
@@ -154,6 +333,7 @@ def dataset_commit(request, app, data):
     return {
         'status': 'success',
         'commit_id': commit_id,
+        'commit_lsn': get_commit_lsn(),
     }
 
 
@@ -211,6 +391,25 @@ def _validate_commit_deleted(deleted):
         )
 
 
+@api_view
+def api_session(request, app, data):
+    """Start a session to sign the following requests with an HMAC
+
+    The sessions cannot be started with another session, so they cannot be
+    kept alive forever without the SSH keys or the auth token.
+    """
+    if request.META.get('HTTP_X_SESSION'):
+        raise PermissionDenied('Sessions cannot be started with a session')
+
+    session_id, session_key = create_session(app, timezone.now())
+    return {
+        'status': 'success',
+        'session_id': session_id,
+        'session_key': session_key,
+        'expires_in': settings.API_SESSION_TTL,
+    }
+
+
 @api_view
 def api_call(request, app, data):
     try:
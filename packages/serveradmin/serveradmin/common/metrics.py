@@ -0,0 +1,165 @@
+"""Serveradmin - Metrics
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# The metrics of the requests are exposed on /metrics in the Prometheus
+# format, if the optional prometheus-client library is installed and
+# METRICS_ENABLED is set.  They are broken down by the view, which is the
+# function wrapped by api_view for the API, and by the application making
+# the API calls.  The servershell requests have no application.  We don't
+# label them with the filters or the users, as that would create a time
+# series for every one of them.
+#
+# Serveradmin usually runs with multiple worker processes.  Then the
+# PROMETHEUS_MULTIPROC_DIR environment variable must point to an empty
+# directory, before the processes are started, so their metrics can be
+# collected together.  See the documentation of prometheus-client for
+# cleaning up the files of the dead processes.
+
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from serveradmin.common.timing import execute_wrapper
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+_labels = ContextVar('metrics_labels', default=None)
+
+if prometheus_client is not None:
+    REQUESTS = prometheus_client.Counter(
+        'serveradmin_requests',
+        'Number of the requests',
+        ['view', 'application', 'status'],
+    )
+    REQUEST_DURATION = prometheus_client.Histogram(
+        'serveradmin_request_duration_seconds',
+        'Time until the response is built',
+        ['view', 'application'],
+        buckets=(
+            0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+        ),
+    )
+    REQUEST_QUERIES = prometheus_client.Histogram(
+        'serveradmin_request_db_queries',
+        'Number of the SQL statements executed for the request',
+        ['view', 'application'],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+    )
+    RESPONSE_SIZE = prometheus_client.Histogram(
+        'serveradmin_response_size_bytes',
+        'Size of the response bodies, except the streamed ones',
+        ['view', 'application'],
+        buckets=(1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+    )
+    COMMIT_OBJECTS = prometheus_client.Histogram(
+        'serveradmin_commit_objects',
+        'Number of the objects created, changed or deleted by the commits',
+        ['application', 'action'],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000),
+    )
+    COMMIT_LOCK_WAIT = prometheus_client.Histogram(
+        'serveradmin_commit_lock_wait_seconds',
+        'Time waited for the locks on the servers to change or delete',
+        ['application'],
+    )
+
+
+def metrics_enabled():
+    return prometheus_client is not None and settings.METRICS_ENABLED
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not metrics_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        labels = {'view': '', 'application': ''}
+        token = _labels.set(labels)
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = perf_counter()
+        try:
+            with execute_wrapper(count_queries):
+                response = self.get_response(request)
+        finally:
+            _labels.reset(token)
+        duration = perf_counter() - start
+
+        if not labels['view']:
+            match = request.resolver_match
+            labels['view'] = match.view_name if match else 'unknown'
+        REQUESTS.labels(status=response.status_code, **labels).inc()
+        REQUEST_DURATION.labels(**labels).observe(duration)
+        REQUEST_QUERIES.labels(**labels).observe(queries[0])
+        if not response.streaming:
+            RESPONSE_SIZE.labels(**labels).observe(len(response.content))
+
+        return response
+
+
+def set_metrics_labels(view, app):
+    """Label the metrics of the current request with the API view"""
+    labels = _labels.get()
+    if labels is not None:
+        labels['view'] = view
+        labels['application'] = str(app) if app else ''
+
+
+def observe_commit(created, changed, deleted):
+    if not metrics_enabled():
+        return
+    application = _get_application()
+    for action, objects in (
+        ('create', created), ('change', changed), ('delete', deleted)
+    ):
+        if objects:
+            COMMIT_OBJECTS.labels(application, action).observe(len(objects))
+
+
+@contextmanager
+def measure_lock_wait():
+    if not metrics_enabled():
+        yield
+        return
+    start = perf_counter()
+    yield
+    COMMIT_LOCK_WAIT.labels(_get_application()).observe(perf_counter() - start)
+
+
+def _get_application():
+    labels = _labels.get()
+    return labels['application'] if labels else ''
+
+
+def metrics(request):
+    """Expose the metrics of all processes in the Prometheus format"""
+    if not metrics_enabled():
+        raise Http404('Metrics are not enabled')
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+
+    return HttpResponse(
+        prometheus_client.generate_latest(registry),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
@@ -0,0 +1,79 @@
+from unittest import skipIf
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from serveradmin.common import metrics
+from serveradmin.common.metrics import (
+    MetricsMiddleware,
+    measure_lock_wait,
+    observe_commit,
+    set_metrics_labels,
+)
+
+
+@skipIf(metrics.prometheus_client is None, 'prometheus-client is missing')
+@override_settings(METRICS_ENABLED=True)
+class TestMetricsMiddleware(SimpleTestCase):
+    def _get_sample(self, name, **labels):
+        value = metrics.prometheus_client.REGISTRY.get_sample_value(
+            name, labels
+        )
+        return value or 0
+
+    def _view(self, request):
+        set_metrics_labels('dataset_query', 'test-app')
+        with measure_lock_wait():
+            pass
+        observe_commit([{}, {}], [], [1])
+        return HttpResponse('x' * 10)
+
+    def test_request_is_counted(self):
+        labels = {'view': 'dataset_query', 'application': 'test-app'}
+        requests = self._get_sample(
+            'serveradmin_requests_total', status='200', **labels
+        )
+        sizes = self._get_sample(
+            'serveradmin_response_size_bytes_sum', **labels
+        )
+        created = self._get_sample(
+            'serveradmin_commit_objects_sum',
+            application='test-app',
+            action='create',
+        )
+
+        middleware = MetricsMiddleware(self._view)
+        middleware(RequestFactory().get('/api/dataset/query'))
+
+        self.assertEqual(
+            self._get_sample(
+                'serveradmin_requests_total', status='200', **labels
+            ),
+            requests + 1,
+        )
+        self.assertEqual(
+            self._get_sample('serveradmin_response_size_bytes_sum', **labels),
+            sizes + 10,
+        )
+        self.assertEqual(
+            self._get_sample(
+                'serveradmin_commit_objects_sum',
+                application='test-app',
+                action='create',
+            ),
+            created + 2,
+        )
+        self.assertEqual(
+            self._get_sample(
+                'serveradmin_commit_objects_count',
+                application='test-app',
+                action='change',
+            ),
+            0,
+        )
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            MetricsMiddleware(self._view)
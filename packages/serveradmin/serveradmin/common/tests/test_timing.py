@@ -0,0 +1,49 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase
+
+from serveradmin.common.timing import record_timings, span
+from serveradmin.serverdb.replica import REPLICA_DB_ALIAS
+
+
+class TestTiming(SimpleTestCase):
+    def test_disabled(self):
+        with span('outer'):
+            pass
+
+    def test_nested_spans(self):
+        with record_timings() as recorder:
+            with span('outer'):
+                with span('inner'):
+                    pass
+                with span('inner'):
+                    pass
+
+        self.assertEqual(list(recorder.spans), ['inner', 'outer'])
+        self.assertIn('outer;dur=', recorder.get_server_timing())
+        self.assertIn('inner=', recorder.get_summary())
+
+    def test_inclusive_span(self):
+        with record_timings() as recorder:
+            with span('outer', inclusive=True):
+                with span('inner'):
+                    pass
+
+        self.assertEqual(list(recorder.spans), ['outer'])
+
+    def test_replica_queries_are_counted(self):
+        replica = connections.create_connection(DEFAULT_DB_ALIAS)
+        connections[REPLICA_DB_ALIAS] = replica
+        self.addCleanup(connections.__delitem__, REPLICA_DB_ALIAS)
+
+        with patch.dict(settings.DATABASES, {
+            REPLICA_DB_ALIAS: settings.DATABASES[DEFAULT_DB_ALIAS],
+        }):
+            with record_timings() as recorder:
+                self.assertIn(recorder, replica.execute_wrappers)
+                self.assertIn(
+                    recorder, connections[DEFAULT_DB_ALIAS].execute_wrappers
+                )
+        self.assertNotIn(recorder, replica.execute_wrappers)
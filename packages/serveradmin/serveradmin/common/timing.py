@@ -0,0 +1,113 @@
+"""Serveradmin - Timing
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# We want to know where the time of the slow API calls goes.  The phases
+# of the queries and the commits are wrapped with span(), which records
+# their durations and the number of SQL statements they executed, if a
+# recorder is active.  Otherwise, it costs only a context variable lookup.
+#
+# The spans can be nested.  Only the time not spent in the inner spans is
+# recorded for the outer ones, so the totals add up to the time of the
+# whole call.  The inclusive spans record everything within themselves
+# instead, and the inner spans are ignored.  The spans of the same name
+# are summed up.
+
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+_recorder = ContextVar('timing_recorder', default=None)
+
+
+class TimingRecorder:
+    def __init__(self):
+        self.spans = {}
+        self.queries = 0
+        self.inclusive = 0
+        self._stack = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # This is installed as an execute wrapper of the connection.
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def start(self):
+        self._stack.append([perf_counter(), self.queries, 0.0, 0])
+
+    def stop(self, name):
+        start, queries, inner_duration, inner_queries = self._stack.pop()
+        duration = perf_counter() - start
+        queries = self.queries - queries
+        if self._stack:
+            self._stack[-1][2] += duration
+            self._stack[-1][3] += queries
+
+        total = self.spans.setdefault(name, [0.0, 0])
+        total[0] += duration - inner_duration
+        total[1] += queries - inner_queries
+
+    def get_server_timing(self):
+        """Format the spans for the Server-Timing response header"""
+        return ', '.join(
+            '{};dur={:.1f};desc="{} queries"'.format(
+                name, duration * 1000, queries
+            )
+            for name, (duration, queries) in self.spans.items()
+        )
+
+    def get_summary(self):
+        """Format the spans for the log lines"""
+        return ' '.join(
+            '{}={:.1f}ms/{}q'.format(name, duration * 1000, queries)
+            for name, (duration, queries) in self.spans.items()
+        )
+
+
+@contextmanager
+def record_timings():
+    """Record the spans within the block on the returned recorder"""
+    recorder = TimingRecorder()
+    token = _recorder.set(recorder)
+    try:
+        with execute_wrapper(recorder):
+            yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """Install the execute wrapper on all databases within the block
+
+    The queries might be sent to the replica.  The databases sharing
+    the same connection, like the test mirrors, get it only once.
+    """
+    with ExitStack() as stack:
+        wrapped = []
+        for alias in settings.DATABASES:
+            conn = connections[alias]
+            if not any(c is conn for c in wrapped):
+                wrapped.append(conn)
+                stack.enter_context(conn.execute_wrapper(wrapper))
+        yield
+
+
+@contextmanager
+def span(name, inclusive=False):
+    recorder = _recorder.get()
+    if recorder is None or recorder.inclusive:
+        yield
+        return
+
+    recorder.start()
+    recorder.inclusive += inclusive
+    try:
+        yield
+    finally:
+        recorder.inclusive -= inclusive
+        recorder.stop(name)
@@ -5,7 +5,10 @@ Copyright (c) 2019 InnoGames GmbH
 
 from adminapi.dataset import BaseQuery, DatasetObject as ApiDatasetObject
 from serveradmin.serverdb.query_committer import commit_query
-from serveradmin.serverdb.query_executer import execute_query
+from serveradmin.serverdb.query_executer import (
+    execute_count_query,
+    execute_query_page,
+)
 from serveradmin.serverdb.query_materializer import (
     get_default_attribute_values
 )
@@ -23,7 +26,18 @@ class Query(BaseQuery):
         return commit_id
 
     def _fetch_results(self):
-        return execute_query(self._filters, self._restrict, self._order_by)
+        results, self.next_cursor = execute_query_page(
+            self._filters,
+            self._restrict,
+            self._order_by,
+            self._limit,
+            self._offset,
+            self._cursor,
+        )
+        return results
+
+    def _fetch_count(self):
+        return execute_count_query(self._filters)
 
 
 class DatasetObject(ApiDatasetObject):
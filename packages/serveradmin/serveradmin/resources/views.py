@@ -3,8 +3,6 @@
 Copyright (c) 2019 InnoGames GmbH
 """
 
-from collections import OrderedDict
-
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import SuspiciousOperation
@@ -22,6 +20,29 @@ from serveradmin.graphite.models import GRAPHITE_ATTRIBUTE_ID, Collection
 from serveradmin.graphite.views import graph
 
 
+class QueryPages(object):
+    """Sequence of the query results for the paginator
+
+    The paginator only needs the number of the objects and the slice for
+    the requested page, so we don't have to fetch all of them.
+    """
+
+    def __init__(self, filters, restrict):
+        self._filters = filters
+        self._restrict = restrict
+
+    def count(self):
+        return Query(self._filters).count()
+
+    def __getitem__(self, key):
+        return [dict(s) for s in Query(
+            self._filters,
+            self._restrict,
+            limit=key.stop - key.start,
+            offset=key.start,
+        )]
+
+
 @login_required     # NOQA: C901
 @ensure_csrf_cookie
 def index(request):
@@ -56,9 +77,9 @@ def index(request):
     matched_hostnames = []
     if term:
         query_args = parse_query(term)
-        # @TODO: This is the slowest part here unfortunately the Query object
-        # does not support pagination yet so there is nothing to speed this
-        # up right now.
+        # We need all of the matched hosts to find the ones with the graphs,
+        # so this cannot be paginated.  Only the few attributes necessary
+        # for it are queried.
         host_query = Query(query_args, ['hostname', 'hypervisor'])
         for host in host_query:
             matched_hostnames.append(host['hostname'])
@@ -107,12 +128,12 @@ def index(request):
         })
         attribute_ids.append(relation.attribute_id)
 
-    hosts = OrderedDict()
     filters = {GRAPHITE_ATTRIBUTE_ID: current_collection.name}
     if len(hostnames) > 0:
         filters['hostname'] = Any(*hostnames)
-        for server in Query(filters, attribute_ids):
-            hosts[server['hostname']] = dict(server)
+        hosts = QueryPages(filters, attribute_ids)
+    else:
+        hosts = []
 
     page = abs(int(request.GET.get('page', 1)))
     per_page = int(request.GET.get(
@@ -122,7 +143,7 @@ def index(request):
     request.session['resources_per_page'] = per_page
 
     try:
-        hosts_pager = Paginator(list(hosts.values()), per_page)
+        hosts_pager = Paginator(hosts, per_page)
 
         # Term or data in DB has changed
         if page > hosts_pager.num_pages:
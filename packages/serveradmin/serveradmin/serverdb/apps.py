@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ServerdbConfig(AppConfig):
+    name = 'serveradmin.serverdb'
+    verbose_name = "Serverdb"
+
+    def ready(self):
+        import serveradmin.serverdb.schema_cache # noqa
+        import serveradmin.serverdb.query_cache # noqa
@@ -0,0 +1,82 @@
+"""Serveradmin - Change Feed
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# Some clients keep a copy of the servers they are interested in.  Instead
+# of querying all of them again and again, they can ask for the changes
+# logged after the last commit they have seen, and wait for them.
+#
+# This only works, if the commits become visible in the order of their
+# ids.  The ids come from a sequence, so a commit could get a smaller id
+# than another one, but be committed later, and a client reading between
+# the two would skip it forever.  The commits take a lock right before
+# getting their ids to prevent this.  It is held until the end of their
+# transactions, which is only a few statements later.
+#
+# The attributes without history are not logged, so their changes are not
+# on the feed either.
+
+from time import monotonic, sleep
+
+from django.db import connection
+from django.db.models import Max
+
+from serveradmin.serverdb.models import Change, ChangeCommit
+
+# The key of the advisory lock taken by the commits, chosen to not collide
+# with anything else
+CHANGE_LOG_LOCK_KEY = 0x5e7ad
+
+# The maximum number of the commits returned at once
+CHANGES_LIMIT = 1000
+
+# The seconds between checking for the new commits while waiting
+CHANGES_POLL_INTERVAL = 1.0
+
+
+def lock_change_log():
+    """Take the lock to log the changes until the end of the transaction"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOG_LOCK_KEY]
+        )
+
+
+def get_last_commit_id():
+    return ChangeCommit.objects.aggregate(Max('pk'))['pk__max'] or 0
+
+
+def get_changes_since(commit_id, wait=0, limit=CHANGES_LIMIT):
+    """Return the changes of the commits after the given one in order
+
+    It waits up to the given seconds for new commits, if there are none.
+    Returns the changes, the id of the last commit returned, or the given
+    one, if none, and whether there are more commits to get.
+    """
+    deadline = monotonic() + wait
+    while True:
+        commit_ids = list(
+            ChangeCommit.objects.filter(pk__gt=commit_id)
+            .order_by('pk')
+            .values_list('pk', flat=True)[:limit]
+        )
+        remaining = deadline - monotonic()
+        if commit_ids or remaining <= 0:
+            break
+        sleep(min(CHANGES_POLL_INTERVAL, remaining))
+
+    if not commit_ids:
+        return [], commit_id, False
+
+    changes = [
+        {
+            'commit_id': change.commit_id,
+            'object_id': change.object_id,
+            'change_type': change.change_type,
+            'change': change.change_json,
+        }
+        for change in Change.objects.filter(commit_id__in=commit_ids)
+        .order_by('commit_id', 'pk')
+    ]
+    return changes, commit_ids[-1], len(commit_ids) == limit
@@ -0,0 +1,111 @@
+"""Serveradmin - Commit Outbox
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# The receivers of the post_commit signal run inside the request of the
+# commit.  The plugins calling other systems like DNS, monitoring or the
+# configuration management would slow down every commit that way.  They
+# can connect to the post_commit_async signal instead.  The commits are
+# written to the outbox table in the same transaction as the changes, so
+# none of them would be lost, and the post_commit_worker command sends
+# the signal for them in the background.
+#
+# The signal is sent at least once for every commit.  The events are
+# claimed by the workers for a lease time.  If any of the receivers fail,
+# or the worker dies, the signal is sent again for the event, to all of
+# the receivers, after a delay growing with every attempt.  The receivers
+# should be idempotent.  The events may be delivered out of order, if
+# there are multiple workers or threads.
+#
+# The receivers get the same arguments as the ones of post_commit, but
+# serialized as JSON.  They must be connected on the web processes too,
+# for example on the ready() method of the app config, because nothing
+# is written to the outbox when there are no receivers.
+
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from serveradmin.serverdb.models import PostCommitEvent
+from serveradmin.serverdb.signals import post_commit_async
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_post_commit(commit_id, created, changed, deleted):
+    """Write the commit to the outbox, if anybody is going to receive it
+
+    This must be called in the transaction of the commit.
+    """
+    if not post_commit_async.has_listeners():
+        return None
+
+    return PostCommitEvent.objects.create(
+        commit_id=commit_id,
+        payload={'created': created, 'changed': changed, 'deleted': deleted},
+    )
+
+
+def claim_post_commit_events(batch_size, lease):
+    """Claim the events due for delivery for the lease time
+
+    The events locked by the other workers are skipped.  The attempts are
+    counted in here, so the events would not be retried immediately, if
+    the worker dies while delivering them.
+    """
+    with transaction.atomic():
+        events = list(
+            PostCommitEvent.objects
+            .select_for_update(skip_locked=True)
+            .filter(next_attempt_on__lte=now())
+            .order_by('pk')[:batch_size]
+        )
+        if events:
+            PostCommitEvent.objects.filter(
+                pk__in=[e.pk for e in events]
+            ).update(
+                attempts=F('attempts') + 1,
+                next_attempt_on=now() + lease,
+            )
+
+    return events
+
+
+def deliver_post_commit_event(event, max_delay):
+    """Send the signal for the event and delete it, if all succeeded
+
+    Returns whether it was successful.  Otherwise, the event is scheduled
+    to be tried again after a delay growing exponentially with the number
+    of attempts up to the maximum delay.
+    """
+    errors = [
+        '{}: {!r}'.format(getattr(r, '__qualname__', r), response)
+        for r, response in post_commit_async.send_robust(
+            PostCommitEvent,
+            commit_id=event.commit_id,
+            attempt=event.attempts + 1,
+            **event.payload
+        )
+        if isinstance(response, Exception)
+    ]
+    if not errors:
+        event.delete()
+        return True
+
+    delay = min(timedelta(seconds=2 ** event.attempts), max_delay)
+    PostCommitEvent.objects.filter(pk=event.pk).update(
+        next_attempt_on=now() + delay,
+        last_error='\n'.join(errors),
+    )
+    logger.warning(
+        'Post commit receivers failed for the event {} of the commit {}, '
+        'retrying in {}: {}'.format(
+            event.pk, event.commit_id, delay, '; '.join(errors)
+        )
+    )
+
+    return False
@@ -0,0 +1,4 @@
+"""Serveradmin
+
+Copyright (c) 2026 InnoGames GmbH
+"""
@@ -0,0 +1,555 @@
+"""Serveradmin - Benchmark
+
+Generate a synthetic fleet and measure the queries and the commits on it
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+import json
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from ipaddress import IPv4Address, IPv4Interface, IPv4Network
+from random import Random
+from time import perf_counter, time
+
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from netaddr import EUI
+
+from adminapi.filters import Any, GreaterThan
+from adminapi.request import calc_security_token
+from serveradmin.api.views import dataset_query
+from serveradmin.apps.models import Application
+from serveradmin.dataset import Query
+from serveradmin.serverdb.models import (
+    Attribute,
+    Server,
+    ServerBooleanAttribute,
+    ServerDateAttribute,
+    ServerDateTimeAttribute,
+    ServerInetAttribute,
+    ServerMACAddressAttribute,
+    ServerNumberAttribute,
+    ServerRelationAttribute,
+    ServerStringAttribute,
+    Servertype,
+    ServertypeAttribute,
+)
+from serveradmin.serverdb.query_executer import (
+    execute_count_query,
+    execute_query,
+    execute_query_page,
+)
+
+# Everything generated is named by this prefix, so that we can remove it
+# afterwards without touching anything else.
+PREFIX = 'bench'
+BATCH_SIZE = 1000
+HOSTS_PER_NETWORK = 200
+COMMIT_SIZE = 10
+PERCENTILES = (50, 90, 99)
+STRING_VALUES = (
+    'alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel'
+)
+ANY_REGEXP = '\\A.*\\Z'
+VALUE_MODELS = (
+    ServerStringAttribute,
+    ServerRelationAttribute,
+    ServerBooleanAttribute,
+    ServerNumberAttribute,
+    ServerInetAttribute,
+    ServerMACAddressAttribute,
+    ServerDateAttribute,
+    ServerDateTimeAttribute,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a synthetic fleet, run a fixed workload of queries and '
+        'commits on it, and report the results as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', type=int, default=10000,
+                            help='Number of servers to generate')
+        parser.add_argument('--servertypes', type=int, default=10,
+                            help='Number of servertypes to generate')
+        parser.add_argument('--chain-depth', type=int, default=3,
+                            help='Depth of the related_via chains')
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Number of runs of every workload')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random generator')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the generated fleet afterwards')
+        parser.add_argument('--force', action='store_true', help=(
+            'Run even if the database contains other servers.  Only the '
+            'generated objects are removed, but the commits are logged.'
+        ))
+
+    def handle(self, *args, **options):
+        if options['servertypes'] < 1:
+            raise CommandError('At least one servertype is necessary')
+        if options['servers'] < options['servertypes']:
+            raise CommandError('Every servertype needs at least one server')
+        if options['iterations'] < 1:
+            raise CommandError('At least one iteration is necessary')
+        if not options['force'] and (
+            Server.objects.exclude(hostname__startswith=PREFIX + '-').exists()
+        ):
+            raise CommandError(
+                'The database contains other servers, use --force to run '
+                'anyway'
+            )
+
+        remove_fleet()
+        start = perf_counter()
+        fleet = Fleet(
+            options['servers'],
+            options['servertypes'],
+            min(options['chain_depth'], options['servertypes'] - 1),
+            Random(options['seed']),
+        )
+        report = {
+            'servers': options['servers'],
+            'servertypes': options['servertypes'],
+            'chain_depth': fleet.chain_depth,
+            'iterations': options['iterations'],
+            'generate_seconds': round(perf_counter() - start, 3),
+            'workloads': {},
+        }
+        try:
+            for name, workload in fleet.get_workloads():
+                report['workloads'][name] = run_workload(
+                    workload, options['iterations']
+                )
+        finally:
+            if not options['keep']:
+                remove_fleet()
+
+        self.stdout.write(json.dumps(report, indent=4))
+
+
+class Fleet:
+    """The generated servers with the workloads to run on them
+
+    There is a network servertype, and the host servertypes have attributes
+    of every type.  The servers of every host servertype are related to
+    the ones of the next.  The first servertypes are also related to the
+    following ones via related_via chains of the given depth.  The hosts
+    are in the networks, so they have supernets.
+    """
+
+    def __init__(self, num_servers, num_servertypes, chain_depth, rng):
+        self.chain_depth = chain_depth
+        self.rng = rng
+        self.servertype_ids = [
+            '{}_type{}'.format(PREFIX, i) for i in range(num_servertypes)
+        ]
+        self.network_servertype_id = PREFIX + '_network'
+        self.user, self.app = self._create_user()
+        self._create_schema()
+        self._create_servers(num_servers)
+        self._num_created = 0
+        self._created_hostnames = []
+
+    def _create_user(self):
+        user, _ = User.objects.get_or_create(
+            username=PREFIX + '_user', defaults={'is_superuser': True}
+        )
+        app, _ = Application.objects.get_or_create(
+            name=PREFIX + '_app', defaults={'owner': user, 'superuser': True}
+        )
+        return user, app
+
+    def _create_schema(self):
+        network = Servertype.objects.create(
+            servertype_id=self.network_servertype_id,
+            description='Benchmark network',
+            ip_addr_type='network',
+        )
+        servertypes = [
+            Servertype.objects.create(
+                servertype_id=s,
+                description='Benchmark host',
+                ip_addr_type='host',
+            )
+            for s in self.servertype_ids
+        ]
+
+        for attribute_id, attribute_type, multi in (
+            ('string', 'string', False),
+            ('tags', 'string', True),
+            ('number', 'number', False),
+            ('flag', 'boolean', False),
+            ('ip', 'inet', False),
+            ('mac', 'macaddr', False),
+            ('date', 'date', False),
+            ('datetime', 'datetime', False),
+            ('location', 'string', False),
+        ):
+            self._create_attribute(attribute_id, attribute_type, multi=multi)
+        self._create_attribute(
+            'supernet', 'supernet', target_servertype=[network]
+        )
+        self._create_attribute(
+            'parent', 'relation', target_servertype=servertypes[1:]
+        )
+        self._create_attribute(
+            'children', 'reverse', reversed_attribute_id=PREFIX + '_parent'
+        )
+        for level in range(1, self.chain_depth + 1):
+            self._create_attribute(
+                'up{}'.format(level),
+                'relation',
+                target_servertype=[servertypes[level]],
+            )
+
+        self._add_attributes(
+            self.network_servertype_id, ['ip', 'string', 'location']
+        )
+        for index, servertype_id in enumerate(self.servertype_ids):
+            self._add_attributes(servertype_id, [
+                'string', 'tags', 'number', 'flag', 'ip', 'mac', 'date',
+                'datetime', 'supernet', 'children',
+            ])
+            self._add_attributes(servertype_id, ['location'], 'supernet')
+            if index + 1 < len(self.servertype_ids):
+                self._add_attributes(servertype_id, ['parent'])
+
+            # The servers of the servertype N store "upN+1" pointing to
+            # the servertype N+1, which stores "upN+2" and so on.  So,
+            # the servertype N can get the following ones via a chain.
+            if index < self.chain_depth:
+                self._add_attributes(servertype_id, ['up{}'.format(index + 1)])
+            for level in range(index + 2, self.chain_depth + 1):
+                self._add_attributes(
+                    servertype_id,
+                    ['up{}'.format(level)],
+                    'up{}'.format(level - 1),
+                )
+
+    def _create_attribute(self, attribute_id, attribute_type, **kwargs):
+        target_servertype = kwargs.pop('target_servertype', [])
+        attribute = Attribute.objects.create(
+            attribute_id='{}_{}'.format(PREFIX, attribute_id),
+            type=attribute_type,
+            regexp=ANY_REGEXP,
+            **kwargs
+        )
+        attribute.target_servertype.set(target_servertype)
+
+    def _add_attributes(self, servertype_id, attribute_ids, related_via=None):
+        for attribute_id in attribute_ids:
+            ServertypeAttribute.objects.create(
+                servertype_id=servertype_id,
+                attribute_id='{}_{}'.format(PREFIX, attribute_id),
+                related_via_attribute_id=(
+                    related_via and '{}_{}'.format(PREFIX, related_via)
+                ),
+            )
+
+    def _create_servers(self, num_servers):
+        rng = self.rng
+        num_networks = max(1, -(-num_servers // HOSTS_PER_NETWORK))
+        networks = [
+            IPv4Network((int(IPv4Address('10.0.0.0')) + i * 256, 24))
+            for i in range(num_networks)
+        ]
+        network_servers = _bulk_create_servers(
+            (
+                '{}-net-{}'.format(PREFIX, i),
+                IPv4Interface(n),
+                self.network_servertype_id,
+            )
+            for i, n in enumerate(networks)
+        )
+        self.hostnames_by_type = {s: [] for s in self.servertype_ids}
+        host_servers = _bulk_create_servers(
+            (
+                '{}-host-{}'.format(PREFIX, i),
+                IPv4Interface(networks[i % num_networks][
+                    i // num_networks + 1
+                ]),
+                self.servertype_ids[i % len(self.servertype_ids)],
+            )
+            for i in range(num_servers)
+        )
+        servers_by_type = {s: [] for s in self.servertype_ids}
+        for server in host_servers:
+            servers_by_type[server.servertype_id].append(server)
+            self.hostnames_by_type[server.servertype_id].append(
+                server.hostname
+            )
+
+        values = []
+        for network, server in zip(networks, network_servers):
+            values.append(_value(
+                ServerInetAttribute, server, 'ip', IPv4Interface(network)
+            ))
+            values.append(_value(
+                ServerStringAttribute,
+                server,
+                'location',
+                rng.choice(STRING_VALUES),
+            ))
+        for index, servertype_id in enumerate(self.servertype_ids):
+            for server in servers_by_type[servertype_id]:
+                values.extend(self._host_values(server))
+                if index + 1 < len(self.servertype_ids):
+                    value = rng.choice(servers_by_type[
+                        self.servertype_ids[index + 1]
+                    ])
+                    values.append(_value(
+                        ServerRelationAttribute, server, 'parent', value
+                    ))
+                if index < self.chain_depth:
+                    value = rng.choice(servers_by_type[
+                        self.servertype_ids[index + 1]
+                    ])
+                    values.append(_value(
+                        ServerRelationAttribute,
+                        server,
+                        'up{}'.format(index + 1),
+                        value,
+                    ))
+        _bulk_create_values(values)
+
+    def _host_values(self, server):
+        rng = self.rng
+        now = datetime.now(timezone.utc)
+        yield _value(
+            ServerStringAttribute, server, 'string', rng.choice(STRING_VALUES)
+        )
+        for tag in rng.sample(STRING_VALUES, rng.randint(0, 3)):
+            yield _value(ServerStringAttribute, server, 'tags', tag)
+        yield _value(
+            ServerNumberAttribute, server, 'number', rng.randint(0, 1000)
+        )
+        if rng.random() < 0.5:
+            yield _value(ServerBooleanAttribute, server, 'flag')
+        yield _value(ServerInetAttribute, server, 'ip', server.intern_ip)
+        yield _value(
+            ServerMACAddressAttribute, server, 'mac', EUI(rng.getrandbits(48))
+        )
+        yield _value(
+            ServerDateAttribute,
+            server,
+            'date',
+            date.today() - timedelta(days=rng.randint(0, 3650)),
+        )
+        yield _value(
+            ServerDateTimeAttribute,
+            server,
+            'datetime',
+            now - timedelta(minutes=rng.randint(0, 10 ** 6)),
+        )
+
+    def get_workloads(self):
+        """Yield the names and the workloads
+
+        The workloads are functions preparing a single run, and returning
+        the function to be measured.
+        """
+        first_type = self.servertype_ids[0]
+        chain = ['{}_up{}'.format(PREFIX, i)
+                 for i in range(1, self.chain_depth + 1)]
+
+        yield 'query_hostname', lambda: (lambda: execute_query(
+            {'hostname': self._random_hostnames(1)[0]},
+            ['hostname', PREFIX + '_string'],
+            None,
+        ))
+        yield 'query_filter', lambda: (lambda: execute_query(
+            {'servertype': first_type, PREFIX + '_number': GreaterThan(500)},
+            [
+                'hostname',
+                PREFIX + '_string',
+                PREFIX + '_number',
+                PREFIX + '_tags',
+            ],
+            None,
+        ))
+        yield 'query_all_attributes', lambda: (lambda: execute_query(
+            {'servertype': first_type}, None, None
+        ))
+        yield 'query_related', lambda: (lambda: execute_query(
+            {'servertype': first_type},
+            ['hostname', PREFIX + '_supernet', PREFIX + '_location'] + chain,
+            None,
+        ))
+        yield 'query_joins', lambda: (lambda: execute_query(
+            {'servertype': first_type},
+            ['hostname', {PREFIX + '_parent': [
+                'hostname', {PREFIX + '_children': ['hostname']},
+            ]}],
+            None,
+        ))
+        yield 'query_page', lambda: (lambda: execute_query_page(
+            {'servertype': first_type},
+            ['hostname', PREFIX + '_number'],
+            [PREFIX + '_number'],
+            limit=100,
+        ))
+        yield 'query_count', lambda: (lambda: execute_count_query(
+            {PREFIX + '_flag': True}
+        ))
+        yield 'view_query', self._prepare_view_query
+        yield 'commit_update', self._prepare_commit_update
+        yield 'commit_create', self._prepare_commit_create
+        yield 'commit_delete', self._prepare_commit_delete
+
+    def _prepare_view_query(self):
+        body = json.dumps({
+            'filters': {'servertype': self.servertype_ids[0]},
+            'restrict': ['hostname', PREFIX + '_string', PREFIX + '_supernet'],
+        })
+        timestamp = int(time())
+        request = RequestFactory().post(
+            '/api/dataset/query',
+            body,
+            content_type='application/x-json',
+            HTTP_X_APPLICATION=self.app.app_id,
+            HTTP_X_TIMESTAMP=str(timestamp),
+            HTTP_X_SECURITYTOKEN=calc_security_token(
+                self.app.auth_token, timestamp, body
+            ),
+        )
+        return lambda: dataset_query(request)
+
+    def _prepare_commit_update(self):
+        query = Query(
+            {'hostname': Any(*self._random_hostnames(COMMIT_SIZE))},
+            ['hostname', PREFIX + '_string', PREFIX + '_number'],
+        )
+        for obj in query:
+            obj[PREFIX + '_string'] = self.rng.choice(STRING_VALUES)
+            obj[PREFIX + '_number'] = self.rng.randint(1001, 10 ** 6)
+        return lambda: query.commit(user=self.user)
+
+    def _prepare_commit_create(self):
+        query = Query()
+        for _ in range(COMMIT_SIZE):
+            # The created hosts are outside of the generated networks.
+            self._num_created += 1
+            obj = query.new_object(self.servertype_ids[0])
+            obj['hostname'] = '{}-new-{}'.format(PREFIX, self._num_created)
+            obj['intern_ip'] = str(
+                IPv4Address('172.16.0.0') + self._num_created
+            )
+            obj[PREFIX + '_string'] = self.rng.choice(STRING_VALUES)
+            self._created_hostnames.append(obj['hostname'])
+        return lambda: query.commit(user=self.user)
+
+    def _prepare_commit_delete(self):
+        hostnames = self._created_hostnames[:COMMIT_SIZE]
+        del self._created_hostnames[:COMMIT_SIZE]
+        if not hostnames:
+            # There is nothing left from the creations.
+            return self._prepare_commit_create()
+        query = Query({'hostname': Any(*hostnames)}, ['hostname'])
+        query.delete()
+        return lambda: query.commit(user=self.user)
+
+    def _random_hostnames(self, num):
+        hostnames = self.hostnames_by_type[self.servertype_ids[0]]
+        return self.rng.sample(hostnames, min(num, len(hostnames)))
+
+
+def run_workload(workload, iterations):
+    """Measure the workload, and return the results
+
+    The first run is not measured, as it warms up the caches and
+    the prepared statements.  The peak memory is measured on another
+    run, because tracing the memory allocations slows everything down.
+    """
+    workload()()
+
+    latencies = []
+    num_queries = []
+    for _ in range(iterations):
+        run = workload()
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            run()
+            latencies.append(perf_counter() - start)
+        num_queries.append(len(queries))
+
+    run = workload()
+    tracemalloc.start()
+    try:
+        run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    num_queries.sort()
+    result = {
+        'latency_ms': {
+            'min': _milliseconds(latencies[0]),
+            'mean': _milliseconds(sum(latencies) / len(latencies)),
+        },
+        'queries': {
+            'min': num_queries[0],
+            'max': num_queries[-1],
+        },
+        'peak_memory_kib': peak_memory // 1024,
+    }
+    for percentile in PERCENTILES:
+        result['latency_ms']['p{}'.format(percentile)] = _milliseconds(
+            _percentile(latencies, percentile)
+        )
+    result['latency_ms']['max'] = _milliseconds(latencies[-1])
+
+    return result
+
+
+def remove_fleet():
+    """Remove everything generated"""
+    for model in VALUE_MODELS:
+        model.objects.filter(attribute_id__startswith=PREFIX + '_').delete()
+    Server.objects.filter(hostname__startswith=PREFIX + '-').delete()
+    ServertypeAttribute.objects.filter(
+        servertype_id__startswith=PREFIX + '_'
+    ).delete()
+    Attribute.objects.filter(attribute_id__startswith=PREFIX + '_').delete()
+    Servertype.objects.filter(servertype_id__startswith=PREFIX + '_').delete()
+
+
+def _bulk_create_servers(rows):
+    servers = [
+        Server(hostname=h, intern_ip=i, servertype_id=s) for h, i, s in rows
+    ]
+    return Server.objects.bulk_create(servers, batch_size=BATCH_SIZE)
+
+
+def _bulk_create_values(values):
+    values_by_model = {}
+    for value in values:
+        values_by_model.setdefault(type(value), []).append(value)
+    for model, model_values in values_by_model.items():
+        model.objects.bulk_create(model_values, batch_size=BATCH_SIZE)
+
+
+def _value(model, server, attribute_id, value=None):
+    obj = model(
+        server=server, attribute_id='{}_{}'.format(PREFIX, attribute_id)
+    )
+    if value is not None:
+        obj.value = value
+    return obj
+
+
+def _percentile(values, percentile):
+    # The nearest-rank method on the sorted values
+    index = -(-len(values) * percentile // 100) - 1
+    return values[max(index, 0)]
+
+
+def _milliseconds(seconds):
+    return round(seconds * 1000, 3)
@@ -0,0 +1,84 @@
+"""Serveradmin - Post Commit Worker
+
+Send the post_commit_async signal for the commits on the outbox
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Event
+from time import sleep
+
+from django.core.management import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from serveradmin.serverdb.commit_outbox import (
+    claim_post_commit_events,
+    deliver_post_commit_event,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help=(
+            'Number of threads delivering the events'
+        ))
+        parser.add_argument('--batch-size', type=int, default=10, help=(
+            'Number of events claimed by a thread at once'
+        ))
+        parser.add_argument('--poll-interval', type=float, default=1.0, help=(
+            'Seconds to wait when there are no events due'
+        ))
+        parser.add_argument('--lease', type=int, default=300, help=(
+            'Seconds an event is claimed by a thread for delivering it'
+        ))
+        parser.add_argument('--max-delay', type=int, default=3600, help=(
+            'Maximum seconds to wait before retrying a failed event'
+        ))
+        parser.add_argument('--once', action='store_true', help=(
+            'Exit when there are no events due instead of waiting'
+        ))
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+
+        stopping = Event()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            futures = [
+                executor.submit(self._work, stopping, options)
+                for i in range(options['concurrency'])
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                stopping.set()
+
+    def _work(self, stopping, options):
+        lease = timedelta(seconds=options['lease'])
+        max_delay = timedelta(seconds=options['max_delay'])
+        try:
+            while not stopping.is_set():
+                close_old_connections()
+                events = claim_post_commit_events(
+                    options['batch_size'], lease
+                )
+                for event in events:
+                    deliver_post_commit_event(event, max_delay)
+                if not events:
+                    if options['once']:
+                        break
+                    sleep(options['poll_interval'])
+        except Exception:
+            logger.exception('Post commit worker failed')
+            stopping.set()
+            raise
+        finally:
+            connection.close()
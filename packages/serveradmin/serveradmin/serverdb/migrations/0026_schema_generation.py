@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serverdb', '0025_rename_serverbooleanattribute_attribute_server_bool_attribu_25fb6c_idx_and_more'),
+    ]
+
+    operations = [
+        # Generation counter of the schema cache.  We start by calling
+        # nextval() once, because last_value of a fresh sequence is
+        # the same as after the first call.
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE serverdb_schema_generation;",
+                "SELECT nextval('serverdb_schema_generation');",
+            ],
+            reverse_sql=[
+                "DROP SEQUENCE serverdb_schema_generation;",
+            ],
+        ),
+    ]
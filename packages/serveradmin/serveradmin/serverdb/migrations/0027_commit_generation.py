@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serverdb', '0026_schema_generation'),
+    ]
+
+    operations = [
+        # Generation counter of the query cache bumped after every commit
+        migrations.RunSQL(
+            sql=[
+                "CREATE SEQUENCE serverdb_commit_generation;",
+                "SELECT nextval('serverdb_commit_generation');",
+            ],
+            reverse_sql=[
+                "DROP SEQUENCE serverdb_commit_generation;",
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:24
+
+import django.db.models.deletion
+import django.utils.timezone
+import serveradmin.serverdb.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('serverdb', '0027_commit_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostCommitEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField(encoder=serveradmin.serverdb.models.Change.ChangeJSONEncoder)),
+                ('created_on', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_on', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('commit', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='serverdb.changecommit')),
+            ],
+        ),
+    ]
@@ -4,6 +4,7 @@ Copyright (c) 2021 InnoGames GmbH
 """
 
 import re
+from decimal import Decimal
 from ipaddress import (
     IPv4Address,
     IPv6Address,
@@ -22,7 +23,7 @@ from django.contrib.postgres.indexes import GistIndex
 from django.core.exceptions import ValidationError
 from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connection, models
 from django.db.models import Q
 from django.utils.timezone import now
 from django.utils.translation import gettext as _
@@ -225,6 +226,153 @@ def network_overlaps(
         )
 
 
+def validate_unique_ips(
+    new_ips: list[
+        tuple["Server", Optional[str], Union[IPv4Interface, IPv6Interface]]
+    ],
+) -> None:
+    """Validate many IP addresses at once
+
+    This applies the rules of is_unique_ip() for the servers with
+    ip_addr_type host, and the rules of network_overlaps() for the ones
+    with ip_addr_type network, to all of the given IP addresses together.
+    They are compared with the existing ones using a single query per
+    address family, and with each other in memory.  Raises a single
+    ValidationError listing all of the conflicts.
+
+    :param new_ips:         Tuples of the Server object, the attribute id or
+                            None for intern_ip, and the IP address.  The
+                            servertypes of the servers should be loaded
+                            already to not query them one by one.
+    :return:
+    """
+
+    conflicts = {}
+    for ip_version in (4, 6):
+        entries = [
+            (index, new_ip)
+            for index, new_ip in enumerate(new_ips)
+            if new_ip[2].version == ip_version
+            if new_ip[0].servertype.ip_addr_type in ("host", "network")
+        ]
+        if entries:
+            for index, hostname, attribute_id in _get_ip_conflicts(entries):
+                conflicts.setdefault(index, []).append(
+                    f"{hostname} ({attribute_id or 'intern_ip'})"
+                )
+
+    for index, other_index in _get_new_ip_conflicts(new_ips):
+        other_server, other_attribute_id, _value = new_ips[other_index]
+        conflicts.setdefault(index, []).append(
+            f"{other_server.hostname} ({other_attribute_id or 'intern_ip'})"
+        )
+
+    if conflicts:
+        raise ValidationError(
+            [
+                f"Can't set IP address {new_ips[index][2]} on "
+                f"{new_ips[index][0].hostname}, conflicts with: "
+                f"{', '.join(conflicts[index])}"
+                for index in sorted(conflicts)
+            ]
+        )
+
+
+def _get_ip_conflicts(entries):
+    # The new addresses are passed as arrays to be joined with the
+    # existing ones, so the indexes on the values can be used for all
+    # of them.  The conditions are the same as is_unique_ip() and
+    # network_overlaps().
+    new_sql = (
+        "unnest(%s::int[], %s::inet[], %s::int[], %s::text[], %s::text[]) "
+        "AS new_ip (index, value, server_id, attribute_id, servertype_id)"
+    )
+    sql = []
+    params = []
+    for ip_addr_type, operator, servertype_condition in (
+        ("host", "=", ""),
+        ("network", "&&", " AND server.servertype_id = new_ip.servertype_id"),
+    ):
+        new_params = list(
+            zip(
+                *(
+                    (
+                        index,
+                        str(value),
+                        server.server_id,
+                        attribute_id,
+                        server.servertype_id,
+                    )
+                    for index, (server, attribute_id, value) in entries
+                    if server.servertype.ip_addr_type == ip_addr_type
+                )
+            )
+        )
+        if not new_params:
+            continue
+
+        sql.append(
+            "SELECT new_ip.index, server.hostname, NULL"
+            f" FROM {new_sql}"
+            f" JOIN server ON server.intern_ip {operator} new_ip.value"
+            " JOIN servertype"
+            " ON servertype.servertype_id = server.servertype_id"
+            f" WHERE servertype.ip_addr_type = %s{servertype_condition}"
+            " AND server.server_id IS DISTINCT FROM new_ip.server_id"
+        )
+        sql.append(
+            "SELECT new_ip.index, server.hostname, sub.attribute_id"
+            f" FROM {new_sql}"
+            " JOIN server_inet_attribute AS sub"
+            f" ON sub.value {operator} new_ip.value"
+            " JOIN server ON server.server_id = sub.server_id"
+            " JOIN servertype"
+            " ON servertype.servertype_id = server.servertype_id"
+            f" WHERE servertype.ip_addr_type = %s{servertype_condition}"
+            " AND server.server_id IS DISTINCT FROM new_ip.server_id"
+            " AND (new_ip.attribute_id IS NULL"
+            " OR sub.attribute_id = new_ip.attribute_id)"
+        )
+        params += [list(p) for p in new_params] + [ip_addr_type]
+        params += [list(p) for p in new_params] + [ip_addr_type]
+
+    with connection.cursor() as cursor:
+        cursor.execute(" UNION ALL ".join(sql) + " ORDER BY 1, 2", params)
+        return cursor.fetchall()
+
+
+def _get_new_ip_conflicts(new_ips):
+    hosts = {}
+    networks = {}
+    for index, (server, attribute_id, value) in enumerate(new_ips):
+        ip_addr_type = server.servertype.ip_addr_type
+        if ip_addr_type == "host":
+            others = hosts.setdefault(value, [])
+        elif ip_addr_type == "network":
+            others = networks.setdefault(
+                (server.servertype_id, value.version), []
+            )
+        else:
+            continue
+
+        for other_index in others:
+            other_server, other_attribute_id, other_value = new_ips[
+                other_index
+            ]
+            if other_server is server:
+                continue
+            if attribute_id and other_attribute_id and (
+                attribute_id != other_attribute_id
+            ):
+                continue
+            if ip_addr_type == "network" and not value.network.overlaps(
+                other_value.network
+            ):
+                continue
+            yield index, other_index
+        others.append(index)
+
+
 def is_network(ip_interface: Union[IPv4Interface, IPv6Interface]) -> None:
     """Validate if IPv4/IPv6 interface is a network
 
@@ -256,6 +404,11 @@ def inet_to_python(obj: object) -> Union[IPv4Interface, IPv6Interface]:
         raise ValidationError(str(error))
 
 
+def number_to_python(value: Decimal) -> Union[int, float]:
+    """Transform the number attribute value from the database"""
+    return int(value) if value.as_tuple().exponent == 0 else float(value)
+
+
 class Servertype(models.Model):
     servertype_id = models.CharField(
         max_length=32,
@@ -384,6 +537,10 @@ class Attribute(models.Model):
 
         return re_compiled.match(value)
 
+    def get_target_servertype_ids(self):
+        # Iterating all() makes use of the prefetched objects, if any.
+        return [s.servertype_id for s in self.target_servertype.all()]
+
     def clean(self):
         if self.regexp == "":
             self.regexp = None
@@ -403,7 +560,7 @@ Attribute.specials = {
         multi=False,
         clone=False,
         group="base",
-        special=ServerTableSpecial("server_id"),
+        special=ServerTableSpecial("server_id", unique=True),
     ),
     "hostname": Attribute(
         attribute_id="hostname",
@@ -522,6 +679,16 @@ class Server(models.Model):
     def clean(self):
         super(Server, self).clean()
 
+        self.clean_intern_ip()
+
+        ip_addr_type = self.servertype.ip_addr_type
+        if ip_addr_type == "host":
+            is_unique_ip(self.intern_ip, self, ["host"])
+        elif ip_addr_type == "network":
+            network_overlaps(self.intern_ip, self, ["network"])
+
+    def clean_intern_ip(self):
+        """Validate the intern_ip without comparing it to the others"""
         ip_addr_type = self.servertype.ip_addr_type
         if ip_addr_type == "null":
             if self.intern_ip is not None:
@@ -540,14 +707,10 @@ class Server(models.Model):
             if type(self.intern_ip) not in [IPv4Interface, IPv6Interface]:
                 self.intern_ip = inet_to_python(self.intern_ip)
 
-            if ip_addr_type == "host":
+            if ip_addr_type in ("host", "loadbalancer"):
                 is_ip_address(self.intern_ip)
-                is_unique_ip(self.intern_ip, self, ["host"])
             elif ip_addr_type == "network":
                 is_network(self.intern_ip)
-                network_overlaps(self.intern_ip, self, ["network"])
-            elif ip_addr_type == "loadbalancer":
-                is_ip_address(self.intern_ip)
 
     def get_attributes(self, attribute):
         model = ServerAttribute.get_model(attribute.type)
@@ -614,22 +777,22 @@ class ServerStringAttribute(ServerAttribute):
         unique_together = [["server", "attribute", "value"]]
         indexes = [models.Index(fields=["attribute", "value"])]
 
-    def save_value(self, value):
+    def clean(self):
+        super(ServerAttribute, self).clean()
+
         for char in "'\"":
-            if char in value:
+            if char in self.value:
                 raise ValidationError(
                     '"{}" character is not allowed on string attributes'.format(char)
                 )
         for datatype, regexp in STR_BASED_DATATYPES:
-            if regexp.match(value):
+            if regexp.match(self.value):
                 raise ValidationError(
                     'String attribute value "{}" matches with {} type'.format(
-                        value, datatype.__name__
+                        self.value, datatype.__name__
                     )
                 )
 
-        super().save_value(value)
-
 
 class ServerRelationAttributeManager(models.Manager):
     def get_queryset(self):
@@ -667,17 +830,22 @@ class ServerRelationAttribute(ServerAttribute):
         except Server.DoesNotExist:
             raise ValidationError('No server with hostname "{0}" exist.'.format(value))
 
-        target_servertypes = self.attribute.target_servertype.all()
-        if target_servertypes.exists() and target_server.servertype not in target_servertypes:
+        ServerAttribute.save_value(self, target_server)
+
+    def clean(self):
+        super(ServerAttribute, self).clean()
+
+        target_servertype_ids = self.attribute.get_target_servertype_ids()
+        if (
+            target_servertype_ids and
+            self.value.servertype_id not in target_servertype_ids
+        ):
             raise ValidationError(
                 'Attribute "{0}" has to be from servertype "{1}".'.format(
-                    self.attribute,
-                    ', '.join(str(st) for st in target_servertypes),
+                    self.attribute, ', '.join(target_servertype_ids)
                 )
             )
 
-        ServerAttribute.save_value(self, target_server)
-
 
 class ServerBooleanAttribute(ServerAttribute):
     attribute = models.ForeignKey(
@@ -719,11 +887,7 @@ class ServerNumberAttribute(ServerAttribute):
         indexes = [models.Index(fields=["attribute", "value"])]
 
     def get_value(self):
-        return (
-            int(self.value)
-            if self.value.as_tuple().exponent == 0
-            else float(self.value)
-        )
+        return number_to_python(self.value)
 
 
 class ServerInetAttribute(ServerAttribute):
@@ -747,6 +911,18 @@ class ServerInetAttribute(ServerAttribute):
     def clean(self):
         super(ServerAttribute, self).clean()
 
+        self.clean_value()
+
+        ip_addr_type = self.server.servertype.ip_addr_type
+        if ip_addr_type == "host":
+            is_unique_ip(self.value, self.server, ["host"], self.attribute_id)
+        elif ip_addr_type == "network":
+            network_overlaps(
+                self.value, self.server, ["network"], self.attribute_id
+            )
+
+    def clean_value(self):
+        """Validate the value without comparing it to the others"""
         if self.attribute.inet_address_family == Attribute.InetAddressFamilyChoice.IPV4:
             allowed_types = (IPv4Interface,)
         elif (
@@ -776,14 +952,10 @@ class ServerInetAttribute(ServerAttribute):
                 code="invalid value",
                 params={"attribute_id": self.attribute_id},
             )
-        elif ip_addr_type == "host":
+        elif ip_addr_type in ("host", "loadbalancer"):
             is_ip_address(self.value)
-            is_unique_ip(self.value, self.server, ["host"], self.attribute_id)
         elif ip_addr_type == "network":
             is_network(self.value)
-            network_overlaps(self.value, self.server, ["network"], self.attribute_id)
-        elif ip_addr_type == "loadbalancer":
-            is_ip_address(self.value)
 
 
 class ServerMACAddressAttribute(ServerAttribute):
@@ -885,3 +1057,23 @@ class Change(models.Model):
 
     class Meta:
         app_label = "serverdb"
+
+
+class PostCommitEvent(models.Model):
+    """The commits waiting for the post_commit_async receivers
+
+    They are written in the same transaction as the commits, and deleted
+    after all receivers have succeeded.
+    """
+
+    commit = models.ForeignKey(
+        ChangeCommit, null=True, on_delete=models.CASCADE
+    )
+    payload = models.JSONField(encoder=Change.ChangeJSONEncoder)
+    created_on = models.DateTimeField(default=now)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_on = models.DateTimeField(default=now, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        app_label = "serverdb"
@@ -0,0 +1,181 @@
+"""Serveradmin - Query Cache
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# Many clients are polling the same queries every few seconds.  We can
+# cache the serialized results of those, as long as we can be sure nothing
+# has changed since.  The results depend on the data and the schema, so
+# both of their generation counters are part of the cache keys.  The commit
+# generation is bumped after every commit, so a cached result is never
+# read again once anything is committed.  The old entries are not deleted,
+# they are left to be evicted by the backend.
+#
+# The generations are read before executing the query.  If a commit
+# happens in between, the result would be stored with the old generation,
+# so it would not be read by anybody who has noticed the new one.
+#
+# The cache is disabled by default.  It can be enabled by setting
+# QUERY_CACHE_BACKEND to one of the backends below, or to anything
+# implementing the same get() and set() methods, with the arguments in
+# QUERY_CACHE_OPTIONS.  Only the changes through commit_query() bump
+# the generation.  Don't enable the cache, if the servers are changed
+# in other ways.
+
+import json
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from adminapi.request import json_encode_extra
+from serveradmin.common.timing import span
+from serveradmin.serverdb.query_executer import execute_query
+from serveradmin.serverdb.replica import read_from_primary
+from serveradmin.serverdb.schema_cache import GENERATION_SEQUENCE
+from serveradmin.serverdb.signals import post_commit
+
+COMMIT_GENERATION_SEQUENCE = 'serverdb_commit_generation'
+
+_backend = None
+_backend_lock = Lock()
+
+
+class LocalMemoryBackend:
+    """Keep the entries in the memory of the process
+
+    The least recently used entries are evicted, when there are more
+    than the maximum number of entries.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DjangoCacheBackend:
+    """Keep the entries on one of the caches configured for Django
+
+    This allows sharing the entries between the processes.
+    """
+
+    def __init__(self, alias='default', timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+
+    def get(self, key):
+        return caches[self.alias].get(key)
+
+    def set(self, key, payload):
+        caches[self.alias].set(key, payload, self.timeout)
+
+
+def execute_cached_query(filters, restrict, order_by):
+    """Return the results of the query serialized as JSON
+
+    They are served from the cache, if it is enabled and nothing has
+    changed since they are cached.
+    """
+    backend = get_backend()
+    if backend is None:
+        return _dumps(execute_query(filters, restrict, order_by))
+
+    with span('cache'):
+        key = _get_key(filters, restrict, order_by, _get_generations())
+        payload = backend.get(key)
+    if payload is None:
+        # The generations are read from the primary.  A replica might not
+        # have the latest commit yet, and the stale results would be kept
+        # with the new generation.
+        with read_from_primary():
+            payload = _dumps(execute_query(filters, restrict, order_by))
+        with span('cache'):
+            backend.set(key, payload)
+
+    return payload
+
+
+def get_backend():
+    global _backend
+
+    if _backend is None and settings.QUERY_CACHE_BACKEND:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.QUERY_CACHE_BACKEND)(
+                    **settings.QUERY_CACHE_OPTIONS
+                )
+
+    return _backend
+
+
+def _get_key(filters, restrict, order_by, generations):
+    query = json.dumps(
+        [
+            {a: f.serialize() for a, f in filters.items()},
+            restrict,
+            order_by,
+        ],
+        default=json_encode_extra,
+        sort_keys=True,
+    )
+    return 'serveradmin_query:{}:{}:{}'.format(
+        *generations, sha1(query.encode()).hexdigest()
+    )
+
+
+def _get_generations():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT s.last_value, c.last_value FROM {} AS s, {} AS c'.format(
+                GENERATION_SEQUENCE, COMMIT_GENERATION_SEQUENCE
+            )
+        )
+        return cursor.fetchone()
+
+
+def _dumps(results):
+    with span('encode'):
+        return json.dumps(results, default=json_encode_extra)
+
+
+def _bump_generation():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval('{}')".format(COMMIT_GENERATION_SEQUENCE)
+        )
+
+
+@receiver(post_commit)
+def invalidate_on_commit(sender, **kwargs):
+    # The commit might be a part of a bigger transaction, in which case
+    # the changes would not be visible until it is committed.
+    transaction.on_commit(_bump_generation)
+
+
+@receiver(setting_changed)
+def reset_backend(setting, **kwargs):
+    global _backend
+
+    if setting in ('QUERY_CACHE_BACKEND', 'QUERY_CACHE_OPTIONS'):
+        _backend = None
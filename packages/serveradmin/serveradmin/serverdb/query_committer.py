@@ -4,29 +4,39 @@ Copyright (c) 2023 InnoGames GmbH
 """
 
 import logging
+from collections import defaultdict
 from itertools import chain
 from typing import Optional
 
 from django.contrib.auth.models import User
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import IntegrityError, transaction
+from django.db.models import Q
 
 from adminapi.dataset import DatasetCommit
 from adminapi.request import json_encode_extra
+from serveradmin.access_control.acl_cache import get_access_control_snapshot
 from serveradmin.apps.models import Application
+from serveradmin.common.metrics import measure_lock_wait, observe_commit
+from serveradmin.common.timing import span
+from serveradmin.serverdb.change_feed import lock_change_log
+from serveradmin.serverdb.commit_outbox import enqueue_post_commit
 from serveradmin.serverdb.models import (
-    Servertype,
     Attribute,
     Server,
     ServerAttribute,
+    ServerBooleanAttribute,
+    ServerInetAttribute,
     ServerRelationAttribute,
     ChangeCommit,
-    Change, ServertypeAttribute,
+    Change,
+    validate_unique_ips,
 )
 from serveradmin.serverdb.query_materializer import (
     QueryMaterializer,
     get_default_attribute_values,
 )
+from serveradmin.serverdb.schema_cache import get_schema
 from serveradmin.serverdb.signals import pre_commit_critical, pre_commit, post_commit
 
 logger = logging.getLogger(__name__)
@@ -59,21 +69,29 @@ def commit_query(created=[], changed=[], deleted=[], app=None, user=None):
     # First send signals which failure means the commit can't be done.
     # Exceptions raised in those signals will propagate to here
     # and prevent the commit.
-    pre_commit_critical.send(
-        commit_query, created=created, changed=changed, deleted=deleted
-    )
-    # Then send signals which failure can be safely ignored.
-    pre_commit.send_robust(
-        commit_query, created=created, changed=changed, deleted=deleted
-    )
+    with span('pre_commit'):
+        pre_commit_critical.send(
+            commit_query, created=created, changed=changed, deleted=deleted
+        )
+        # Then send signals which failure can be safely ignored.
+        pre_commit.send_robust(
+            commit_query, created=created, changed=changed, deleted=deleted
+        )
+
+    schema = get_schema()
+    attribute_lookup = schema.attributes
 
-    # TODO: Find out which attributes we actually need
-    attribute_lookup = {a.pk: a for a in Attribute.objects.all()}
+    # The created and deleted objects are logged as a whole, so we need all
+    # of their attributes.  The changed objects are only validated, so it
+    # is enough to get the attributes necessary for that.
     joined_attributes = {
         a: None
         for a
         in list(attribute_lookup.values()) + list(Attribute.specials.values())
     }
+    changed_joined_attributes = _get_changed_joined_attributes(
+        schema, changed, user, app
+    )
 
     # TODO: We rely on the "protocol" that everything that creates or changes
     #       one or more Server(s) uses this API or also acquires an exclusive
@@ -87,10 +105,15 @@ def commit_query(created=[], changed=[], deleted=[], app=None, user=None):
     #       changes elsewhere by changing to the isolation level
     #       # "repeatable read".
     with transaction.atomic():
-        changed_servers = _fetch_servers(set(c['object_id'] for c in changed))
-        unchanged_objects = _materialize(changed_servers, joined_attributes)
+        with span('lock'), measure_lock_wait():
+            changed_servers = _fetch_servers(
+                set(c['object_id'] for c in changed)
+            )
+            deleted_servers = _fetch_servers(deleted)
+        unchanged_objects = _materialize(
+            changed_servers, changed_joined_attributes
+        )
 
-        deleted_servers = _fetch_servers(deleted)
         deleted_objects = _materialize(deleted_servers, joined_attributes)
         # TODO: Refactor validation
         #
@@ -111,31 +134,47 @@ def commit_query(created=[], changed=[], deleted=[], app=None, user=None):
         # with the Django work flow and last but least allow us to use the
         # same logic/code for the Servershell (edit, new) page and the Query
         # engine (Web API) which currently does not use forms at all.
-        _validate(attribute_lookup, changed, unchanged_objects)
+        with span('validate'):
+            _validate(schema, changed, unchanged_objects)
 
         # Changes should be applied in order to prevent integrity errors.
-        _delete_attributes(attribute_lookup, changed, changed_servers, deleted)
-        _delete_servers(changed, deleted, deleted_servers)
-        created_servers = _create_servers(attribute_lookup, created)
+        with span('write'):
+            _delete_attributes(
+                attribute_lookup, changed, changed_servers, deleted
+            )
+            _delete_servers(changed, deleted, deleted_servers)
+            created_servers = _create_servers(schema, created)
         created_objects = _materialize(created_servers, joined_attributes)
-        _update_servers(changed, changed_servers)
-        _upsert_attributes(attribute_lookup, changed, changed_servers)
-        changed_objects = _materialize(changed_servers, joined_attributes)
+        with span('write'):
+            _update_servers(schema, changed, changed_servers)
+            _upsert_attributes(schema, changed, changed_servers)
+        changed_objects = _materialize(
+            changed_servers, changed_joined_attributes
+        )
 
         # TODO Improve this function by checking only attributes of ACLs that
         #      have actually changed and not all.
-        _access_control(
-            user, app, unchanged_objects,
-            created_objects, changed_objects, deleted_objects
-        )
+        with span('access_control'):
+            _access_control(
+                user, app, unchanged_objects,
+                created_objects, changed_objects, deleted_objects
+            )
 
-        commit_id = _log_changes(user, app, changed, created_objects, deleted_objects)
+        with span('log'):
+            commit_id = _log_changes(
+                schema, user, app, changed, created_objects, deleted_objects
+            )
+            # The slow receivers are run by the post_commit_worker command.
+            enqueue_post_commit(commit_id, created, changed, deleted)
 
-    post_commit.send_robust(
-        commit_query,
-        commit_id=commit_id,
-        created=created, changed=changed, deleted=deleted,
-    )
+    observe_commit(created, changed, deleted)
+
+    with span('post_commit'):
+        post_commit.send_robust(
+            commit_query,
+            commit_id=commit_id,
+            created=created, changed=changed, deleted=deleted,
+        )
 
     return DatasetCommit(
         list(created_objects.values()),
@@ -144,8 +183,9 @@ def commit_query(created=[], changed=[], deleted=[], app=None, user=None):
     ), commit_id
 
 
-def _validate(attribute_lookup, changed, changed_objects):
-    servertype_attributes = _get_servertype_attributes(changed_objects)
+def _validate(schema, changed, changed_objects):
+    attribute_lookup = schema.attributes
+    servertype_attributes = _get_servertype_attributes(schema, changed_objects)
 
     # Attributes must be always validated
     violations_attribs = _validate_attributes(
@@ -237,8 +277,9 @@ def _delete_servers(changed, deleted, deleted_servers):
             del changed[server_id]
 
 
-def _create_servers(attribute_lookup, created):
-    created_servers = {}
+def _create_servers(schema, created):
+    servers = []
+    values = []
     for attributes in created:
         if not attributes.get('hostname'):
             raise CommitError('"hostname" attribute is required.')
@@ -246,26 +287,34 @@ def _create_servers(attribute_lookup, created):
 
         if not attributes.get('servertype'):
             raise CommitError('"servertype" attribute is required.')
-        servertype = _get_servertype(attributes)
+        servertype = _get_servertype(schema, attributes)
 
         intern_ip = attributes.get('intern_ip')
 
-        attributes = dict(_get_real_attributes(attributes, attribute_lookup))
-        _validate_real_attributes(servertype, attributes)
-
-        server = _insert_server(hostname, intern_ip, servertype, attributes)
+        attributes = dict(_get_real_attributes(attributes, schema.attributes))
+        _validate_real_attributes(
+            schema.servertype_attributes[servertype.servertype_id], attributes
+        )
 
-        created_server = {k.pk: v for k, v in attributes.items()}
-        created_server['hostname'] = hostname
-        created_server['servertype'] = servertype.pk
-        created_server['intern_ip'] = intern_ip
+        server = Server(
+            hostname=hostname,
+            intern_ip=intern_ip,
+            servertype=servertype,
+        )
+        servers.append(server)
+        for attribute, value in attributes.items():
+            if attribute.multi:
+                values.extend((server, attribute, v) for v in value)
+            else:
+                values.append((server, attribute, value))
 
-        created_servers[server.server_id] = server
+    _insert_servers(servers)
+    _insert_attributes(schema, values)
 
-    return created_servers
+    return {s.server_id: s for s in servers}
 
 
-def _update_servers(changed, changed_servers):
+def _update_servers(schema, changed, changed_servers):
     really_changed = set()
     for changes in changed:
         object_id = changes['object_id']
@@ -284,11 +333,24 @@ def _update_servers(changed, changed_servers):
             really_changed.add(server)
 
     for server in really_changed:
-        server.full_clean()
+        # The servertypes cannot be changed, so they are taken from
+        # the schema instead of querying them for every server.
+        server.servertype = schema.servertypes[server.servertype_id]
+        server.clean_fields(exclude=['servertype'])
+        server.clean_intern_ip()
+        server.validate_unique()
+    validate_unique_ips([
+        (s, None, s.intern_ip)
+        for s in really_changed
+        if s.intern_ip is not None
+    ])
+    for server in really_changed:
         server.save()
 
 
-def _upsert_attributes(attribute_lookup, changed, changed_servers):
+def _upsert_attributes(schema, changed, changed_servers):
+    values = []
+    replaced = []
     for changes in changed:
         object_id = changes['object_id']
 
@@ -296,13 +358,12 @@ def _upsert_attributes(attribute_lookup, changed, changed_servers):
             if attribute_id in Attribute.specials:
                 continue
 
-            attribute = attribute_lookup[attribute_id]
+            attribute = schema.attributes[attribute_id]
             server = changed_servers[object_id]
 
             action = change['action']
             if action == 'multi':
-                for value in change['add']:
-                    server.add_attribute(attribute, value)
+                values.extend((server, attribute, v) for v in change['add'])
                 continue
 
             if action not in ('new', 'update'):
@@ -310,12 +371,51 @@ def _upsert_attributes(attribute_lookup, changed, changed_servers):
             if change['new'] is None:
                 continue
 
-            try:
-                server_attribute = server.get_attributes(attribute).get()
-            except ServerAttribute.get_model(attribute.type).DoesNotExist:
-                server.add_attribute(attribute, change['new'])
-            else:
-                server_attribute.save_value(change['new'])
+            # The single values are replaced as a whole.  False booleans
+            # are not stored, so they are only deleted.
+            replaced.append((server, attribute))
+            values.append((server, attribute, change['new']))
+
+    _insert_attributes(schema, values, replaced)
+
+
+def _get_changed_joined_attributes(schema, changed, user, app):
+    """Get the attributes necessary to validate the changed objects
+
+    Those are the changed attributes, and the special attributes.  If
+    the access control is going to be enforced, the attributes the ACLs
+    filter on, and the computed attributes are also necessary, because
+    the latter can change together with the changed attributes.
+    """
+    attribute_ids = set(Attribute.specials)
+    for changes in changed:
+        attribute_ids.update(changes)
+
+    acls = _get_access_control_groups(user, app)
+    if acls:
+        for acl in acls:
+            attribute_ids.update(acl.get_filters())
+        attribute_ids.update(
+            a.attribute_id
+            for a in schema.attributes.values()
+            if a.type in ('supernet', 'domain')
+        )
+
+    joined_attributes = {}
+    for attribute_id in attribute_ids:
+        if attribute_id in Attribute.specials:
+            joined_attributes[Attribute.specials[attribute_id]] = None
+        elif attribute_id in schema.attributes:
+            joined_attributes[schema.attributes[attribute_id]] = None
+
+    return joined_attributes
+
+
+def _get_access_control_groups(user, app):
+    """Get the ACLs to enforce on the commit"""
+    if (user and user.is_superuser) or (app and app.superuser):
+        return []
+    return get_access_control_snapshot().get_access_control_groups(user, app)
 
 
 def _access_control(
@@ -348,11 +448,20 @@ def _access_control(
     if (user and user.is_superuser) or (app and app.superuser):
         return None
 
+    # The ACLs are compiled and cached, so checking the objects below
+    # doesn't need to query the database.
+    snapshot = get_access_control_snapshot()
+    schema = get_schema()
+
     entities = []
     if app:
-        entities.append(('application', app, list(app.access_control_groups.all())))
+        entities.append((
+            'application', app, snapshot.get_access_control_groups(app=app)
+        ))
     elif user:
-        entities.append(('user', user, list(user.access_control_groups.all())))
+        entities.append((
+            'user', user, snapshot.get_access_control_groups(user=user)
+        ))
     else:
         # This should not be possible as it means not authenticated but better
         # safe than sorry.
@@ -367,7 +476,7 @@ def _access_control(
         # Check app or if not present user permissions
         for entity_class, entity_name, groups in entities:
             acl_violations = {
-                acl: _acl_violations(unchanged_objects, obj, acl)
+                acl: _acl_violations(unchanged_objects, obj, acl, schema)
                 for acl in groups
             }
 
@@ -385,7 +494,7 @@ def _access_control(
                 raise PermissionDenied(msg)
 
 
-def _acl_violations(touched_objects, pending_changes, acl):
+def _acl_violations(touched_objects, pending_changes, acl, schema):
     """Check if ACL allows all the changes to obj
 
     An ACL can fail to validate in two ways.  Every ACL has a filter describing
@@ -407,11 +516,12 @@ def _acl_violations(touched_objects, pending_changes, acl):
     # Check whether the object matches all the attribute filters of the ACL
     for attribute_id, attribute_filter in acl.get_filters().items():
         # TODO: This relies on the object to have all attributes that are
-        #  present in the attribute_filter which currently works because
-        #  we fetch all attributes in commit_query (joined_attribtues).
-        #  This method would be better of not relying on the caller
-        #  making sure passing down all relevant attributes which isn't
-        #  even documented.
+        #  present in the attribute_filter.  The created and the deleted
+        #  objects have all of them (joined_attributes in commit_query).
+        #  The changed objects only have the ones returned by
+        #  _get_changed_joined_attributes(), so it must keep adding
+        #  the attributes the ACLs filter on.  This method would be better
+        #  of not relying on the caller passing down all relevant attributes.
         if pending_changes['object_id'] in touched_objects:
             # If the object already exists ensure the ACL matches the status
             # quo and not the wanted changes.
@@ -444,23 +554,22 @@ def _acl_violations(touched_objects, pending_changes, acl):
     if pending_changes['object_id'] in touched_objects:
         old_object = touched_objects[pending_changes['object_id']]
     else:
-        old_object = get_default_attribute_values(pending_changes['servertype'])
+        old_object = get_default_attribute_values(
+            pending_changes['servertype'], schema
+        )
 
-    # Gather attribute ids this ACL allows changing
-    attribute_ids = acl.get_permissible_attribute_ids()
+    servertype_attributes = schema.servertype_attributes.get(
+        pending_changes['servertype'], {}
+    )
 
     # Check whether all changed attributes are on this ACLs attribute whitelist
     for attribute_id, attribute_value in pending_changes.items():
         if (
-            attribute_id not in attribute_ids and
+            not acl.is_permissible(attribute_id) and
             attribute_value != old_object[attribute_id]
         ):
-            is_related_via: bool = ServertypeAttribute.objects.filter(
-                servertype_id=pending_changes['servertype'],
-                attribute_id=attribute_id,
-                related_via_attribute__isnull=False
-            ).exists()
-            if is_related_via:
+            sa = servertype_attributes.get(attribute_id)
+            if sa and sa.related_via_attribute_id:
                 # Attributes which are related via another servertype can be
                 # skipped because permission to change the value is checked
                 # at the target servertype where the actual change takes place.
@@ -476,11 +585,15 @@ def _acl_violations(touched_objects, pending_changes, acl):
     return violations or None
 
 
-def _log_changes(user, app, changed, created_objects, deleted_objects) -> int:
+def _log_changes(
+    schema, user, app, changed, created_objects, deleted_objects
+) -> int:
     changes = list()
     commit = ChangeCommit(user=user, app=app)
 
-    excl_attrs = Attribute.objects.filter(history=False).values_list(flat=True)
+    excl_attrs = {
+        a.attribute_id for a in schema.attributes.values() if not a.history
+    }
     for updates in changed:
         # At least one attribute aside from object_id has changed.
         if len(updates.keys() - excl_attrs) > 1:
@@ -510,6 +623,9 @@ def _log_changes(user, app, changed, created_objects, deleted_objects) -> int:
         ))
 
     if changes:
+        # The commits must get their ids in the order they become visible
+        # for the change feed.
+        lock_change_log()
         commit.save()
         Change.objects.bulk_create(changes)
 
@@ -537,14 +653,11 @@ def _materialize(servers, joined_attributes):
     }
 
 
-def _get_servertype_attributes(servers):
-    servertype_attributes = dict()
-    for servertype_id in {s['servertype'] for s in servers.values()}:
-        servertype_attributes[servertype_id] = dict()
-        for sa in Servertype.objects.get(pk=servertype_id).attributes.all():
-            servertype_attributes[servertype_id][sa.attribute_id] = sa
-
-    return servertype_attributes
+def _get_servertype_attributes(schema, servers):
+    return {
+        servertype_id: schema.servertype_attributes[servertype_id]
+        for servertype_id in {s['servertype'] for s in servers.values()}
+    }
 
 
 def _validate_attributes(changes, servers, servertype_attributes):
@@ -681,10 +794,10 @@ def _build_error_message(violations_attribs, violations_readonly,
     return '. '.join(message)
 
 
-def _get_servertype(attributes):
+def _get_servertype(schema, attributes):
     try:
-        return Servertype.objects.get(pk=attributes['servertype'])
-    except Servertype.DoesNotExist:
+        return schema.servertypes[attributes['servertype']]
+    except KeyError:
         raise CommitError('Unknown servertype: ' + attributes['servertype'])
 
 
@@ -721,13 +834,15 @@ def _get_real_attributes(attributes, attribute_lookup):
         yield attribute, value
 
 
-def _validate_real_attributes(servertype, real_attributes):     # NOQA: C901
+def _validate_real_attributes(  # NOQA: C901
+    servertype_attributes, real_attributes
+):
     violations_regexp = []
     violations_required = []
-    servertype_attributes = set()
-    for sa in servertype.attributes.all():
+    attributes = set()
+    for sa in servertype_attributes.values():
         attribute = sa.attribute
-        servertype_attributes.add(attribute)
+        attributes.add(attribute)
 
         # Ignore the related via attributes
         if sa.related_via_attribute:
@@ -764,7 +879,7 @@ def _validate_real_attributes(servertype, real_attributes):     # NOQA: C901
     # Check for attributes that are not defined on this servertype
     violations_attribs = []
     for attr in real_attributes:
-        if attr not in servertype_attributes:
+        if attr not in attributes:
             violations_attribs.append(str(attr))
 
     handle_violations(
@@ -774,27 +889,121 @@ def _validate_real_attributes(servertype, real_attributes):     # NOQA: C901
     )
 
 
-def _insert_server(hostname, intern_ip, servertype, attributes):
-
-    if Server.objects.filter(hostname=hostname).exists():
-        raise CommitError(f'Server with hostname "{hostname}" already exists')
+def _insert_servers(servers):
+    if not servers:
+        return
 
-    server = Server(
-        hostname=hostname,
-        intern_ip=intern_ip,
-        servertype=servertype,
+    hostnames = set(
+        Server.objects
+        .filter(hostname__in=[s.hostname for s in servers])
+        .values_list('hostname', flat=True)
     )
-    server.full_clean()
-    server.save()
+    for server in servers:
+        if server.hostname in hostnames:
+            raise CommitError(
+                f'Server with hostname "{server.hostname}" already exists'
+            )
+        hostnames.add(server.hostname)
+
+        # The servertypes are coming from the schema, and the uniqueness
+        # of the hostnames is checked above, so we can skip the queries
+        # Django would make for them.  The IP addresses are validated
+        # all together below.
+        server.clean_fields(exclude=['servertype'])
+        server.clean_intern_ip()
+
+    validate_unique_ips([
+        (s, None, s.intern_ip) for s in servers if s.intern_ip is not None
+    ])
+    Server.objects.bulk_create(servers)
+
+
+def _insert_attributes(schema, values, replaced=()):
+    """Insert the attribute values all at once
+
+    The values are tuples of the servers, the attributes and the values
+    to add.  They are validated the same way as Server.add_attribute()
+    would do, but without querying the database for every one of them.
+    Every table is written with a single statement.  The existing values
+    of the attributes on the replaced server and attribute pairs are
+    deleted first.
+    """
+    server_attributes = _get_server_attributes(schema, values)
+    _delete_server_attributes(replaced)
+
+    for model, objs in server_attributes.items():
+        try:
+            model.objects.bulk_create(objs)
+        except IntegrityError as error:
+            raise CommitError(
+                'Cannot insert the attribute values: {0}'.format(error)
+            )
+
 
-    for attribute, value in attributes.items():
-        if attribute.multi:
-            for single_value in value:
-                server.add_attribute(attribute, single_value)
+def _get_server_attributes(schema, values):
+    related_servers = _get_related_servers(values)
+    ips = []
+    server_attributes = defaultdict(list)
+    for server, attribute, value in values:
+        model = ServerAttribute.get_model(attribute.type)
+        if model is ServerBooleanAttribute:
+            if value:
+                server_attributes[model].append(
+                    model(server=server, attribute=attribute)
+                )
+            continue
+
+        # The servers and the attributes are already known to exist.
+        exclude = ['server', 'attribute']
+        if model is ServerRelationAttribute:
+            value = _get_related_server(related_servers, value)
+            exclude.append('value')
+        elif model is ServerInetAttribute:
+            server.servertype = schema.servertypes[server.servertype_id]
+
+        server_attribute = model(
+            server=server, attribute=attribute, value=value
+        )
+        if model is ServerInetAttribute:
+            server_attribute.clean_fields(exclude=exclude)
+            server_attribute.clean_value()
+            ips.append((server, attribute.pk, server_attribute.value))
         else:
-            server.add_attribute(attribute, value)
+            server_attribute.full_clean(exclude=exclude, validate_unique=False)
+        server_attributes[model].append(server_attribute)
+
+    validate_unique_ips(ips)
+
+    return server_attributes
+
+
+def _get_related_servers(values):
+    hostnames = {v for s, a, v in values if a.type == 'relation'}
+    if not hostnames:
+        return {}
+
+    return {
+        s.hostname: s for s in Server.objects.filter(hostname__in=hostnames)
+    }
+
+
+def _get_related_server(related_servers, hostname):
+    try:
+        return related_servers[hostname]
+    except KeyError:
+        raise ValidationError(
+            'No server with hostname "{0}" exist.'.format(hostname)
+        )
+
+
+def _delete_server_attributes(replaced):
+    conditions = defaultdict(Q)
+    for server, attribute in replaced:
+        model = ServerAttribute.get_model(attribute.type)
+        conditions[model] |= Q(server=server, attribute=attribute)
 
-    return server
+    for model, condition in conditions.items():
+        model.objects.filter(condition).delete()
 
 
 def handle_violations(
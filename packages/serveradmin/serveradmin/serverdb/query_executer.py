@@ -3,17 +3,242 @@
 Copyright (c) 2019 InnoGames GmbH
 """
 
+import json
+import re
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from hashlib import sha1
+from weakref import WeakKeyDictionary
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db import DataError, connection, transaction
+from django.db import DataError, ProgrammingError, transaction
+from psycopg2.errorcodes import INVALID_SQL_STATEMENT_NAME
 
 from adminapi.filters import Any
-from serveradmin.serverdb.models import Attribute, ServertypeAttribute, Server
-from serveradmin.serverdb.sql_generator import get_server_query
-from serveradmin.serverdb.query_materializer import QueryMaterializer
+from serveradmin.common.timing import span
+from serveradmin.serverdb.models import Attribute, Server
+from serveradmin.serverdb.sql_generator import (
+    get_order_by_keys,
+    get_server_count_query,
+    get_server_query,
+)
+from serveradmin.serverdb.query_materializer import (
+    QueryMaterializer,
+    server_from_row,
+)
+from serveradmin.serverdb.replica import get_read_connection
+from serveradmin.serverdb.schema_cache import get_schema
+
+# The prepared statements live as long as the database session.  We keep
+# track of the ones we have on every connection, so that we would only
+# prepare them once.  The limit is to avoid keeping the plans of every
+# query shape ever seen on the long living connections.  They can be
+# disabled with the DATABASE_PREPARED_STATEMENTS setting, if the sessions
+# are shared through a connection pooler in the transaction mode.
+PREPARED_STATEMENTS_LIMIT = 256
+_prepared_statements = WeakKeyDictionary()
+
+# The number of the objects to fetch and materialize at once while
+# streaming the results
+STREAM_CHUNK_SIZE = 1000
+
+# The attribute types the database can order the same way as the query
+# materializer
+SQL_ORDERABLE_TYPES = ('string', 'number', 'date', 'datetime', 'inet')
+
+
+def execute_query(
+    filters, restrict, order_by, limit=None, offset=None, cursor=None
+):
+    """The main function to execute queries
+
+    The limit, offset and cursor arguments are for pagination.  Use
+    execute_query_page() to get the cursor to continue from.
+    """
+    return execute_query_page(
+        filters, restrict, order_by, limit, offset, cursor
+    )[0]
+
+
+def execute_query_page(
+    filters, restrict, order_by, limit=None, offset=None, cursor=None
+):
+    """Execute the query and return the results with the next cursor
+
+    The cursor is an opaque string to pass back to get the next page.
+    It is None, if there cannot be more results.
+    """
+    _check_page(limit, offset)
+    with span('schema'):
+        (
+            filters, attribute_lookup, related_vias, materializer_args,
+            sql_order_by,
+        ) = _prepare_query(filters, restrict, order_by)
+
+    cursor_key = _get_cursor_key(sql_order_by)
+    after, offset = _get_page_start(cursor, cursor_key, offset, sql_order_by)
+
+    with _read_only_transaction():
+        # The actual query execution procedure is 2 steps: first filtering
+        # the objects, and then materializing the requested attributes.
+        # The joined attributes are also handled on the materialization
+        # step, and so is the ordering, if it cannot be done by the database.
+        # Some properties of the attribute values which might be relevant
+        # for ordering may be lost after the materialization.  See the query
+        # materializer module for its details.  The functions on this module
+        # continues with the filtering step.
+        if sql_order_by is None:
+            with span('filter'):
+                servers = _get_servers(
+                    filters, attribute_lookup, related_vias
+                )
+            results = list(QueryMaterializer(servers, *materializer_args))
+            return _slice_page(results, limit, offset)
+
+        with span('filter'):
+            servers = _get_servers(
+                filters, attribute_lookup, related_vias,
+                sql_order_by, after, limit, offset,
+            )
+        results = list(QueryMaterializer(servers, *materializer_args))
+        return results, _get_next_cursor(
+            servers, sql_order_by, cursor_key, limit, offset
+        )
+
+
+def execute_queries(queries):
+    """Execute many queries on the same snapshot
+
+    The queries are given as tuples of filters, restrict and order_by
+    arguments.  The results are returned in the same order.  They share
+    the schema, and the database transaction, so they are consistent
+    with each other.
+    """
+    with span('schema'):
+        schema = get_schema()
+        prepared_queries = [
+            _prepare_query(filters, restrict, order_by, schema)
+            for filters, restrict, order_by in queries
+        ]
+
+    with _read_only_transaction():
+        results = []
+        for (
+            filters, attribute_lookup, related_vias, materializer_args,
+            sql_order_by,
+        ) in prepared_queries:
+            with span('filter'):
+                servers = _get_servers(
+                    filters, attribute_lookup, related_vias,
+                    sql_order_by or (),
+                )
+            results.append(list(QueryMaterializer(
+                servers, *materializer_args, schema=schema
+            )))
+        return results
+
+
+def stream_query(filters, restrict, order_by, chunk_size=STREAM_CHUNK_SIZE):
+    """Execute the query and return an iterator of the results in chunks
+
+    The objects are fetched through a server-side cursor, and materialized
+    chunk by chunk, so the memory used doesn't grow with the number of
+    the results.  This is not possible, if the query materializer needs
+    to order them.  Then, all of them are materialized at once.  The query
+    is checked right away, but it is only executed during the iteration.
+    """
+    return _stream_query(
+        *_prepare_query(filters, restrict, order_by), chunk_size
+    )
+
+
+def _stream_query(
+    filters, attribute_lookup, related_vias, materializer_args,
+    sql_order_by, chunk_size,
+):
+    with _read_only_transaction():
+        if sql_order_by is None:
+            servers = _get_servers(filters, attribute_lookup, related_vias)
+            results = list(QueryMaterializer(servers, *materializer_args))
+            for start in range(0, len(results), chunk_size):
+                yield results[start:start + chunk_size]
+            return
+
+        attribute_filters = _get_attribute_filters(filters, attribute_lookup)
+        if attribute_filters is None:
+            return
+
+        # The prepared statements cannot be used with the cursors, so we
+        # are passing the parameters to the query in here.
+        sql_query, sql_params = get_server_query(
+            attribute_filters, related_vias, sql_order_by
+        )
+        with get_read_connection().chunked_cursor() as cursor:
+            try:
+                cursor.execute(*_get_named_params_query(sql_query, sql_params))
+                rows = cursor.fetchmany(chunk_size)
+            except DataError as error:
+                raise ValidationError(error)
+
+            while rows:
+                servers = [server_from_row(r) for r in rows]
+                yield list(QueryMaterializer(servers, *materializer_args))
+                rows = cursor.fetchmany(chunk_size)
+
+
+def execute_count_query(filters):
+    """Count the objects matching the filters
+
+    This is a lot cheaper than counting the results of execute_query(),
+    because nothing needs to be materialized.
+    """
+    with span('schema'):
+        attribute_ids = set(_collect_attribute_ids(filters=filters))
+        schema = get_schema()
+        attribute_lookup = dict(Attribute.specials)
+        attribute_lookup.update(
+            (a, schema.attributes[a])
+            for a in attribute_ids
+            if a in schema.attributes
+        )
+        _check_attributes_exist(attribute_ids, attribute_lookup)
+        filters, related_vias = _get_related_vias(filters, schema)
+
+    attribute_filters = _get_attribute_filters(filters, attribute_lookup)
+    if attribute_filters is None:
+        return 0
+
+    sql_query, sql_params = get_server_count_query(
+        attribute_filters, related_vias
+    )
+    with span('filter'), get_read_connection().cursor() as cursor:
+        try:
+            _execute_statement(cursor.execute, sql_query, sql_params)
+        except DataError as error:
+            raise ValidationError(error)
+        return cursor.fetchone()[0]
+
+
+@contextmanager
+def _read_only_transaction():
+    # REPEATABLE READ isolation level ensures Postgres to give us a consistent
+    # snapshot for the database transaction.  We also set READ ONLY as this
+    # is a query operation.  Perhaps this is also enabling some optimization
+    # on the Postgres side.  These only apply to the current transaction, so
+    # the persistent connections are back to the defaults after it.
+    connection = get_read_connection()
+    with transaction.atomic(using=connection.alias):
+        connection.cursor().execute(
+            'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY'
+        )
+        yield
 
 
-def execute_query(filters, restrict, order_by):
-    """The main function to execute queries"""
+def _prepare_query(filters, restrict, order_by, schema=None):
+    """Prepare everything we need to execute the query"""
 
     # We need the restrict argument in slightly different structure.
     if restrict is None:
@@ -26,43 +251,28 @@ def execute_query(filters, restrict, order_by):
     # of the query.
     attribute_ids = set(_collect_attribute_ids(joins, filters, order_by))
 
-    # We can fetch the attributes altogether before starting the database
+    # We can get the attributes altogether before starting the database
     # transaction.  None on the restrict argument is special meaning
-    # materialize all possible attributes, so we query them all.  The database
+    # materialize all possible attributes, so we take them all.  The database
     # transaction doesn't have to be started yet, because the metadata like
     # the attributes are mostly stable, and the data model wouldn't let us
     # see anything in inconsistent state, even while it is being changed
-    # concurrently.  We start by the special attributes and fetch more
-    # if necessary.
+    # concurrently.  They are coming from the schema cache anyway.  We start
+    # by the special attributes and add more if necessary.
+    if schema is None:
+        schema = get_schema()
     attribute_lookup = dict(Attribute.specials)
     if restrict is None:
-        _update_attribute_lookup(attribute_lookup)
-    elif any(a not in attribute_lookup for a in attribute_ids):
-        _update_attribute_lookup(attribute_lookup, attribute_ids)
+        attribute_lookup.update(schema.attributes)
+    else:
+        attribute_lookup.update(
+            (a, schema.attributes[a])
+            for a in attribute_ids
+            if a in schema.attributes
+        )
     _check_attributes_exist(attribute_ids, attribute_lookup)
 
-    # If we have real attributes on the query filter, we can use them to
-    # get the possible servertypes.  This is necessary to eliminate
-    # not-desired objects.  We also use them to eliminate the servertype
-    # attribute relations passed to the SQL generator module in "related_vias".
-    # This is an optimization that matters, because all of those in
-    # "related_vias" hit the database as complicated sub-queries.
-    related_vias = {}
-    real_attribute_ids = [a for a in filters if a not in Attribute.specials]
-    if real_attribute_ids:
-        servertype_attributes = list(ServertypeAttribute.objects.filter(
-            attribute_id__in=real_attribute_ids
-        ))
-        servertype_ids = _get_possible_servertype_ids(servertype_attributes)
-        filters = dict(filters)
-        servertype_ids = _override_servertype_filter(filters, servertype_ids)
-        servertype_attributes = [
-            sa for sa in servertype_attributes
-            if sa.servertype_id in servertype_ids
-        ]
-        _update_related_vias(
-            related_vias, servertype_attributes, attribute_lookup
-        )
+    filters, related_vias = _get_related_vias(filters, schema)
 
     # Here we prepare the join dictionary for the query materializer.
     # For None on the restrict argument, we just use the complete list of
@@ -77,28 +287,152 @@ def execute_query(filters, restrict, order_by):
             }
         materializer_args = [cast(joins)]
 
-    if order_by is not None:
+    # The database can order the objects the same way as the query
+    # materializer for most of the attributes.  Then, only the requested
+    # page needs to be materialized.  Otherwise, the query materializer
+    # has to order all of the objects.
+    sql_order_by = _get_sql_order_by(order_by, attribute_lookup, schema)
+    if sql_order_by is None:
         materializer_args.append([attribute_lookup[a] for a in order_by])
 
-    # REPEATABLE READ isolation level ensures Postgres to give us a consistent
-    # snapshot for the database transaction.  We also set READ ONLY as this
-    # is a query operation.  Perhaps this is also enabling some optimization
-    # on the Postgres side.
-    with transaction.atomic():
-        connection.cursor().execute(
-            'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY'
+    return (
+        filters, attribute_lookup, related_vias, materializer_args,
+        sql_order_by,
+    )
+
+
+def _check_page(limit, offset):
+    for name, value in (('limit', limit), ('offset', offset)):
+        if value is not None and (not isinstance(value, int) or value < 0):
+            raise ValidationError(
+                '{} must be a non-negative integer'.format(name)
+            )
+
+
+def _get_sql_order_by(order_by, attribute_lookup, schema):
+    """Return the attributes to order by on the database
+
+    They are returned together with the servertypes having them.  None
+    means ordering on the database is not possible.  This is the case
+    for the multi attributes, and the ones which are not stored on
+    the object itself, because the query materializer orders them by
+    the values it has built.
+    """
+    sql_order_by = []
+    for attribute_id in order_by or ():
+        attribute = attribute_lookup[attribute_id]
+        if attribute.special:
+            sql_order_by.append((attribute, None))
+
+            # The following attributes are irrelevant after a unique one.
+            if attribute.special.unique:
+                break
+            continue
+
+        if attribute.multi or attribute.type not in SQL_ORDERABLE_TYPES:
+            return None
+        servertype_attributes = (
+            schema.attribute_servertype_attributes[attribute_id]
+        )
+        if any(sa.related_via_attribute_id for sa in servertype_attributes):
+            return None
+        sql_order_by.append(
+            (attribute, [sa.servertype_id for sa in servertype_attributes])
         )
 
-        # The actual query execution procedure is 2 steps: first filtering
-        # the objects, and then materializing the requested attributes.
-        # The joined attributes and ordering are also handled on
-        # the materialization step.  Ordering has to be handled by it, because
-        # some properties of the attribute values which might be relevant
-        # for ordering may be lost after the materialization.  See the query
-        # materializer module for its details.  The functions on this module
-        # continues with the filtering step.
-        servers = _get_servers(filters, attribute_lookup, related_vias)
-        return list(QueryMaterializer(servers, *materializer_args))
+    return sql_order_by
+
+
+def _get_cursor_key(sql_order_by):
+    """Return the key of the cursor for the order
+
+    The cursor is the value of the ordering attribute on the last object,
+    if it is unique.  It is the values of all of the ordering attributes
+    together with the hostname, if the database orders by them.  Otherwise,
+    it is the position of the last object.  None stands for the default
+    order of the database.
+    """
+    if sql_order_by is None:
+        return 'offset'
+    if not sql_order_by:
+        return None
+    attribute = sql_order_by[0][0]
+    if attribute.special and attribute.special.unique:
+        return attribute.attribute_id
+    return ','.join(a.attribute_id for a, servertype_ids in sql_order_by)
+
+
+def _get_page_start(cursor, cursor_key, offset, sql_order_by):
+    """Return the values to continue after and the offset"""
+    after = None
+    if cursor is not None:
+        after = _decode_cursor(cursor, cursor_key)
+    if cursor_key == 'offset':
+        return None, (after or 0) + (offset or 0)
+
+    # The cursors of a single value are not in a list.
+    if after is not None and not isinstance(after, list):
+        after = [after]
+    if after is not None and (
+        len(after) != len(get_order_by_keys(sql_order_by))
+    ):
+        raise ValidationError('Cursor is not for the order of the query')
+    return after, offset or 0
+
+
+def _slice_page(results, limit, offset):
+    if limit is None:
+        return results[offset:], None
+
+    end = offset + limit
+    if end < len(results):
+        return results[offset:end], _encode_cursor('offset', end)
+    return results[offset:end], None
+
+
+def _get_next_cursor(servers, sql_order_by, cursor_key, limit, offset):
+    if limit is None or len(servers) < limit:
+        return None
+    if cursor_key == 'offset':
+        return _encode_cursor(cursor_key, offset + limit)
+
+    # The values are passed to the database as strings anyway.
+    values = [
+        v if v is None or isinstance(v, (bool, int, float, str)) else str(v)
+        for v in (
+            getattr(servers[-1], 'order_{}'.format(i))
+            for i in range(len(get_order_by_keys(sql_order_by)))
+        )
+    ]
+    if len(values) == 1:
+        return _encode_cursor(cursor_key, values[0])
+    return _encode_cursor(cursor_key, values)
+
+
+def _encode_cursor(key, value):
+    return urlsafe_b64encode(json.dumps([key, value]).encode()).decode()
+
+
+def _decode_cursor(cursor, key):
+    """Return the value of the cursor after validating it"""
+    try:
+        cursor_key, value = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (AttributeError, BinasciiError, TypeError, ValueError):
+        raise ValidationError('Malformatted cursor')
+
+    if cursor_key != key:
+        raise ValidationError('Cursor is not for the order of the query')
+    if key == 'offset' and (not isinstance(value, int) or value < 0):
+        raise ValidationError('Malformatted cursor')
+    if isinstance(value, list):
+        if not all(
+            v is None or isinstance(v, (bool, int, float, str)) for v in value
+        ):
+            raise ValidationError('Malformatted cursor')
+    elif not isinstance(value, (str, int)):
+        raise ValidationError('Malformatted cursor')
+
+    return value
 
 
 def _get_joins(restrict):
@@ -134,16 +468,6 @@ def _collect_attribute_ids(joins=None, filters=None, order_by=None):
             yield attribute_id
 
 
-def _update_attribute_lookup(attribute_lookup, attribute_ids=None):
-    if attribute_ids is None:
-        queryset = Attribute.objects.all()
-    else:
-        queryset = Attribute.objects.filter(attribute_id__in=attribute_ids)
-
-    for attribute in queryset:
-        attribute_lookup[attribute.attribute_id] = attribute
-
-
 def _check_attributes_exist(attribute_ids, attribute_lookup):
     """Check whether all required attribute ids are valid"""
 
@@ -152,6 +476,35 @@ def _check_attributes_exist(attribute_ids, attribute_lookup):
             raise ObjectDoesNotExist('No attribute "{}"'.format(attribute_id))
 
 
+def _get_related_vias(filters, schema):
+    """Prepare the filters and the related_vias for the SQL generator"""
+
+    # If we have real attributes on the query filter, we can use them to
+    # get the possible servertypes.  This is necessary to eliminate
+    # not-desired objects.  We also use them to eliminate the servertype
+    # attribute relations passed to the SQL generator module in "related_vias".
+    # This is an optimization that matters, because all of those in
+    # "related_vias" hit the database as complicated sub-queries.
+    related_vias = {}
+    real_attribute_ids = [a for a in filters if a not in Attribute.specials]
+    if real_attribute_ids:
+        servertype_attributes = [
+            sa
+            for attribute_id in real_attribute_ids
+            for sa in schema.attribute_servertype_attributes[attribute_id]
+        ]
+        servertype_ids = _get_possible_servertype_ids(servertype_attributes)
+        filters = dict(filters)
+        servertype_ids = _override_servertype_filter(filters, servertype_ids)
+        servertype_attributes = [
+            sa for sa in servertype_attributes
+            if sa.servertype_id in servertype_ids
+        ]
+        _update_related_vias(related_vias, servertype_attributes)
+
+    return filters, related_vias
+
+
 def _get_possible_servertype_ids(servertype_attributes):
     """Get the servertypes that can possible match with the query with
     the given attributes
@@ -194,46 +547,52 @@ def _override_servertype_filter(filters, servertype_ids):
     return servertype_ids
 
 
-def _update_related_vias(
-    related_vias, servertype_attributes, attribute_lookup
-):
+def _update_related_vias(related_vias, servertype_attributes):
     """Prepare the related_vias dictionary for the SQL generator module
 
     It is lists in dictionaries of dictionaries indexed first by attribute_id
-    and then by the related_via_attribute.  The attribute lookup dictionary
-    passed to here may not have all of the related via attributes we need.
-    In this case we recursively query them and repeat the process for
-    the remaining object.
+    and then by the related_via_attribute.
     """
-    to_be_looked_up = []
     for sa in servertype_attributes:
-        related_via_attribute_id = sa.related_via_attribute_id
-        if not related_via_attribute_id:
-            related_via_attribute = None
-        elif related_via_attribute_id not in attribute_lookup:
-            to_be_looked_up.append(sa)
-            continue
-        else:
-            related_via_attribute = attribute_lookup[related_via_attribute_id]
-
         (
             related_vias
             .setdefault(sa.attribute_id, {})
-            .setdefault(related_via_attribute, [])
+            .setdefault(sa.related_via_attribute, [])
             .append(sa.servertype_id)
         )
 
-    if to_be_looked_up:
-        _update_attribute_lookup(
-            attribute_lookup,
-            {sa.related_via_attribute_id for sa in to_be_looked_up},
-        )
-        _update_related_vias(related_vias, to_be_looked_up, attribute_lookup)
-
 
-def _get_servers(filters, attribute_lookup, related_vias):
+def _get_servers(
+    filters, attribute_lookup, related_vias,
+    order_by=(), after=None, limit=None, offset=None,
+):
     """Evaluate the filters to fetch the matching servers"""
 
+    attribute_filters = _get_attribute_filters(filters, attribute_lookup)
+    if attribute_filters is None:
+        return []
+
+    # If you managed to read this so far, the last step is refreshingly
+    # easy: get and execute the raw SQL query.
+    sql_query, sql_params = get_server_query(
+        attribute_filters, related_vias, order_by, after, limit, offset
+    )
+
+    def execute(*statement):
+        return list(Server.objects.defer('intern_ip').raw(*statement))
+
+    try:
+        return _execute_statement(execute, sql_query, sql_params)
+    except DataError as error:
+        raise ValidationError(error)
+
+
+def _get_attribute_filters(filters, attribute_lookup):
+    """Return the filters to pass to the SQL generator module
+
+    None is returned, if the filters are destined to fail.
+    """
+
     # From now on, we will pass the filters dictionary using the attribute
     # objects as the keys.  The SQL generator module will repeatedly need
     # the properties of the attributes.
@@ -248,16 +607,92 @@ def _get_servers(filters, attribute_lookup, related_vias):
         # nonexistent attributes.
         destiny = filt.destiny()
         if destiny is False:
-            return []
+            return None
         if destiny is True:
             continue
 
         attribute_filters.append((attribute_lookup[attribute_id], filt))
 
-    # If you managed to read this so far, the last step is refreshingly
-    # easy: get and execute the raw SQL query.
-    sql_query = get_server_query(attribute_filters, related_vias)
+    return attribute_filters
+
+
+def _get_named_params_query(sql_query, sql_params):
+    """Replace the placeholders of the prepared statements for psycopg2
+
+    The parameters are numbered, and the same one can be used more than
+    once, so we are passing them by name.
+    """
+    return (
+        re.sub(r'\$(\d+)', r'%(\1)s', sql_query.replace('%', '%%')),
+        {str(i): p for i, p in enumerate(sql_params, 1)},
+    )
+
+
+def _get_statement(sql_query, sql_params):
+    """Return the SQL query and the parameters to execute
+
+    The query is prepared, unless the prepared statements are disabled.
+    """
+    if not settings.DATABASE_PREPARED_STATEMENTS:
+        return _get_named_params_query(sql_query, sql_params)
+    return _get_prepared_statement(sql_query, sql_params), sql_params
+
+
+def _execute_statement(execute, sql_query, sql_params):
+    """Execute the SQL query by passing the statement to the function
+
+    The prepared statements would be gone, if something like a connection
+    pooler has reset the session with DISCARD ALL.  We forget them, and
+    try again once, preparing the query again.  The statement runs in
+    a savepoint within a transaction, so that the failure wouldn't abort it.
+    """
+    if not settings.DATABASE_PREPARED_STATEMENTS:
+        return execute(*_get_statement(sql_query, sql_params))
+
+    connection = get_read_connection()
     try:
-        return list(Server.objects.defer('intern_ip').raw(sql_query))
-    except DataError as error:
-        raise ValidationError(error)
+        with (
+            transaction.atomic(using=connection.alias)
+            if connection.in_atomic_block else nullcontext()
+        ):
+            return execute(*_get_statement(sql_query, sql_params))
+    except ProgrammingError as error:
+        if getattr(error.__cause__, 'pgcode', None) != (
+            INVALID_SQL_STATEMENT_NAME
+        ):
+            raise
+
+    _prepared_statements.pop(connection.connection, None)
+    return execute(*_get_statement(sql_query, sql_params))
+
+
+def _get_prepared_statement(sql_query, sql_params):
+    """Prepare the SQL query and return the statement to execute it
+
+    The SQL generator module gives us the same SQL query for the queries
+    of the same shape, with the values of the filters being the parameters.
+    We are using the hash of the query as the name of the prepared
+    statement, so the queries of the same shape would skip parsing and
+    planning, after the first one on the same connection.
+    """
+    connection = get_read_connection()
+    connection.ensure_connection()
+    prepared = _prepared_statements.setdefault(
+        connection.connection, OrderedDict()
+    )
+    name = 'serveradmin_' + sha1(sql_query.encode()).hexdigest()[:16]
+
+    if name in prepared:
+        prepared.move_to_end(name)
+    else:
+        with connection.cursor() as cursor:
+            if len(prepared) >= PREPARED_STATEMENTS_LIMIT:
+                cursor.execute(
+                    'DEALLOCATE ' + prepared.popitem(last=False)[0]
+                )
+            cursor.execute('PREPARE {} AS {}'.format(name, sql_query))
+        prepared[name] = None
+
+    if not sql_params:
+        return 'EXECUTE ' + name
+    return 'EXECUTE {} ({})'.format(name, ', '.join(['%s'] * len(sql_params)))
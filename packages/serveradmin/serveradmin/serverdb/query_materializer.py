@@ -11,45 +11,66 @@ Copyright (c) 2019 InnoGames GmbH
 import logging
 
 from ipaddress import IPv4Address, IPv6Address
+
+from django.db import connection
+
 from adminapi.dataset import DatasetObject
+from serveradmin.common.timing import span
 from serveradmin.serverdb.models import (
-    Servertype,
     Attribute,
-    ServertypeAttribute,
     Server,
     ServerAttribute,
     ServerRelationAttribute, ServerInetAttribute,
+    number_to_python,
 )
+from serveradmin.serverdb.replica import get_read_alias, get_read_connection
+from serveradmin.serverdb.schema_cache import get_schema
 
 logger = logging.getLogger(__package__)
 
+# The attribute value columns of the query to fetch the stored attributes
+# together with their database types.  All types have their own column,
+# so that they would be converted by the database driver.
+VALUE_COLUMNS = (
+    ("string", "text"),
+    ("number", "numeric"),
+    ("inet", "inet"),
+    ("macaddr", "macaddr"),
+    ("date", "date"),
+    ("datetime", "timestamptz"),
+)
+_value_column_indexes = {t: i for i, (t, _) in enumerate(VALUE_COLUMNS, 2)}
+
 
 class QueryMaterializer:
-    def __init__(self, servers, joined_attributes, order_by_attributes=[]):
+    def __init__(
+        self, servers, joined_attributes, order_by_attributes=[], schema=None
+    ):
         self._servers = servers
         self._joined_attributes = joined_attributes
         self._order_by_attributes = order_by_attributes
-        # XXX: Optimize this query out
-        self._servertype_lookup = {
-            servertype.servertype_id: servertype
-            for servertype in Servertype.objects.all()
-        }
+        self._schema = get_schema() if schema is None else schema
+        self._servertype_lookup = self._schema.servertypes
+        self._join_materializer = None
+
+        with span("materialize"):
+            self._server_attributes = {}
+            servers_by_type = {}
+            for server in self._servers:
+                self._server_attributes[server] = {
+                    Attribute.specials["object_id"]: server.server_id,
+                    Attribute.specials["hostname"]: server.hostname,
+                    Attribute.specials["intern_ip"]: server.intern_ip,
+                    Attribute.specials["servertype"]: server.servertype_id,
+                }
+                servers_by_type.setdefault(
+                    server.servertype_id, []
+                ).append(server)
 
-        self._server_attributes = {}
-        servers_by_type = {}
-        for server in self._servers:
-            self._server_attributes[server] = {
-                Attribute.specials["object_id"]: server.server_id,
-                Attribute.specials["hostname"]: server.hostname,
-                Attribute.specials["intern_ip"]: server.intern_ip,
-                Attribute.specials["servertype"]: server.servertype_id,
-            }
-            servers_by_type.setdefault(server.servertype_id, []).append(server)
-
-        self._select_attributes(servers_by_type.keys())
-        self._initialize_attributes(servers_by_type)
-        self._add_attributes(servers_by_type)
-        self._add_related_attributes(servers_by_type)
+            self._select_attributes(servers_by_type.keys())
+            self._initialize_attributes(servers_by_type)
+            self._add_attributes(servers_by_type)
+            self._add_related_attributes(servers_by_type)
 
     def __iter__(self):
         servers = self._servers
@@ -61,52 +82,57 @@ class QueryMaterializer:
                     for a in self._order_by_attributes
                 )
 
-            servers = sorted(servers, key=order_by_key)
+            with span("order"):
+                servers = sorted(servers, key=order_by_key)
 
-        join_results = self._get_join_results()
-        return (
-            DatasetObject(self._get_attributes(s, join_results), s.server_id)
-            for s in servers
-        )
+        with span("materialize"):
+            return iter(self._get_objects(servers, self._joined_attributes))
 
     def _select_attributes(self, servertype_ids):
         self._attributes_by_type = {}
         self._servertype_ids_by_attribute = {}
-        self._related_servertype_attributes = []
-        attributes = {a.attribute_id: a for a in self._joined_attributes}
-        for sa in ServertypeAttribute.objects.filter(
-            servertype_id__in=servertype_ids,
-            attribute__in=self._joined_attributes,
-        ):
-            attribute = attributes[sa.attribute_id]
-            self._select_servertype_attribute(attribute, sa)
+        self._related_servertype_attributes = {}
+        for servertype_id in servertype_ids:
+            servertype_attributes = (
+                self._schema.servertype_attributes[servertype_id]
+            )
+            for attribute in self._joined_attributes:
+                sa = servertype_attributes.get(attribute.attribute_id)
+                if sa is not None:
+                    self._select_servertype_attribute(attribute, sa)
 
     def _select_servertype_attribute(self, attribute, sa):
+        """Select the attribute and return its level of relation
+
+        The attributes which are not related via another one are on
+        the level 0.  The related ones are one level above their
+        related_via_attribute.
+        """
         self._attributes_by_type.setdefault(attribute.type, set()).add(attribute)
         self._servertype_ids_by_attribute.setdefault(attribute, []).append(
             sa.servertype_id
         )
 
         related_via_attribute_id = sa.related_via_attribute_id
-        if related_via_attribute_id:
-            # TODO: Order the list in a way to support recursive related
-            # attributes.
-            self._related_servertype_attributes.append((attribute, sa))
+        if not related_via_attribute_id:
+            return 0
 
+        level = self._related_servertype_attributes.get(sa)
+        if level is None:
             # If we have related attributes in the attribute list, we have
             # to add the relations in there, too.  We are going to use
-            # those to query the related attributes.
-            # TODO: Optimize this to avoid recursion and selecting related
-            # attribute in here
-            sa = (
-                ServertypeAttribute.objects.filter(
-                    servertype_id=sa.servertype_id,
-                    attribute_id=related_via_attribute_id,
-                )
-                .prefetch_related("attribute")
-                .get()
-            )
-            self._select_servertype_attribute(sa.attribute, sa)
+            # those to query the related attributes.  They can be related
+            # via another attribute themselves, so they need to be queried
+            # before this one.
+            related_via_sa = self._schema.servertype_attributes[
+                sa.servertype_id
+            ][related_via_attribute_id]
+            level = self._select_servertype_attribute(
+                related_via_sa.attribute, related_via_sa
+            ) + 1
+            self._related_servertype_attributes[sa] = level
+
+        return level
 
     def _initialize_attributes(self, servers_by_type):
         for attribute, servertype_ids in self._servertype_ids_by_attribute.items():
@@ -117,6 +143,7 @@ class QueryMaterializer:
 
     def _add_attributes(self, servers_by_type):
         """Add the attributes to the results"""
+        stored_attributes_by_type = {}
         for key, attributes in self._attributes_by_type.items():
             if key == "supernet":
                 for attribute in attributes:
@@ -138,54 +165,84 @@ class QueryMaterializer:
                             for s in servers_by_type[st]
                         ],
                     )
-            elif key == "reverse":
-                reversed_attributes = {a.reversed_attribute_id: a for a in attributes}
-                for sa in (
-                    ServerRelationAttribute.objects.filter(
-                        value_id__in=self._server_attributes.keys(),
-                        attribute_id__in=reversed_attributes.keys(),
-                    )
-                    .prefetch_related("server")
-                    .defer(
-                        "server__intern_ip",
-                        "server__servertype",
-                    )
-                ):
-                    self._add_attribute_value(
-                        sa.value,
-                        reversed_attributes[sa.attribute_id],
-                        sa.server,
-                    )
             else:
-                attribute_lookup = {a.attribute_id: a for a in attributes}
-                for sa in (
-                    ServerAttribute.get_model(key)
-                    .objects.filter(
-                        server__in=self._server_attributes.keys(),
-                        attribute__in=attributes,
-                    )
-                    .prefetch_related("server")
-                    .defer(
-                        "server__intern_ip",
-                        "server__servertype",
-                    )
+                stored_attributes_by_type[key] = attributes
+
+        if stored_attributes_by_type:
+            self._add_stored_attributes(stored_attributes_by_type)
+
+    def _add_stored_attributes(self, attributes_by_type):
+        """Add the attributes stored on the value tables"""
+        servers_by_id = {s.server_id: s for s in self._server_attributes}
+        for server_id, attribute, value in _get_stored_attribute_values(
+            attributes_by_type, list(servers_by_id.keys())
+        ):
+            self._add_attribute_value(
+                servers_by_id[server_id], attribute, value
+            )
+
+    def _add_related_attributes(self, servers_by_type):
+        """Add the related attributes level by level
+
+        The related_via_attribute of the ones on a level is either stored or
+        on a lower level, so its values are already available.  All related
+        attributes of a level are fetched in a single query.
+        """
+        levels = {}
+        for sa, level in self._related_servertype_attributes.items():
+            levels.setdefault(level, []).append(sa)
+        for level in sorted(levels):
+            self._add_related_level(levels[level], servers_by_type)
+
+    def _add_related_level(self, servertype_attributes, servers_by_type):
+        # First, index the targets by the related server ids for fast access
+        # later.  The same attribute can be related via different attributes
+        # on different servertypes.
+        targets_by_attribute = {}
+        for sa in servertype_attributes:
+            # The computed attributes are not stored on the related servers.
+            if sa.attribute.type in ("supernet", "domain"):
+                continue
+            targets_by_related = targets_by_attribute.setdefault(
+                sa.attribute, {}
+            )
+            for target in servers_by_type[sa.servertype_id]:
+                for source in self._get_related_servers(
+                    target, sa.related_via_attribute
                 ):
-                    self._add_attribute_value(
-                        sa.server,
-                        attribute_lookup[sa.attribute_id],
-                        sa.get_value(),
+                    targets_by_related.setdefault(source.server_id, []).append(
+                        target
                     )
 
-    def _add_related_attributes(self, servers_by_type):
-        for attribute, sa in self._related_servertype_attributes:
-            self._add_related_attribute(attribute, sa, servers_by_type)
+        attributes_by_type = {}
+        server_ids = set()
+        for attribute, targets_by_related in targets_by_attribute.items():
+            attributes_by_type.setdefault(attribute.type, []).append(attribute)
+            server_ids.update(targets_by_related.keys())
+        if not server_ids:
+            return
+
+        # Then, query and set the related attributes
+        for server_id, attribute, value in _get_stored_attribute_values(
+            attributes_by_type, list(server_ids)
+        ):
+            for target in targets_by_attribute[attribute].get(server_id, ()):
+                self._add_attribute_value(target, attribute, value)
+
+    def _get_related_servers(self, server, related_via_attribute):
+        value = self._server_attributes[server].get(related_via_attribute)
+        if value is None:
+            return ()
+        if related_via_attribute.multi:
+            return value
+        return (value,)
 
     def _add_domain_attribute(self, attribute, servers):
         domain_names = {s.hostname.split(".", 1)[-1] for s in servers}
         domain_lookup = {
             domain.hostname: domain
             for domain in Server.objects.filter(
-                servertype__in=attribute.target_servertype.all(),
+                servertype_id__in=attribute.get_target_servertype_ids(),
                 hostname__in=domain_names,
             )
         }
@@ -236,11 +293,7 @@ class QueryMaterializer:
         supernets = Server.objects.raw(
             q,
             {
-                "target_servertypes": list(
-                    attribute.target_servertype.values_list(
-                        'servertype_id', flat=True
-                    )
-                ),
+                "target_servertypes": attribute.get_target_servertype_ids(),
                 "address_family": attribute.inet_address_family,
                 "hosts": list(servers_by_id.keys()),
             },
@@ -263,37 +316,6 @@ class QueryMaterializer:
                 )
             self._server_attributes[cur_server][attribute] = cur_supernet
 
-    def _add_related_attribute(self, attribute, servertype_attribute, servers_by_type):
-        related_via_attribute = servertype_attribute.related_via_attribute
-
-        # First, index the related servers for fast access later
-        servers_by_related = {}
-        for target in servers_by_type[servertype_attribute.servertype_id]:
-            attributes = self._server_attributes[target]
-            if related_via_attribute in attributes:
-                if related_via_attribute.multi:
-                    for source in attributes[related_via_attribute]:
-                        servers_by_related.setdefault(source, []).append(target)
-                else:
-                    source = attributes[related_via_attribute]
-                    servers_by_related.setdefault(source, []).append(target)
-
-        # Then, query and set the related attributes
-        for sa in (
-            ServerAttribute.get_model(attribute.type)
-            .objects.filter(
-                server__hostname__in=servers_by_related.keys(),
-                attribute=attribute,
-            )
-            .prefetch_related("server")
-            .defer(
-                "server__intern_ip",
-                "server__servertype",
-            )
-        ):
-            for target in servers_by_related[sa.server]:
-                self._add_attribute_value(target, attribute, sa.get_value())
-
     def _add_attribute_value(self, server, attribute, value):
         if attribute.multi:
             try:
@@ -324,11 +346,29 @@ class QueryMaterializer:
             return 0, tuple(_sort_key(v) for v in value)
         return 0, _sort_key(value)
 
-    def _get_attributes(self, server, join_results):  # NOQA: C901
+    def _get_objects(self, servers, joined_attributes):
+        """Build the objects of the servers restricted to the attributes
+
+        The joined attributes are a subset of the ones the materializer
+        is created with, so the same materializer can build the objects
+        for different join paths.
+        """
+        join_results = self._get_join_results(joined_attributes)
+        return [
+            DatasetObject(
+                self._get_attributes(s, joined_attributes, join_results),
+                s.server_id,
+            )
+            for s in servers
+        ]
+
+    def _get_attributes(  # NOQA: C901
+        self, server, joined_attributes, join_results
+    ):
         servertype = self._servertype_lookup[server.servertype_id]
         server_attributes = self._server_attributes[server]
         for attribute, value in server_attributes.items():
-            if attribute not in self._joined_attributes:
+            if attribute not in joined_attributes:
                 continue
 
             if attribute.type == "inet":
@@ -358,18 +398,45 @@ class QueryMaterializer:
             else:
                 yield attribute.attribute_id, value
 
-    def _get_join_results(self):
+    def _get_join_results(self, joined_attributes):
+        """Build the objects of the joined servers on the next level
+
+        The servers of all joined attributes, including the ones under
+        the other join paths, are materialized together by a single
+        materializer, so every server is materialized only once.
+        """
         results = dict()
-        for attribute, joined_attributes in self._joined_attributes.items():
-            if joined_attributes is None:
+        for attribute, attribute_joins in joined_attributes.items():
+            if attribute_joins is None:
                 continue
 
-            servers = self._get_servers_to_join(attribute)
-            server_objs = type(self)(servers, joined_attributes)
-            results[attribute] = dict(zip(servers, server_objs))
+            with span("join", inclusive=True):
+                servers = self._get_servers_to_join(attribute)
+                join_materializer = self._get_join_materializer()
+                results[attribute] = dict(zip(
+                    servers,
+                    join_materializer._get_objects(servers, attribute_joins),
+                ))
 
         return results
 
+    def _get_join_materializer(self):
+        if self._join_materializer is None:
+            servers = set()
+            joined_attributes = {}
+            for attribute, attribute_joins in self._joined_attributes.items():
+                if attribute_joins is not None:
+                    servers.update(self._get_servers_to_join(attribute))
+                    _merge_joined_attributes(
+                        joined_attributes, attribute_joins
+                    )
+            # The joined servers are materialized on the same schema.
+            self._join_materializer = type(self)(
+                list(servers), joined_attributes, schema=self._schema
+            )
+
+        return self._join_materializer
+
     def _get_servers_to_join(self, attribute):
         servers = set()
         for server_attributes in self._server_attributes.values():
@@ -387,6 +454,133 @@ class QueryMaterializer:
         return servers
 
 
+def _get_stored_attribute_values(attributes_by_type, server_ids):
+    """Yield the values of the attributes stored on the value tables
+
+    All of them are fetched in a single query as tuples.  The relation and
+    reverse attributes come with the columns of the related server.
+    """
+    sql_queries = []
+    sql_params = []
+    attribute_lookup = {}
+    for key, attributes in attributes_by_type.items():
+        attribute_lookup.update((a.attribute_id, a) for a in attributes)
+        if key == "reverse":
+            for attribute in attributes:
+                sql_queries.append(_get_reverse_attribute_sql())
+                sql_params.extend(
+                    (
+                        attribute.attribute_id,
+                        server_ids,
+                        attribute.reversed_attribute_id,
+                    )
+                )
+        else:
+            sql_queries.append(_get_stored_attribute_sql(key))
+            sql_params.extend(
+                (server_ids, [a.attribute_id for a in attributes])
+            )
+
+    related_servers = {}
+    with get_read_connection().cursor() as cursor:
+        cursor.execute(" UNION ALL ".join(sql_queries), sql_params)
+        for row in cursor:
+            attribute = attribute_lookup[row[1]]
+            if attribute.type in ("relation", "reverse"):
+                related_server_id = row[-4]
+                value = related_servers.get(related_server_id)
+                if value is None:
+                    value = related_servers[related_server_id] = (
+                        server_from_row(row[-4:])
+                    )
+            elif attribute.type == "boolean":
+                value = True
+            else:
+                value = _get_stored_value(attribute.type, row)
+            yield row[0], attribute, value
+
+
+def _get_stored_attribute_sql(attribute_type):
+    model = ServerAttribute.get_model(attribute_type)
+    if attribute_type == "relation":
+        join_sql = " JOIN server AS rel ON rel.server_id = sub.value"
+    else:
+        join_sql = ""
+
+    return (
+        "SELECT sub.server_id, sub.attribute_id, {} FROM {} AS sub{}"
+        " WHERE sub.server_id = ANY(%s) AND sub.attribute_id = ANY(%s)".format(
+            _get_value_columns_sql(attribute_type),
+            model._meta.db_table,
+            join_sql,
+        )
+    )
+
+
+def _get_reverse_attribute_sql():
+    return (
+        "SELECT sub.value, %s::text, {} FROM {} AS sub"
+        " JOIN server AS rel ON rel.server_id = sub.server_id"
+        " WHERE sub.value = ANY(%s) AND sub.attribute_id = %s".format(
+            _get_value_columns_sql("reverse"),
+            ServerRelationAttribute._meta.db_table,
+        )
+    )
+
+
+def _get_value_columns_sql(attribute_type):
+    columns = [
+        "sub.value" if t == attribute_type else "NULL::" + db_type
+        for t, db_type in VALUE_COLUMNS
+    ]
+    if attribute_type in ("relation", "reverse"):
+        columns += ["rel.server_id", "rel.hostname", "rel.intern_ip"]
+        columns += ["rel.servertype_id"]
+    else:
+        columns += ["NULL::integer", "NULL::text", "NULL::inet", "NULL::text"]
+
+    return ", ".join(columns)
+
+
+def _get_stored_value(attribute_type, row):
+    # The first 2 columns are the server_id and the attribute_id.
+    value = row[_value_column_indexes[attribute_type]]
+    if attribute_type == "number":
+        return number_to_python(value)
+    if attribute_type in ("inet", "macaddr"):
+        model = ServerAttribute.get_model(attribute_type)
+        field = model._meta.get_field("value")
+        return field.from_db_value(value, None, connection)
+    return value
+
+
+def server_from_row(row):
+    """Build the server object from the columns of the server table"""
+    server_id, hostname, intern_ip, servertype_id = row
+    intern_ip_field = Server._meta.get_field("intern_ip")
+
+    return Server.from_db(
+        get_read_alias(),
+        ["server_id", "hostname", "intern_ip", "servertype_id"],
+        [
+            server_id,
+            hostname,
+            intern_ip_field.from_db_value(intern_ip, None, connection),
+            servertype_id,
+        ],
+    )
+
+
+def _merge_joined_attributes(merged, joined_attributes):
+    for attribute, attribute_joins in joined_attributes.items():
+        if attribute_joins is None:
+            merged.setdefault(attribute, None)
+        else:
+            if merged.get(attribute) is None:
+                merged[attribute] = {}
+            _merge_joined_attributes(merged[attribute], attribute_joins)
+
+
 def _sort_key(value):
     if isinstance(value, (IPv4Address, IPv6Address)):
         return value.version, value
@@ -395,8 +589,10 @@ def _sort_key(value):
     return value
 
 
-def get_default_attribute_values(servertype_id):
-    servertype = Servertype.objects.get(servertype_id=servertype_id)
+def get_default_attribute_values(servertype_id, schema=None):
+    if schema is None:
+        schema = get_schema()
+    schema.get_servertype(servertype_id)
     attribute_values = {}
 
     for attribute_id in Attribute.specials:
@@ -406,7 +602,7 @@ def get_default_attribute_values(servertype_id):
             value = None
         attribute_values[attribute_id] = value
 
-    for sa in servertype.attributes.all():
+    for sa in schema.servertype_attributes[servertype_id].values():
         attribute_values[sa.attribute_id] = sa.get_default_value()
 
     return attribute_values
@@ -0,0 +1,155 @@
+"""Serveradmin - Read Replica
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# The queries run in their own read only transactions, so they can as well
+# run on a hot standby.  The views only reading the servers wrap their work
+# with read_from_replica(), and everything read within the block, through
+# the ORM or the raw SQL of the query executer, goes to the replica, if one
+# is configured as the "replica" database.  The commits always go to the
+# primary.  So does everything within a transaction on the primary.
+#
+# The replica can lag behind.  The clients that have just committed can
+# pass the position of their commit on the write-ahead log, and the primary
+# is used instead, if the replica hasn't replayed it yet.  We cannot rely on
+# the ids of the commits for this, because they are only created for
+# the changes of the attributes with history.  The ids are still accepted
+# for the clients following the changes.  The primary is also used, if
+# the replica is not available.  The schema and the ACL snapshots are
+# always built from the primary, because their generation counters are
+# read there.
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from serveradmin.serverdb.models import ChangeCommit
+
+REPLICA_DB_ALIAS = 'replica'
+
+logger = logging.getLogger(__name__)
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """Route the reads within read_from_replica() to the replica"""
+
+    def db_for_read(self, model, **hints):
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == REPLICA_DB_ALIAS:
+            return False
+        return None
+
+
+@contextmanager
+def read_from_replica(commit_id=None, commit_lsn=None):
+    """Read from the replica within the block, if it is usable
+
+    It is not used, if it hasn't replayed the commit of the given id or
+    the given position returned by get_commit_lsn().
+    """
+    token = _read_alias.set(_get_replica_alias(commit_id, commit_lsn))
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    token = _read_alias.set(DEFAULT_DB_ALIAS)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def get_read_alias():
+    alias = _read_alias.get()
+    if (
+        alias == DEFAULT_DB_ALIAS or
+        connections[DEFAULT_DB_ALIAS].in_atomic_block
+    ):
+        return DEFAULT_DB_ALIAS
+
+    # The transaction in progress on the replica is continued, so the
+    # streamed queries stay on the same snapshot even after the block of
+    # read_from_replica() is left.
+    if (
+        REPLICA_DB_ALIAS in settings.DATABASES and
+        connections[REPLICA_DB_ALIAS].in_atomic_block
+    ):
+        return REPLICA_DB_ALIAS
+
+    return alias or DEFAULT_DB_ALIAS
+
+
+def get_read_connection():
+    return connections[get_read_alias()]
+
+
+def get_commit_lsn():
+    """Return the position of the write-ahead log after the last commit
+
+    It has to be called right after committing on the same connection.
+    The position is returned as a number of bytes, so the clients can
+    compare them.  It is not needed without a replica.
+    """
+    if REPLICA_DB_ALIAS not in settings.DATABASES:
+        return None
+
+    # The insert position is the end of everything already logged, so
+    # it is never before our commit, unlike the flushed position.
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute("SELECT pg_current_wal_insert_lsn() - '0/0'")
+        return int(cursor.fetchone()[0])
+
+
+def _get_replica_alias(commit_id, commit_lsn):
+    if REPLICA_DB_ALIAS not in settings.DATABASES:
+        return DEFAULT_DB_ALIAS
+
+    try:
+        if commit_lsn is not None:
+            if not _has_replayed(commit_lsn):
+                return DEFAULT_DB_ALIAS
+        elif commit_id is None:
+            connections[REPLICA_DB_ALIAS].ensure_connection()
+        elif not (
+            ChangeCommit.objects.using(REPLICA_DB_ALIAS)
+            .filter(pk=commit_id)
+            .exists()
+        ):
+            return DEFAULT_DB_ALIAS
+    except DatabaseError as error:
+        logger.warning(
+            'Reading from the primary, the replica is not available: {}'
+            .format(error)
+        )
+        return DEFAULT_DB_ALIAS
+
+    return REPLICA_DB_ALIAS
+
+
+def _has_replayed(commit_lsn):
+    # The replica is not in recovery, if it is a mirror of the primary,
+    # like in the tests.  The replayed position is null, if the replica
+    # has been started from a backup without streaming yet.
+    with connections[REPLICA_DB_ALIAS].cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END '
+            "- '0/0' >= %s",
+            [commit_lsn],
+        )
+        return bool(cursor.fetchone()[0])
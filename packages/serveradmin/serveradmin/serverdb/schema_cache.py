@@ -0,0 +1,185 @@
+"""Serveradmin - Schema Cache
+
+Copyright (c) 2026 InnoGames GmbH
+"""
+
+# The attributes, servertypes and their relations are read on every query
+# and every commit, but they change only a few times a week.  We keep them
+# in memory in a snapshot shared by all threads of the process.  The changes
+# on the same process invalidate the snapshot immediately.  The changes on
+# the other processes are noticed by a generation counter on the database.
+# It is a sequence, because reading its last value is about the cheapest
+# query there is, and bumping it doesn't need to take any locks.
+#
+# The snapshots are built from multiple queries.  The objects committed
+# between them could be referenced without being loaded, so the queries
+# run in a single REPEATABLE READ transaction.  This is not possible within
+# a transaction already in progress, like of a commit, because its
+# isolation level cannot be changed anymore.  The snapshot is built again
+# in this case, when something is missing.  It is not kept for the other
+# threads either, because it could include the uncommitted changes of
+# the transaction, which would be stored with the old generation.
+
+from threading import Lock
+
+from django.db import connection, transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+)
+from django.dispatch import receiver
+
+from serveradmin.serverdb.models import (
+    Attribute,
+    Servertype,
+    ServertypeAttribute,
+)
+from serveradmin.serverdb.replica import read_from_primary
+
+GENERATION_SEQUENCE = 'serverdb_schema_generation'
+
+# The times to build a snapshot within a transaction in progress
+SNAPSHOT_TRIES = 3
+
+_schema = None
+_schema_lock = Lock()
+
+
+class Schema:
+    """A consistent snapshot of the attributes and servertypes
+
+    The objects in here are shared.  They must not be modified.
+    """
+
+    def __init__(self, generation):
+        self.generation = generation
+        self.attributes = {
+            a.attribute_id: a
+            for a in Attribute.objects.prefetch_related('target_servertype')
+        }
+        self.servertypes = {
+            s.servertype_id: s for s in Servertype.objects.all()
+        }
+
+        # The servertype attributes are indexed both ways.  We are also
+        # linking them to the objects above to avoid any lazy loading.
+        self.servertype_attributes = {s: {} for s in self.servertypes}
+        self.attribute_servertype_attributes = {a: [] for a in self.attributes}
+        for sa in ServertypeAttribute.objects.all():
+            sa.servertype = self.servertypes[sa.servertype_id]
+            sa.attribute = self.attributes[sa.attribute_id]
+            if sa.related_via_attribute_id:
+                sa.related_via_attribute = (
+                    self.attributes[sa.related_via_attribute_id]
+                )
+            self.servertype_attributes[sa.servertype_id][sa.attribute_id] = sa
+            self.attribute_servertype_attributes[sa.attribute_id].append(sa)
+
+    def get_servertype(self, servertype_id):
+        try:
+            return self.servertypes[servertype_id]
+        except KeyError:
+            raise Servertype.DoesNotExist(
+                'No servertype "{}"'.format(servertype_id)
+            )
+
+
+def get_schema():
+    """Return the current schema snapshot
+
+    This costs a single cheap query to check the generation counter, unless
+    the schema has changed, in which case the snapshot is reloaded.
+    """
+    global _schema
+
+    generation = _get_generation()
+    schema = _schema
+    if schema is not None and schema.generation == generation:
+        return schema
+
+    if connection.in_atomic_block:
+        return build_snapshot(Schema, generation)
+
+    with _schema_lock:
+        schema = _schema
+        if schema is None or schema.generation != generation:
+            schema = _schema = build_snapshot(Schema, generation)
+
+    return schema
+
+
+def build_snapshot(snapshot_class, generation):
+    """Build the snapshot on a consistent view of the primary
+
+    The generation is read from the primary, so the data must be read from
+    there too.
+    """
+    with read_from_primary():
+        if not connection.in_atomic_block:
+            with transaction.atomic():
+                connection.cursor().execute(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY'
+                )
+                return snapshot_class(generation)
+
+        for _ in range(SNAPSHOT_TRIES - 1):
+            try:
+                return snapshot_class(generation)
+            except KeyError:
+                pass
+        return snapshot_class(generation)
+
+
+def invalidate_schema():
+    """Drop the snapshot of this process and bump the generation counter
+
+    The counter is bumped only after the transaction is committed.
+    Otherwise, the other processes could reload the old data and keep it
+    with the new generation.
+    """
+    global _schema
+
+    _schema = None
+    transaction.on_commit(_bump_generation)
+
+
+def _get_generation():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT last_value FROM ' + GENERATION_SEQUENCE)
+        return cursor.fetchone()[0]
+
+
+def _bump_generation():
+    global _schema
+
+    _schema = None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT nextval('{}')".format(GENERATION_SEQUENCE))
+
+
+@receiver(post_save, sender=Attribute)
+@receiver(post_save, sender=Servertype)
+@receiver(post_save, sender=ServertypeAttribute)
+@receiver(post_delete, sender=Attribute)
+@receiver(post_delete, sender=Servertype)
+@receiver(post_delete, sender=ServertypeAttribute)
+def invalidate_schema_on_change(sender, **kwargs):
+    invalidate_schema()
+
+
+@receiver(m2m_changed, sender=Attribute.target_servertype.through)
+def invalidate_schema_on_target_servertype_change(sender, action, **kwargs):
+    if action.startswith('post_'):
+        invalidate_schema()
+
+
+@receiver(post_migrate)
+def invalidate_schema_on_migrate(sender, **kwargs):
+    # The tables might have been flushed without emitting any signals.
+    # The counter might not exist yet, if the migrations are not fully
+    # applied, so we only drop the snapshot of this process in here.
+    global _schema
+
+    _schema = None
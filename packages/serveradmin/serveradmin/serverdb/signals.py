@@ -4,4 +4,7 @@ from django.dispatch import Signal
 pre_commit_critical = Signal()
 pre_commit = Signal()
 post_commit = Signal()
+# Sent by the post_commit_worker command for the commits queued on the
+# outbox.  See serveradmin.serverdb.commit_outbox for details.
+post_commit_async = Signal()
 
@@ -2,11 +2,11 @@
 
 Copyright (c) 2019 InnoGames GmbH
 """
-# XXX: It is terrible to generate SQL this way.  We should make this use
-# parameterized queries at least.
 # XXX: The code in this module is almost randomly split into functions.  Do
 # not try to guess what they would do.
 
+import re
+
 from adminapi.filters import (
     All,
     Any,
@@ -35,31 +35,171 @@ from serveradmin.serverdb.models import (
 
 # XXX: The "related_vias" argument is carried all the way through most of
 # the functions to optimize related_via_attribute selection.  We should find
-# a nicer way to achieve this.
-def get_server_query(attribute_filters, related_vias):
+# a nicer way to achieve this.  The "params" list is carried the same way.
+# The filter values are never formatted into the SQL.  They are appended
+# to it and referenced by their position as "$1", "$2" etc.  Those are
+# the placeholders of the server-side prepared statements, so the SQL
+# only depends on the shape of the query, not on the values.
+def get_server_query(
+    attribute_filters, related_vias, order_by=(), after=None,
+    limit=None, offset=None,
+):
+    """Return the SQL and its parameters to fetch the matching servers
+
+    The servers are ordered by the given attributes, and then by their
+    hostnames.  The "order_by" argument is a list of the attributes
+    together with the servertypes having them.  The expressions to order
+    by are selected as "order_0", "order_1" and so on, if there is a limit.
+    The "after" argument is the list of their values on the last server of
+    the previous page.  The query would continue from there.
+    """
+    params = []
+    conditions = _get_sql_conditions(attribute_filters, related_vias, params)
+    order_by_keys = get_order_by_keys(order_by)
+    if after is not None:
+        conditions.append(_after_sql_condition(order_by_keys, after, params))
+
     sql = (
         'SELECT'
         ' server.server_id,'
         ' server.hostname,'
         ' server.intern_ip,'
         ' server.servertype_id'
-        ' FROM server'
     )
-    if attribute_filters:
-        sql += ' WHERE ' + ' AND '.join(
-            _get_sql_condition(a, f, related_vias)
-            for a, f in attribute_filters
+    if limit is not None:
+        for index, (key_sql, nullable) in enumerate(order_by_keys):
+            sql += ', {} AS order_{}'.format(key_sql, index)
+    sql += ' FROM server'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY ' + ', '.join(
+        key_sql + (' NULLS FIRST' if nullable else '')
+        for key_sql, nullable in order_by_keys
+    )
+
+    # The limit and the offset are parameters, too, so the queries for
+    # the different pages would still have the same SQL.
+    if limit is not None:
+        sql += ' LIMIT ' + _sql_param(params, limit)
+    if offset:
+        sql += ' OFFSET ' + _sql_param(params, offset)
+
+    return sql, params
+
+
+def get_server_count_query(attribute_filters, related_vias):
+    """Return the SQL and its parameters to count the matching servers
+
+    The conditions are the same as get_server_query().  We are not using it
+    as a sub-query to avoid the pointless ordering.
+    """
+    params = []
+    conditions = _get_sql_conditions(attribute_filters, related_vias, params)
+
+    sql = 'SELECT count(*) FROM server'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+
+    return sql, params
+
+
+def _get_sql_conditions(attribute_filters, related_vias, params):
+    return [
+        _get_sql_condition(a, f, related_vias, params)
+        for a, f in attribute_filters
+    ]
+
+
+def get_order_by_keys(order_by):
+    """Return the expressions to order by with whether they can be null"""
+    order_by_keys = []
+    for attribute, servertype_ids in order_by:
+        order_by_keys.extend(_order_by_keys(attribute, servertype_ids))
+
+        # Nothing would be left to order after a unique attribute.
+        if attribute.special and attribute.special.unique:
+            break
+    else:
+        order_by_keys.append(('server.hostname', False))
+
+    return order_by_keys
+
+
+def _order_by_keys(attribute, servertype_ids):
+    """Yield the expressions to order by the attribute
+
+    They must give the same order as the query materializer.  The servers
+    without the value come first, then the ones with it, and then the ones
+    the attribute is not on their servertypes.
+    """
+    value_sql = _order_by_value_sql(attribute)
+    if attribute.special:
+        yield value_sql, not attribute.special.unique
+        return
+
+    # It is still possible that none of the servertypes has the attribute.
+    # Then, all of them are equal.
+    if not servertype_ids:
+        return
+
+    yield 'server.servertype_id NOT IN ({})'.format(
+        ', '.join("'{}'".format(s) for s in servertype_ids)
+    ), False
+    yield value_sql, True
+
+
+def _after_sql_condition(order_by_keys, after, params):
+    """Return the condition for the servers ordered after the values
+
+    The rows are compared one expression after another.  We cannot use
+    the row constructors for this, because the nulls come first.
+    """
+    assert len(order_by_keys) == len(after)
+
+    conditions = []
+    equals = []
+    for (key_sql, nullable), value in zip(order_by_keys, after):
+        if value is None:
+            conditions.append(equals + [key_sql + ' IS NOT NULL'])
+            equals.append(key_sql + ' IS NULL')
+        else:
+            placeholder = _sql_param(params, value)
+            conditions.append(equals + [key_sql + ' > ' + placeholder])
+            equals.append(key_sql + ' = ' + placeholder)
+
+    return '(' + ' OR '.join(' AND '.join(c) for c in conditions) + ')'
+
+
+def _order_by_value_sql(attribute):
+    if attribute.special:
+        sql = 'server.' + attribute.special.field
+    else:
+        assert not attribute.multi
+        sql = (
+            '(SELECT sub.value FROM {0} AS sub'
+            ' WHERE sub.server_id = server.server_id'
+            " AND sub.attribute_id = '{1}')"
+            .format(
+                ServerAttribute.get_model(attribute.type)._meta.db_table,
+                attribute.attribute_id,
+            )
         )
-    sql += ' ORDER BY server.hostname'
+
+    # The query materializer sorts the strings by their code points.
+    # The "C" collation gives us the same order on UTF-8 databases.
+    if attribute.type == 'string':
+        sql += ' COLLATE "C"'
 
     return sql
 
 
-def _get_sql_condition(attribute, filt, related_vias):
+def _get_sql_condition(attribute, filt, related_vias, params):
     assert isinstance(filt, BaseFilter)
 
     if isinstance(filt, (Not, Any)):
-        return _logical_filter_sql_condition(attribute, filt, related_vias)
+        return _logical_filter_sql_condition(
+            attribute, filt, related_vias, params
+        )
 
     negate = False
     template = ''
@@ -81,16 +221,18 @@ def _get_sql_condition(attribute, filt, related_vias):
         negate = not filt.value
 
     elif isinstance(filt, Regexp):
-        template = '{0}::text ~ E' + _raw_sql_escape(filt.value)
+        template = '{0}::text ~ ' + _sql_param(
+            params, _unescape_regexp(filt.value)
+        )
     elif isinstance(filt, (GreaterThanOrEquals, LessThanOrEquals)):
-        template = _basic_comparison_filter_template(attribute, filt)
+        template = _basic_comparison_filter_template(attribute, filt, params)
     elif isinstance(filt, Overlaps):
-        template = _containment_filter_template(attribute, filt)
+        template = _containment_filter_template(attribute, filt, params)
     elif isinstance(filt, Empty):
         negate = True
         template = '{0} IS NOT NULL'
     else:
-        template = '{0} = ' + _raw_sql_escape(filt.value)
+        template = '{0} = ' + _sql_param(params, filt.value)
 
     return _covered_sql_condition(attribute, template, negate, related_vias)
 
@@ -112,10 +254,10 @@ def _covered_sql_condition(attribute, template, negate, related_vias):
     )
 
 
-def _logical_filter_sql_condition(attribute, filt, related_vias):
+def _logical_filter_sql_condition(attribute, filt, related_vias, params):
     if isinstance(filt, Not):
         return 'NOT ({0})'.format(
-            _get_sql_condition(attribute, filt.value, related_vias)
+            _get_sql_condition(attribute, filt.value, related_vias, params)
         )
 
     if isinstance(filt, All):
@@ -141,20 +283,22 @@ def _logical_filter_sql_condition(attribute, filt, related_vias):
             simple_values.append(value)
         else:
             templates.append(
-                _get_sql_condition(attribute, value, related_vias)
+                _get_sql_condition(attribute, value, related_vias, params)
             )
 
     if simple_values:
         if len(simple_values) == 1:
             template = _get_sql_condition(
-                attribute, simple_values[0], related_vias
+                attribute, simple_values[0], related_vias, params
             )
         else:
+            # The values are passed as a single array parameter, so that
+            # the shape of the query doesn't depend on the number of them.
             template = _covered_sql_condition(
                 attribute,
-                '{{0}} IN ({0})'.format(', '.join(
-                    _raw_sql_escape(v.value) for v in simple_values
-                )),
+                '{0} = ANY(' + _sql_array_param(
+                    params, [v.value for v in simple_values]
+                ) + ')',
                 False,
                 related_vias,
             )
@@ -163,7 +307,7 @@ def _logical_filter_sql_condition(attribute, filt, related_vias):
     return '({0})'.format(joiner.join(templates))
 
 
-def _basic_comparison_filter_template(attribute, filt):
+def _basic_comparison_filter_template(attribute, filt, params):
     if isinstance(filt, GreaterThan):
         operator = '>'
     elif isinstance(filt, LessThan):
@@ -173,18 +317,16 @@ def _basic_comparison_filter_template(attribute, filt):
     else:
         operator = '<='
 
-    return '{{}} {} {}'.format(
-        operator, _raw_sql_escape(filt.value)
-    )
+    return '{{}} {} {}'.format(operator, _sql_param(params, filt.value))
 
 
-def _containment_filter_template(attribute, filt):
+def _containment_filter_template(attribute, filt, params):
     template = None     # To be formatted 2 times
     value = filt.value
 
     if attribute.type == 'inet':
         if isinstance(filt, StartsWith):
-            template = "{{0}} >>= {0} AND host({{0}}) = host(0{})"
+            template = "{{0}} >>= {0} AND host({{0}}) = host({0})"
         elif isinstance(filt, Contains):
             template = "{{0}} >>= {0}"
         elif isinstance(filt, ContainedOnlyBy):
@@ -205,7 +347,7 @@ def _containment_filter_template(attribute, filt):
                 '' if isinstance(filt, StartsWith) else '%', value, '%'
             )
         elif isinstance(filt, ContainedBy):
-            template = "{0} LIKE '%%' || {{0}} || '%%'"
+            template = "{0} LIKE '%' || {{0}} || '%'"
 
     if not template:
         raise FilterValueError(
@@ -213,13 +355,11 @@ def _containment_filter_template(attribute, filt):
             .format(type(filt).__name__, attribute)
         )
 
-    return template.format(_raw_sql_escape(value))
+    return template.format(_sql_param(params, value))
 
 
 def _target_servertype_sql(alias: str, attribute: models.Attribute) -> str:
-    ids = list(
-        attribute.target_servertype.values_list('servertype_id', flat=True)
-    )
+    ids = attribute.get_target_servertype_ids()
     if len(ids) == 1:
         return f"{alias}.servertype_id = '{ids[0]}'"
     return "{}.servertype_id IN ({})".format(
@@ -363,20 +503,66 @@ def _supernet_exists_sql(attribute: Attribute, supernet_alias: str, addr_match:
     )
 
 
-def _raw_sql_escape(value):
+def _sql_param(params, value):
+    """Append the value to the parameters and return its placeholder"""
+    params.append(_sql_value(value))
+
+    return '${}'.format(len(params))
+
+
+def _sql_array_param(params, values):
+    """Append the values as a single array parameter
+
+    The array is passed as its text representation, the same way as all
+    the other values.  This lets the server cast it to the array of
+    the compared column type, whatever that is.
+    """
+    params.append('{' + ','.join(
+        '"' + v.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        for v in map(_sql_value, values)
+    ) + '}')
+
+    return '${}'.format(len(params))
+
+
+def _sql_value(value):
     try:
-        value = str(value)
+        return str(value)
     except UnicodeEncodeError as error:
         raise FilterValueError(str(error))
 
-    if "'" in value:
-        raise FilterValueError('Single quote cannot be used')
 
+_regexp_escape_pattern = re.compile(
+    r'\\(?:([bfnrt])|([0-7]{1,3})|x([0-9A-Fa-f]{1,2})|'
+    r'u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))',
+    re.DOTALL,
+)
+_regexp_escape_chars = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def _unescape_regexp(value):
+    """Process the backslash escapes of the regular expression
+
+    The regular expressions used to be passed to the database as escape
+    string constants (E'...').  We are replicating how those are processed
+    by PostgreSQL to keep the existing queries matching the same objects.
+    """
+    value = str(value)
     if value.endswith('\\'):
         raise FilterValueError(
             'Escape character cannot be used in the end'
         )
 
-    value = value.replace('{', '{{').replace('}', '}}').replace('%', '%%')
-
-    return "'" + value + "'"
+    def replace(match):
+        char, octal, hexa, short, long_, other = match.groups()
+        if char:
+            return _regexp_escape_chars[char]
+        if octal:
+            return chr(int(octal, 8))
+        if hexa:
+            return chr(int(hexa, 16))
+        if short or long_:
+            return chr(int(short or long_, 16))
+        return other
+
+    return _regexp_escape_pattern.sub(replace, value)
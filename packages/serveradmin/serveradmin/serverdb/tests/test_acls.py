@@ -598,3 +598,28 @@ class ACLTestCase(TransactionTestCase):
             query_committer._access_control(
                 user, None, unchanged_objects, {}, changed_objects, {}
             )
+
+    def test_commit_matches_filter_on_unchanged_attribute(self):
+        user = User.objects.first()
+        app = Application.objects.create(
+            name='acl test',
+            app_id='acl test',
+            auth_token='secret',
+            owner=user,
+            location='test',
+        )
+        acl = AccessControlGroup.objects.create(
+            name='app test', query='os=squeeze', is_whitelist=False
+        )
+        acl.applications.add(app)
+        acl.save()
+
+        # Only the hostname is changed, but the os has to be checked, too.
+        query = Query({'hostname': 'test1'}, ['hostname'])
+        query.update(hostname='test11')
+        query.commit(app=app)
+
+        query = Query({'hostname': 'test0'}, ['hostname'])
+        query.update(hostname='test10')
+        with self.assertRaises(PermissionDenied):
+            query.commit(app=app)
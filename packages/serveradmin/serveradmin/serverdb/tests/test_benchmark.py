@@ -0,0 +1,64 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from serveradmin.serverdb.management.commands.benchmark import (
+    PREFIX,
+    VALUE_MODELS,
+)
+from serveradmin.serverdb.models import (
+    Attribute,
+    Server,
+    Servertype,
+    ServertypeAttribute,
+)
+
+
+class TestBenchmark(TransactionTestCase):
+    def test_report(self):
+        stdout = StringIO()
+        call_command(
+            'benchmark', servers=20, servertypes=2, iterations=1,
+            stdout=stdout,
+        )
+        report = json.loads(stdout.getvalue())
+
+        self.assertEqual(list(report['workloads']), [
+            'query_hostname',
+            'query_filter',
+            'query_all_attributes',
+            'query_related',
+            'query_joins',
+            'query_page',
+            'query_count',
+            'view_query',
+            'commit_update',
+            'commit_create',
+            'commit_delete',
+        ])
+        for result in report['workloads'].values():
+            self.assertIn('p50', result['latency_ms'])
+
+        # The fleet is removed afterwards.
+        for model in VALUE_MODELS:
+            self.assertFalse(
+                model.objects.filter(attribute_id__startswith=PREFIX).exists()
+            )
+        self.assertFalse(
+            Server.objects.filter(hostname__startswith=PREFIX).exists()
+        )
+        self.assertFalse(
+            ServertypeAttribute.objects
+            .filter(servertype_id__startswith=PREFIX)
+            .exists()
+        )
+        self.assertFalse(
+            Attribute.objects.filter(attribute_id__startswith=PREFIX).exists()
+        )
+        self.assertFalse(
+            Servertype.objects
+            .filter(servertype_id__startswith=PREFIX)
+            .exists()
+        )
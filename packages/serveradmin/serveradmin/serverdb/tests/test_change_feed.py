@@ -0,0 +1,52 @@
+from time import monotonic
+
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+
+from serveradmin.dataset import Query
+from serveradmin.serverdb.change_feed import (
+    get_changes_since,
+    get_last_commit_id,
+)
+
+
+class TestChangeFeed(TransactionTestCase):
+    fixtures = ['auth_user.json', 'test_dataset.json']
+
+    def _commit(self, hostname, os):
+        query = Query({'hostname': hostname}, ['os'])
+        query.update(os=os)
+        return query.commit(user=User.objects.first())
+
+    def test_changes_in_order(self):
+        start = get_last_commit_id()
+        first = self._commit('test0', 'buster')
+        second = self._commit('test1', 'bullseye')
+
+        changes, last_commit_id, has_more = get_changes_since(start)
+        self.assertEqual(last_commit_id, second)
+        self.assertFalse(has_more)
+        self.assertEqual(
+            [(c['commit_id'], c['change_type']) for c in changes],
+            [(first, 'change'), (second, 'change')],
+        )
+        self.assertEqual(changes[1]['change']['os']['new'], 'bullseye')
+
+    def test_limit(self):
+        start = get_last_commit_id()
+        first = self._commit('test0', 'buster')
+        self._commit('test1', 'bullseye')
+
+        changes, last_commit_id, has_more = get_changes_since(start, limit=1)
+        self.assertEqual(last_commit_id, first)
+        self.assertTrue(has_more)
+        self.assertEqual(len(changes), 1)
+
+    def test_wait_without_changes(self):
+        start = monotonic()
+        commit_id = get_last_commit_id()
+        self.assertEqual(
+            get_changes_since(commit_id, wait=0.1),
+            ([], commit_id, False),
+        )
+        self.assertGreaterEqual(monotonic() - start, 0.1)
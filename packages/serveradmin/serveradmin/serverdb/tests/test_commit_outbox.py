@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+
+from serveradmin.dataset import Query
+from serveradmin.serverdb.commit_outbox import (
+    claim_post_commit_events,
+    deliver_post_commit_event,
+)
+from serveradmin.serverdb.models import PostCommitEvent
+from serveradmin.serverdb.signals import post_commit_async
+
+
+class TestCommitOutbox(TransactionTestCase):
+    fixtures = ['auth_user.json', 'test_dataset.json']
+
+    def setUp(self):
+        super().setUp()
+        self.received = []
+        self.failing = False
+        post_commit_async.connect(self._receive)
+
+    def tearDown(self):
+        post_commit_async.disconnect(self._receive)
+        super().tearDown()
+
+    def _receive(self, sender, **kwargs):
+        if self.failing:
+            raise RuntimeError('Receiver failed')
+        self.received.append(kwargs)
+
+    def _commit(self):
+        query = Query({'hostname': 'test0'}, ['os'])
+        query.update(os='buster')
+        return query.commit(user=User.objects.first())
+
+    def test_commit_is_queued(self):
+        commit_id = self._commit()
+
+        self.assertEqual(self.received, [])
+        event = PostCommitEvent.objects.get()
+        self.assertEqual(event.commit_id, commit_id)
+        self.assertEqual(event.payload['changed'][0]['os']['new'], 'buster')
+
+    def test_event_is_delivered(self):
+        commit_id = self._commit()
+
+        events = claim_post_commit_events(10, timedelta(minutes=5))
+        self.assertEqual(len(events), 1)
+        self.assertTrue(
+            deliver_post_commit_event(events[0], timedelta(hours=1))
+        )
+        self.assertEqual(len(self.received), 1)
+        self.assertEqual(self.received[0]['commit_id'], commit_id)
+        self.assertEqual(self.received[0]['attempt'], 1)
+        self.assertFalse(PostCommitEvent.objects.exists())
+
+    def test_event_is_retried(self):
+        self._commit()
+        self.failing = True
+
+        events = claim_post_commit_events(10, timedelta(minutes=5))
+        self.assertFalse(
+            deliver_post_commit_event(events[0], timedelta(hours=1))
+        )
+        event = PostCommitEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('Receiver failed', event.last_error)
+
+        # The event is not due again before the delay.
+        self.assertEqual(claim_post_commit_events(10, timedelta(0)), [])
@@ -0,0 +1,47 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from serveradmin.dataset import Query
+from serveradmin.serverdb.query_cache import (
+    LocalMemoryBackend,
+    execute_cached_query,
+)
+
+
+class TestLocalMemoryBackend(SimpleTestCase):
+    def test_least_recently_used_is_evicted(self):
+        backend = LocalMemoryBackend(max_entries=2)
+        backend.set('a', '1')
+        backend.set('b', '2')
+        self.assertEqual(backend.get('a'), '1')
+        backend.set('c', '3')
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('a'), '1')
+        self.assertEqual(backend.get('c'), '3')
+
+
+@override_settings(
+    QUERY_CACHE_BACKEND='serveradmin.serverdb.query_cache.LocalMemoryBackend'
+)
+class TestQueryCache(TransactionTestCase):
+    fixtures = ['auth_user.json', 'test_dataset.json']
+
+    def _get_os(self):
+        payload = execute_cached_query({'hostname': 'test0'}, ['os'], None)
+        return json.loads(payload)[0]['os']
+
+    def test_cached(self):
+        self.assertEqual(self._get_os(), 'wheezy')
+        with self.assertNumQueries(1):
+            self.assertEqual(self._get_os(), 'wheezy')
+
+    def test_invalidated_by_commit(self):
+        self.assertEqual(self._get_os(), 'wheezy')
+
+        query = Query({'hostname': 'test0'}, ['os'])
+        query.update(os='buster')
+        query.commit(user=User.objects.first())
+
+        self.assertEqual(self._get_os(), 'buster')
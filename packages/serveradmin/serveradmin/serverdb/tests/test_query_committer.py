@@ -0,0 +1,110 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from adminapi.filters import Regexp
+from serveradmin.dataset import Query
+from serveradmin.serverdb.query_committer import commit_query
+
+
+class TestBulkInsert(TransactionTestCase):
+    fixtures = ['auth_user.json', 'test_dataset.json']
+
+    def _get_vms(self, number):
+        return [
+            {
+                'hostname': 'vm-new-{}'.format(index),
+                'servertype': 'vm',
+                'intern_ip': '10.1.0.{}'.format(index),
+                'hypervisor': 'hv-1',
+            }
+            for index in range(number)
+        ]
+
+    def test_attributes_are_inserted_at_once(self):
+        with CaptureQueriesContext(connection) as context:
+            commit_query(created=self._get_vms(3), user=User.objects.first())
+
+        inserts = [
+            q['sql'] for q in context.captured_queries
+            if q['sql'].startswith('INSERT INTO "server_relation_attribute"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            Query({'hypervisor': 'hv-1'}, ['hostname']).count(), 4
+        )
+
+    def test_duplicate_intern_ip_together(self):
+        vms = self._get_vms(2)
+        vms[1]['intern_ip'] = vms[0]['intern_ip']
+        with self.assertRaises(ValidationError):
+            commit_query(created=vms, user=User.objects.first())
+
+    def test_relation_to_wrong_servertype(self):
+        vms = self._get_vms(1)
+        vms[0]['hypervisor'] = 'test0'
+        with self.assertRaises(ValidationError):
+            commit_query(created=vms, user=User.objects.first())
+
+    def test_relation_to_missing_server(self):
+        vms = self._get_vms(1)
+        vms[0]['hypervisor'] = 'hv-missing'
+        with self.assertRaises(ValidationError):
+            commit_query(created=vms, user=User.objects.first())
+
+    def test_update_replaces_value(self):
+        commit_query(
+            changed=[{
+                'object_id': 1,
+                'os': {'action': 'update', 'old': 'wheezy', 'new': 'buster'},
+            }],
+            user=User.objects.first(),
+        )
+        self.assertEqual(Query({'hostname': 'test0'}, ['os']).get()['os'],
+                         'buster')
+
+    def test_ips_are_validated_at_once(self):
+        user = User.objects.first()
+        vms = self._get_vms(6)
+        # The first commit fills the cached schema.
+        commit_query(created=vms[:1], user=user)
+        with CaptureQueriesContext(connection) as context:
+            commit_query(created=vms[1:2], user=user)
+        with self.assertNumQueries(len(context.captured_queries)):
+            commit_query(created=vms[2:], user=user)
+
+    def test_changed_ips_are_validated_without_servertypes(self):
+        user = User.objects.first()
+        commit_query(created=self._get_vms(3), user=user)
+        changed = [
+            {
+                'object_id': vm['object_id'],
+                'intern_ip': {
+                    'action': 'update',
+                    'old': vm['intern_ip'],
+                    'new': '10.2.0.{}'.format(index),
+                },
+            }
+            for index, vm in enumerate(
+                Query({'hostname': Regexp('^vm-new-')}, ['intern_ip'])
+            )
+        ]
+
+        # The servertypes are taken from the schema.
+        with CaptureQueriesContext(connection) as context:
+            commit_query(changed=changed, user=user)
+        self.assertFalse([
+            q['sql'] for q in context.captured_queries
+            if 'FROM "servertype"' in q['sql']
+        ])
+
+    def test_ip_conflicts_are_reported_together(self):
+        vms = self._get_vms(3)
+        vms[0]['intern_ip'] = '10.16.0.1'
+        vms[1]['intern_ip'] = '10.16.0.2'
+        vms[2]['intern_ip'] = vms[1]['intern_ip']
+        with self.assertRaises(ValidationError) as context:
+            commit_query(created=vms, user=User.objects.first())
+        self.assertEqual(len(context.exception.messages), 3)
@@ -0,0 +1,302 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from adminapi.filters import Any, Regexp
+from serveradmin.serverdb.models import (
+    Attribute,
+    ServerRelationAttribute,
+    ServertypeAttribute,
+)
+from serveradmin.serverdb.query_committer import commit_query
+from serveradmin.serverdb.query_executer import (
+    execute_count_query,
+    execute_queries,
+    execute_query,
+    execute_query_page,
+    stream_query,
+)
+
+
+class TestPagination(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def _get_hostnames(self, results):
+        return [s['hostname'] for s in results]
+
+    def test_limit_and_offset(self):
+        results = execute_query(
+            {'hostname': Regexp('^test')}, ['hostname'], None, 2, 1
+        )
+        self.assertEqual(self._get_hostnames(results), ['test1', 'test2'])
+
+    def test_cursor(self):
+        filters = {'hostname': Regexp('^test')}
+        hostnames = []
+        cursor = None
+        while True:
+            results, cursor = execute_query_page(
+                filters, ['hostname'], ['hostname'], 2, cursor=cursor
+            )
+            hostnames.extend(self._get_hostnames(results))
+            if cursor is None:
+                break
+        self.assertEqual(
+            hostnames, ['test0', 'test1', 'test2', 'test3', 'test4']
+        )
+
+    def test_cursor_ordering_on_python(self):
+        filters = {'hostname': Regexp('^test')}
+        results, cursor = execute_query_page(
+            filters, ['hostname', 'servertype'], ['servertype'], 3
+        )
+        self.assertEqual(len(results), 3)
+        results, cursor = execute_query_page(
+            filters, ['hostname', 'servertype'], ['servertype'], 3,
+            cursor=cursor,
+        )
+        self.assertEqual(len(results), 2)
+        self.assertIsNone(cursor)
+
+    def test_cursor_of_another_order(self):
+        _, cursor = execute_query_page(
+            {'hostname': Regexp('^test')}, ['hostname'], None, 1
+        )
+        with self.assertRaises(ValidationError):
+            execute_query(
+                {'hostname': Regexp('^test')}, ['hostname'], ['object_id'],
+                1, cursor=cursor,
+            )
+
+
+class TestCount(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def test_count(self):
+        self.assertEqual(
+            execute_count_query({'hostname': Regexp('^test')}), 5
+        )
+        self.assertEqual(execute_count_query({'os': 'wheezy'}), len(
+            execute_query({'os': 'wheezy'}, ['hostname'], None)
+        ))
+
+    def test_count_destined_to_fail(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(execute_count_query({'hostname': Any()}), 0)
+
+
+class TestOrderBy(TransactionTestCase):
+    fixtures = ['auth_user.json', 'test_dataset.json']
+
+    def test_same_order_as_materializer(self):
+        # The hypervisor is ordered by Python because it is a relation.
+        for order_by in (['os'], ['servertype', 'os'], ['hypervisor']):
+            results = execute_query({}, ['hostname', 'os'], order_by)
+            pages = []
+            cursor = None
+            while True:
+                page, cursor = execute_query_page(
+                    {}, ['hostname', 'os'], order_by, 2, cursor=cursor
+                )
+                pages.extend(page)
+                if cursor is None:
+                    break
+            self.assertEqual(pages, results)
+
+    def test_cursor_after_deleting(self):
+        # The next page continues after the values of the last object, so
+        # deleting the objects before it doesn't cause skipping the others.
+        restrict = ['hostname', 'os']
+        page, cursor = execute_query_page({}, restrict, ['os'], 2)
+        self.assertEqual([s['hostname'] for s in page], ['test1', 'test2'])
+
+        commit_query(deleted=[2], user=User.objects.first())
+        page, cursor = execute_query_page(
+            {}, restrict, ['os'], 2, cursor=cursor
+        )
+        self.assertEqual([s['hostname'] for s in page], ['test3', 'test0'])
+
+    def test_null_first_missing_last(self):
+        results = execute_query({}, ['hostname', 'os'], ['os'])
+        values = [s.get('os', 'missing') for s in results]
+        present = [v for v in values if v not in (None, 'missing')]
+        self.assertEqual(values, (
+            [None] * values.count(None) +
+            sorted(present) +
+            ['missing'] * values.count('missing')
+        ))
+
+
+class TestStreamQuery(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def test_chunks(self):
+        for order_by in (None, ['os'], ['hypervisor']):
+            chunks = list(stream_query({}, ['hostname', 'os'], order_by, 2))
+            self.assertTrue(all(len(c) <= 2 for c in chunks))
+            self.assertEqual(
+                [o for c in chunks for o in c],
+                execute_query({}, ['hostname', 'os'], order_by),
+            )
+
+    def test_parameters(self):
+        chunks = list(stream_query(
+            {'hostname': Any('test0', 'test1'), 'os': Regexp('^squ')},
+            ['hostname'],
+            None,
+        ))
+        self.assertEqual(
+            [o['hostname'] for c in chunks for o in c], ['test1']
+        )
+
+
+class TestMaterializer(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def test_attribute_values(self):
+        results = {
+            o['hostname']: o
+            for o in execute_query({}, None, None)
+        }
+        self.assertEqual(results['test0']['os'], 'wheezy')
+        self.assertEqual(results['test1']['game_world'], 1)
+        self.assertEqual(results['vm-1']['hypervisor'], 'hv-1')
+        self.assertEqual(results['hv-1']['vms'], {'vm-1'})
+
+    def test_stored_attributes_in_single_query(self):
+        with CaptureQueriesContext(connection) as hostname_queries:
+            execute_query({}, ['hostname'], None)
+        with CaptureQueriesContext(connection) as attribute_queries:
+            execute_query(
+                {}, ['hostname', 'os', 'game_world', 'hypervisor', 'vms'], None
+            )
+        self.assertEqual(
+            len(attribute_queries), len(hostname_queries) + 1
+        )
+
+
+class TestRelatedAttributes(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def setUp(self):
+        # The chain is vm-1 -> hypervisor hv-1 -> rack test0.  The rack of
+        # the VM is related via the hypervisor, and the os via the rack.
+        rack = Attribute.objects.create(
+            attribute_id='rack', type='relation', regexp='\\A.*\\Z'
+        )
+        ServertypeAttribute.objects.create(
+            servertype_id='hypervisor', attribute=rack
+        )
+        ServertypeAttribute.objects.create(
+            servertype_id='vm',
+            attribute=rack,
+            related_via_attribute_id='hypervisor',
+        )
+        ServertypeAttribute.objects.create(
+            servertype_id='vm',
+            attribute_id='os',
+            related_via_attribute=rack,
+        )
+        ServerRelationAttribute.objects.create(
+            server_id=6, attribute=rack, value_id=1
+        )
+
+    def test_multi_level(self):
+        for restrict in (['os'], ['os', 'rack'], ['os', 'rack', 'hypervisor']):
+            vm = execute_query({'hostname': 'vm-1'}, restrict, None)[0]
+            self.assertEqual(vm['os'], 'wheezy')
+
+    def test_levels_are_batched(self):
+        with CaptureQueriesContext(connection) as related_queries:
+            execute_query({'hostname': 'vm-1'}, ['hostname', 'os'], None)
+        with CaptureQueriesContext(connection) as stored_queries:
+            execute_query({'hostname': 'test0'}, ['hostname', 'os'], None)
+        self.assertEqual(len(related_queries), len(stored_queries) + 2)
+
+
+class TestJoins(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def test_join_paths(self):
+        hv = execute_query({'hostname': 'hv-1'}, [
+            'hostname', {'vms': ['hostname', {'hypervisor': ['hostname']}]},
+        ], None)[0]
+        self.assertEqual(hv['vms'], [
+            {'hostname': 'vm-1', 'hypervisor': {'hostname': 'hv-1'}},
+        ])
+
+    def test_join_paths_share_level(self):
+        with CaptureQueriesContext(connection) as queries:
+            execute_query(
+                {}, ['hostname', 'vms', {'hypervisor': ['hostname']}], None
+            )
+        with CaptureQueriesContext(connection) as shared_queries:
+            results = execute_query({}, [
+                'hostname',
+                {'vms': ['hostname']},
+                {'hypervisor': ['hostname']},
+            ], None)
+        self.assertEqual(len(shared_queries), len(queries))
+        hv = next(o for o in results if o['hostname'] == 'hv-1')
+        self.assertEqual(hv['vms'], [{'hostname': 'vm-1'}])
+
+
+class TestPreparedStatements(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def _count(self):
+        return execute_count_query({'hostname': Regexp('^test')})
+
+    def test_prepared_once(self):
+        self._count()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._count(), 5)
+        self.assertFalse(
+            any(q['sql'].startswith('PREPARE') for q in queries)
+        )
+
+    @override_settings(DATABASE_PREPARED_STATEMENTS=False)
+    def test_disabled(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self._count(), 5)
+        self.assertFalse(
+            any(q['sql'].startswith(('PREPARE', 'EXECUTE')) for q in queries)
+        )
+
+    def test_session_reset(self):
+        self._count()
+        connection.cursor().execute('DISCARD ALL')
+        self.assertEqual(self._count(), 5)
+
+    def test_session_reset_within_transaction(self):
+        query = ({'hostname': Regexp('^test')}, ['hostname'], None)
+        execute_query(*query)
+        connection.cursor().execute('DISCARD ALL')
+        self.assertEqual(len(execute_query(*query)), 5)
+
+
+class TestExecuteQueries(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def test_same_results(self):
+        queries = [
+            ({'hostname': Regexp('^test')}, ['hostname', 'os'], ['hostname']),
+            ({}, ['hostname', 'hypervisor'], ['hypervisor']),
+            ({'hostname': Any()}, None, None),
+        ]
+        self.assertEqual(
+            execute_queries(queries),
+            [execute_query(*q) for q in queries],
+        )
+
+    def test_single_transaction(self):
+        with CaptureQueriesContext(connection) as queries:
+            execute_queries([
+                ({'hostname': 'test0'}, ['hostname'], None),
+                ({'hostname': 'test1'}, ['hostname'], None),
+            ])
+        self.assertEqual(
+            len([q for q in queries if 'ISOLATION' in q['sql']]), 1
+        )
@@ -0,0 +1,85 @@
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, TransactionTestCase
+
+from serveradmin.dataset import Query
+from serveradmin.serverdb.models import Attribute
+from serveradmin.serverdb.query_committer import commit_query
+from serveradmin.serverdb.replica import (
+    REPLICA_DB_ALIAS,
+    ReplicaRouter,
+    get_commit_lsn,
+    get_read_alias,
+    read_from_primary,
+    read_from_replica,
+)
+
+
+class TestReplicaRouter(SimpleTestCase):
+    def test_without_replica(self):
+        with read_from_replica(commit_id=1):
+            self.assertEqual(get_read_alias(), DEFAULT_DB_ALIAS)
+        with read_from_replica(commit_lsn=1):
+            self.assertEqual(get_read_alias(), DEFAULT_DB_ALIAS)
+        self.assertEqual(get_read_alias(), DEFAULT_DB_ALIAS)
+        self.assertIsNone(get_commit_lsn())
+
+    def test_primary_within_replica(self):
+        with read_from_replica(), read_from_primary():
+            self.assertEqual(get_read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_replica_is_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertFalse(router.allow_migrate(REPLICA_DB_ALIAS, 'serverdb'))
+        self.assertIsNone(router.allow_migrate(DEFAULT_DB_ALIAS, 'serverdb'))
+        self.assertEqual(router.db_for_write(None), DEFAULT_DB_ALIAS)
+
+
+class TestReadYourWrites(TransactionTestCase):
+    fixtures = ['auth_user.json', 'test_dataset.json']
+
+    def setUp(self):
+        # The replica is a mirror of the primary like in the tests with
+        # a replica configured.
+        databases = patch.dict(settings.DATABASES, {
+            REPLICA_DB_ALIAS: settings.DATABASES[DEFAULT_DB_ALIAS],
+        })
+        databases.start()
+        self.addCleanup(databases.stop)
+        connections[REPLICA_DB_ALIAS] = connections[DEFAULT_DB_ALIAS]
+        self.addCleanup(connections.__delitem__, REPLICA_DB_ALIAS)
+
+    def test_commit_replayed(self):
+        with read_from_replica(commit_lsn=get_commit_lsn()):
+            self.assertEqual(get_read_alias(), REPLICA_DB_ALIAS)
+
+    def test_commit_not_replayed(self):
+        with read_from_replica(commit_lsn=get_commit_lsn() + 2 ** 32):
+            self.assertEqual(get_read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_commit_without_history(self):
+        attribute = Attribute.objects.get(pk='os')
+        attribute.history = False
+        attribute.save()
+
+        start = get_commit_lsn()
+        _, commit_id = commit_query(
+            changed=[{
+                'object_id': 1,
+                'os': {'action': 'update', 'old': 'wheezy', 'new': 'buster'},
+            }],
+            user=User.objects.first(),
+        )
+        commit_lsn = get_commit_lsn()
+
+        # Nothing is logged, but the position still moves on.
+        self.assertIsNone(commit_id)
+        self.assertGreater(commit_lsn, start)
+        with read_from_replica(commit_lsn=commit_lsn):
+            self.assertEqual(get_read_alias(), REPLICA_DB_ALIAS)
+            self.assertEqual(
+                Query({'hostname': 'test0'}, ['os']).get()['os'], 'buster'
+            )
@@ -0,0 +1,88 @@
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from serveradmin.serverdb.models import (
+    Attribute,
+    Server,
+    ServertypeAttribute,
+)
+from serveradmin.serverdb.query_materializer import QueryMaterializer
+from serveradmin.serverdb.schema_cache import build_snapshot, get_schema
+
+
+class TestSchemaCache(TransactionTestCase):
+    fixtures = ['test_dataset.json']
+
+    def test_schema_is_reused(self):
+        schema = get_schema()
+        self.assertIs(get_schema(), schema)
+        self.assertIn('os', schema.attributes)
+        self.assertIn('os', schema.servertype_attributes['test0'])
+
+    def test_schema_is_reloaded_on_change(self):
+        schema = get_schema()
+
+        attribute = Attribute.objects.create(
+            attribute_id='new_attribute', type='string', regexp='\\A.*\\Z'
+        )
+        ServertypeAttribute.objects.create(
+            servertype_id='test0', attribute=attribute
+        )
+
+        new_schema = get_schema()
+        self.assertIsNot(new_schema, schema)
+        self.assertGreater(new_schema.generation, schema.generation)
+        self.assertIn('new_attribute', new_schema.attributes)
+        self.assertIn(
+            'new_attribute', new_schema.servertype_attributes['test0']
+        )
+
+    def test_schema_is_not_kept_on_rollback(self):
+        get_schema()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Attribute.objects.create(
+                attribute_id='new_attribute', type='string', regexp='\\A.*\\Z'
+            )
+            self.assertIn('new_attribute', get_schema().attributes)
+            raise RuntimeError()
+
+        self.assertNotIn('new_attribute', get_schema().attributes)
+
+    def test_target_servertypes_are_prefetched(self):
+        attribute = get_schema().attributes['hypervisor']
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                attribute.get_target_servertype_ids(), ['hypervisor']
+            )
+
+    def test_snapshot_is_built_in_a_transaction(self):
+        def snapshot_class(generation):
+            with connection.cursor() as cursor:
+                cursor.execute('SHOW transaction_isolation')
+                return cursor.fetchone()[0]
+
+        self.assertEqual(build_snapshot(snapshot_class, 1), 'repeatable read')
+
+    def test_snapshot_is_built_again_within_transaction(self):
+        attempts = []
+
+        def snapshot_class(generation):
+            attempts.append(generation)
+            if len(attempts) == 1:
+                raise KeyError('new_attribute')
+            return generation
+
+        with transaction.atomic():
+            self.assertEqual(build_snapshot(snapshot_class, 1), 1)
+        self.assertEqual(attempts, [1, 1])
+
+    def test_joined_objects_share_the_schema(self):
+        schema = get_schema()
+        materializer = QueryMaterializer(
+            list(Server.objects.all()),
+            {schema.attributes['hypervisor']: {
+                Attribute.specials['hostname']: None,
+            }},
+            schema=schema,
+        )
+        self.assertIs(materializer._get_join_materializer()._schema, schema)
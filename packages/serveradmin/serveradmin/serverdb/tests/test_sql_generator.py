@@ -0,0 +1,128 @@
+from django.test import SimpleTestCase
+
+from adminapi.filters import Any, BaseFilter, ContainedBy, Not, Regexp
+from serveradmin.serverdb.models import Attribute
+from serveradmin.serverdb.sql_generator import (
+    get_server_count_query,
+    get_server_query,
+)
+
+
+class TestServerQuery(SimpleTestCase):
+    def _get_server_query(self, attribute_id, filt):
+        return get_server_query([(Attribute.specials[attribute_id], filt)], {})
+
+    def test_values_are_parameters(self):
+        sql, params = self._get_server_query('hostname', BaseFilter('test0'))
+        self.assertIn('server.hostname = $1', sql)
+        self.assertNotIn('test0', sql)
+        self.assertEqual(params, ['test0'])
+
+    def test_same_shape_same_sql(self):
+        sql1, params1 = self._get_server_query(
+            'hostname', Not(Regexp('^test[0-2]$'))
+        )
+        sql2, params2 = self._get_server_query(
+            'hostname', Not(Regexp('^web[0-9]+$'))
+        )
+        self.assertEqual(sql1, sql2)
+        self.assertNotEqual(params1, params2)
+
+    def test_any_is_single_array_parameter(self):
+        sql1, params1 = self._get_server_query(
+            'hostname', Any('test0', 'test1')
+        )
+        sql2, params2 = self._get_server_query(
+            'hostname', Any('test0', 'test1', 'test2')
+        )
+        self.assertEqual(sql1, sql2)
+        self.assertIn('server.hostname = ANY($1)', sql1)
+        self.assertEqual(params1, ['{"test0","test1"}'])
+        self.assertEqual(params2, ['{"test0","test1","test2"}'])
+
+    def test_contained_by(self):
+        sql, params = self._get_server_query(
+            'hostname', ContainedBy('test0.example.com')
+        )
+        self.assertIn("$1 LIKE '%' || server.hostname || '%'", sql)
+        self.assertEqual(params, ['test0.example.com'])
+
+    def test_regexp_escapes(self):
+        sql, params = self._get_server_query(
+            'hostname', Regexp('^test\\\\.example\\tcom$')
+        )
+        self.assertIn('server.hostname::text ~ $1', sql)
+        self.assertEqual(params, ['^test\\.example\tcom$'])
+
+    def test_pages_are_parameters(self):
+        hostname = Attribute.specials['hostname']
+        filters = [(hostname, Regexp('^test'))]
+        order_by = [(hostname, None)]
+        sql1, params1 = get_server_query(
+            filters, {}, order_by, ['test1'], 2, 1
+        )
+        sql2, params2 = get_server_query(
+            filters, {}, order_by, ['test3'], 10, 5
+        )
+        self.assertEqual(sql1, sql2)
+        self.assertIn('server.hostname COLLATE "C" > $2', sql1)
+        self.assertTrue(sql1.endswith(
+            ' ORDER BY server.hostname COLLATE "C" LIMIT $3 OFFSET $4'
+        ))
+        self.assertEqual(params1, ['^test', 'test1', '2', '1'])
+        self.assertEqual(params2, ['^test', 'test3', '10', '5'])
+
+    def test_count(self):
+        hostname = Attribute.specials['hostname']
+        sql, params = get_server_count_query(
+            [(hostname, BaseFilter('test0'))], {}
+        )
+        self.assertEqual(
+            sql, 'SELECT count(*) FROM server WHERE server.hostname = $1'
+        )
+        self.assertEqual(params, ['test0'])
+
+    def test_order_by_attribute(self):
+        attribute = Attribute(attribute_id='os', type='string', multi=False)
+        servertype = Attribute.specials['servertype']
+        sql, params = get_server_query(
+            [], {}, [(servertype, None), (attribute, ['test0', 'test1'])]
+        )
+        self.assertTrue(sql.endswith(
+            ' ORDER BY server.servertype_id COLLATE "C" NULLS FIRST,'
+            " server.servertype_id NOT IN ('test0', 'test1'),"
+            ' (SELECT sub.value FROM server_string_attribute AS sub'
+            ' WHERE sub.server_id = server.server_id'
+            " AND sub.attribute_id = 'os') COLLATE \"C\" NULLS FIRST,"
+            ' server.hostname'
+        ))
+        self.assertEqual(params, [])
+
+    def test_after_attribute(self):
+        attribute = Attribute(attribute_id='os', type='string', multi=False)
+        value_sql = (
+            '(SELECT sub.value FROM server_string_attribute AS sub'
+            ' WHERE sub.server_id = server.server_id'
+            " AND sub.attribute_id = 'os') COLLATE \"C\""
+        )
+        sql, params = get_server_query(
+            [], {}, [(attribute, ['test0'])], [False, None, 'test1'], 2
+        )
+        self.assertIn(
+            "SELECT server.server_id, server.hostname, server.intern_ip,"
+            " server.servertype_id,"
+            " server.servertype_id NOT IN ('test0') AS order_0,"
+            " {} AS order_1, server.hostname AS order_2 FROM server".format(
+                value_sql
+            ),
+            sql,
+        )
+        self.assertIn(
+            " WHERE (server.servertype_id NOT IN ('test0') > $1"
+            " OR server.servertype_id NOT IN ('test0') = $1"
+            " AND {0} IS NOT NULL"
+            " OR server.servertype_id NOT IN ('test0') = $1"
+            " AND {0} IS NULL AND server.hostname > $2)".format(value_sql),
+            sql,
+        )
+        self.assertEqual(params, ['False', 'test1', '2'])
@@ -5,6 +5,7 @@ Copyright (c) 2025 InnoGames GmbH
 
 import json
 from ipaddress import IPv6Address, IPv4Address, ip_interface
+from functools import wraps
 from itertools import islice, chain
 
 from django.conf import settings as django_settings
@@ -32,7 +33,7 @@ from django.views.defaults import bad_request
 
 from adminapi.dataset import strtobool
 from adminapi.datatype import DatatypeError
-from adminapi.filters import Any, ContainedOnlyBy, filter_classes
+from adminapi.filters import All, Any, ContainedOnlyBy, Not, filter_classes
 from adminapi.parse import parse_query
 from adminapi.request import json_encode_extra
 from serveradmin.dataset import Query
@@ -43,8 +44,8 @@ from serveradmin.serverdb.models import (
     Server
 )
 from serveradmin.serverdb.query_committer import commit_query
+from serveradmin.serverdb.replica import get_commit_lsn, read_from_replica
 from serveradmin.servershell.helper import get_default_shown_attributes
-from serveradmin.servershell.merged_query_iterator import MergedQuery
 from serveradmin.servershell.utils import servershell_plugins
 
 MAX_DISTINGUISHED_VALUES = 50
@@ -62,6 +63,16 @@ SEARCH_SETTINGS = {
 }
 
 
+def _read_only_view(view):
+    """Read from the replica after the last commit of the session"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with read_from_replica(commit_lsn=request.session.get('commit_lsn')):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
 @login_required
 def index(request):
     attributes = list(Attribute.objects.all())
@@ -113,6 +124,7 @@ def index(request):
 
 
 @login_required
+@_read_only_view
 def autocomplete(request):
     hostname = request.GET.get('hostname')
 
@@ -133,6 +145,7 @@ def autocomplete(request):
 
 
 @login_required
+@_read_only_view
 def get_results(request):
     term = request.GET.get('term', '')
     shown_attributes = request.GET.getlist('shown_attributes[]')
@@ -161,17 +174,24 @@ def get_results(request):
         restrict = shown_attributes.copy()
         if 'servertype' not in restrict:
             restrict.append('servertype')
-        main_query = Query(parse_query(term), restrict, order_by)
-
-        merged_query = MergedQuery([
-            Query({'object_id': Any(*pinned)}, restrict),
-            main_query,
-        ])
-
-        # TODO: Using len is terribly slow for large datasets because it has
-        #  to query all objects but we cannot use count which is available on
-        #  Django QuerySet
-        num_servers = len(list(merged_query))
+        filters = parse_query(term)
+        main_query = Query(filters, restrict, order_by)
+        pinned_servers = list(Query({'object_id': Any(*pinned)}, restrict))
+
+        # The pinned objects are shown first.  We exclude them from the main
+        # query, so that we can get the rest of the page and the number of
+        # the objects from the database.
+        filters = _exclude_objects(filters, pinned_servers)
+        pinned_page = pinned_servers[offset:offset + limit]
+        page_query = Query(
+            filters,
+            restrict,
+            order_by,
+            limit=limit - len(pinned_page),
+            offset=max(offset - len(pinned_servers), 0),
+        )
+        servers = pinned_page + list(page_query)
+        num_servers = len(pinned_servers) + page_query.count()
     except (DatatypeError, ObjectDoesNotExist, ValidationError) as error:
         return HttpResponse(json.dumps({
             'status': 'error',
@@ -181,8 +201,6 @@ def get_results(request):
     # Query successful term must be valid here, so we can save it safely now.
     request.session['term'] = term
 
-    servers = list(islice(merged_query, offset, offset + limit))
-
     # Add information about available, editable attributes on servertypes
     servertype_ids = {s['servertype'] for s in servers}
 
@@ -211,8 +229,23 @@ def get_results(request):
     }, default=json_encode_extra), content_type='application/x-json')
 
 
+def _exclude_objects(filters, objects):
+    if not objects:
+        return filters
+
+    filters = dict(filters)
+    not_excluded = Not(Any(*(o.object_id for o in objects)))
+    if 'object_id' in filters:
+        filters['object_id'] = All(filters['object_id'], not_excluded)
+    else:
+        filters['object_id'] = not_excluded
+
+    return filters
+
+
 @login_required
 @require_http_methods(['GET'])
+@_read_only_view
 def inspect(request):
     if 'object_id' in request.GET:
         query = Query({'object_id': request.GET['object_id']}, None)
@@ -313,10 +346,13 @@ def _edit(request: HttpRequest, server, edit_mode=False, template='edit'):  # NO
                 messages.info(request, str('Nothing has changed.'))
             else:
                 try:
-                    commit_obj, _ = commit_query(created, changed, user=request.user)
+                    commit_obj, _ = commit_query(
+                        created, changed, user=request.user
+                    )
                 except (PermissionDenied, ValidationError) as err:
                     messages.error(request, str(err))
                 else:
+                    request.session['commit_lsn'] = get_commit_lsn()
                     messages.success(request, 'Server successfully ' + action)
                     if action == 'created':
                         server = commit_obj.created[0]
@@ -423,6 +459,7 @@ def commit(request):
                 'message': str(error),
             }
         else:
+            request.session['commit_lsn'] = get_commit_lsn()
             result = {'status': 'success'}
 
     return HttpResponse(json.dumps(result), content_type='application/x-json')
@@ -532,6 +569,7 @@ def _prepare_regexp_html(regexp):
 
 
 @login_required
+@_read_only_view
 def diff(request: HttpRequest) -> HttpResponse:
     attrs = request.GET.getlist('attr')
     objects = request.GET.getlist('object')
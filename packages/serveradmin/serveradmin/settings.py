@@ -44,10 +44,41 @@ DATABASES = {
             'connect_timeout': 1,
             'client_encoding': 'UTF8',
         },
+        # Every process, or every thread of it, keeps its own connection
+        # open for this many seconds between the requests.  The server
+        # needs to allow as many connections as the web server threads,
+        # the post commit worker threads and the management commands
+        # together.  The connections are checked before they are reused.
+        'CONN_MAX_AGE': env.int('POSTGRES_CONN_MAX_AGE', default=300),
+        'CONN_HEALTH_CHECKS': True,
     },
 }
 
+# The queries can be sent to a hot standby to take the load off the primary.
+# The clients reading right after their commits are sent to the primary
+# until the replica has replayed them.  See serveradmin.serverdb.replica.
+if env('POSTGRES_REPLICA_HOST', default=None):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        HOST=env('POSTGRES_REPLICA_HOST'),
+        PORT=env(
+            'POSTGRES_REPLICA_PORT', default=DATABASES['default']['PORT']
+        ),
+        TEST={'MIRROR': 'default'},
+    )
+
+DATABASE_ROUTERS = ['serveradmin.serverdb.replica.ReplicaRouter']
+
+# The queries are executed as prepared statements, so the queries of the
+# same shape are planned once per connection.  Disable this, if the
+# connections go through a pooler like PgBouncer in the transaction mode,
+# which doesn't keep the sessions.
+DATABASE_PREPARED_STATEMENTS = env.bool(
+    'POSTGRES_PREPARED_STATEMENTS', default=True
+)
+
 MIDDLEWARE = [
+    'serveradmin.common.metrics.MetricsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -204,6 +235,29 @@ LOGGING = {
 
 OBJECTS_PER_PAGE = 25
 
+# Record the durations and the numbers of SQL statements of the phases of
+# the API calls, and report them in the logs and the Server-Timing header
+API_TIMING = True
+
+# The seconds the sessions started through the API to avoid verifying the
+# SSH signatures of every request last
+API_SESSION_TTL = 300
+
+# Expose the metrics of the requests on /metrics in the Prometheus format.
+# This requires the prometheus-client library.  Set the environment
+# variable PROMETHEUS_MULTIPROC_DIR when running multiple processes.
+METRICS_ENABLED = False
+
+# The results of the queries through the API can be cached.  The backends
+# are in serveradmin.serverdb.query_cache.  For example:
+#
+#   QUERY_CACHE_BACKEND = (
+#       'serveradmin.serverdb.query_cache.DjangoCacheBackend'
+#   )
+#   QUERY_CACHE_OPTIONS = {'alias': 'default', 'timeout': 300}
+QUERY_CACHE_BACKEND = None
+QUERY_CACHE_OPTIONS = {}
+
 GRAPHITE_SPRITE_WIDTH = 150
 GRAPHITE_SPRITE_HEIGHT = 100
 GRAPHITE_SPRITE_PARAMS = (
@@ -15,6 +15,8 @@ from django.contrib.auth.views import logout_then_login
 from django.shortcuts import redirect
 from django.urls import path, include
 
+from serveradmin.common.metrics import metrics
+
 user_logged_in.disconnect(update_last_login)
 
 admin.autodiscover()
@@ -23,6 +25,7 @@ urlpatterns = [
     path('', lambda req: redirect('servershell_index'), name='home'),
     path('logout', logout_then_login, name='logout'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
 ]
 
 for app in apps.get_app_configs():